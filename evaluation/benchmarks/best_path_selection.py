@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import random
+import argparse
+import timeit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "xctrl",
+                                             "route_server")))
+
+from rib_backend import Route
+from decision_process import best_path_selection, ranking_key
+
+
+def generate_candidates(num_routes, num_neighbor_ases, precomputed):
+    """
+    generates the routes of num_routes participants for the same prefix
+    :param num_routes: number of candidate routes
+    :param num_neighbor_ases: number of distinct neighbor ASes, 0 if every route has its own neighbor AS
+    :param precomputed: if True the ranking key is computed in advance, otherwise during the selection
+    :return: list of routes
+    """
+    routes = list()
+    for i in range(0, num_routes):
+        neighbor_as = random.randint(1, num_neighbor_ases) if num_neighbor_ases else i + 1
+        as_path = ' '.join([str(neighbor_as)] + [str(random.randint(1, 65000)) for _ in range(0, random.randint(0, 5))])
+        next_hop = '172.0.%d.%d' % (i / 256, i % 256)
+        med = random.randint(0, 10)
+
+        rank = ranking_key(as_path, med, next_hop) if precomputed else None
+        routes.append(Route(i, '10.0.0.0/24', next_hop, 'igp', as_path, '', med, '', rank))
+    return routes
+
+
+def main(argv):
+    iterations = int(argv.iterations)
+    num_neighbor_ases = int(argv.num_neighbor_ases)
+
+    print 'routes|per call (us)|precomputed (us)|speedup'
+    for num_routes in [2, 5, 10, 20, 50, 100, 200]:
+        random.seed(num_routes)
+        per_call = generate_candidates(num_routes, num_neighbor_ases, False)
+        random.seed(num_routes)
+        precomputed = generate_candidates(num_routes, num_neighbor_ases, True)
+
+        if best_path_selection(per_call).participant != best_path_selection(precomputed).participant:
+            print 'Error: different best paths for ' + str(num_routes) + ' routes'
+
+        per_call_time = min(timeit.repeat(lambda: best_path_selection(per_call), number=iterations, repeat=3))
+        precomputed_time = min(timeit.repeat(lambda: best_path_selection(precomputed), number=iterations, repeat=3))
+
+        print str(num_routes) + '|' + '%.2f' % (per_call_time / iterations * 10**6) + '|' + \
+              '%.2f' % (precomputed_time / iterations * 10**6) + '|' + '%.1f' % (per_call_time / precomputed_time)
+
+
+''' main '''
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('iterations', help='number of selections per candidate set size')
+    parser.add_argument('num_neighbor_ases', help='number of distinct neighbor ASes (0: one per route)')
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import random
+import argparse
+
+from collections import namedtuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "xctrl",
+                                             "route_server")))
+
+from rib_backend import LocalRIB
+
+# representation of a RIB entry before the compact records were introduced
+RIBEntry = namedtuple('RIBEntry', 'participant prefix next_hop origin as_path communities med atomic_aggregate')
+
+
+def copy(value):
+    # every route that is parsed from an ExaBGP message comes with its own copy of the strings
+    return (value + ' ')[:-1]
+
+
+def generate_routes(num_participants, num_prefixes, num_as_paths):
+    prefixes = ['%d.%d.%d.0/24' % (10 + i / 65536, (i / 256) % 256, i % 256) for i in range(0, num_prefixes)]
+
+    for participant in range(1, num_participants + 1):
+        next_hop = '172.0.%d.%d' % (participant / 256, participant % 256)
+        as_paths = [' '.join([str(participant + 100)] + [str(random.randint(1, 65000))
+                                                         for _ in range(0, random.randint(1, 5))])
+                    for _ in range(0, num_as_paths)]
+
+        for prefix in prefixes:
+            yield (participant, copy(prefix), copy(next_hop), copy('igp'), copy(random.choice(as_paths)), copy(''),
+                   0, copy(''))
+
+
+def deep_size(objects):
+    """
+    size of all objects and of everything they reference, shared objects are only counted once
+    :param objects: list of objects
+    :return:size in bytes
+    """
+    seen = set()
+    size = 0
+    stack = list(objects)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (tuple, list, set)):
+            stack.extend(obj)
+        elif hasattr(obj, '__slots__'):
+            stack.extend(getattr(obj, slot) for slot in obj.__slots__)
+        elif hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+    return size
+
+
+def main(argv):
+    num_participants = int(argv.num_participants)
+    num_prefixes = int(argv.num_prefixes)
+    num_as_paths = int(argv.num_as_paths)
+    num_routes = num_participants * num_prefixes
+
+    random.seed(1)
+    routes = list(generate_routes(num_participants, num_prefixes, num_as_paths))
+
+    columns = RIBEntry._fields
+
+    # before: dict per row (SQLRIB.dict_factory) and namedtuple per entry (LocalRIB)
+    dict_rows = [dict(zip(columns, route)) for route in routes]
+    dict_size = deep_size(dict_rows) - sys.getsizeof(dict_rows)
+    del dict_rows
+
+    entries = [RIBEntry(*route) for route in routes]
+    entry_size = deep_size(entries) - sys.getsizeof(entries)
+    del entries
+
+    # after: compact records with interned values and a shared as path table (including both tables)
+    rib = LocalRIB(1, ['input'])
+    rib.add_many('input', routes)
+    records = rib.tables['input'].values()
+    record_size = deep_size(records + [rib.values, rib.as_paths]) - sys.getsizeof(records)
+
+    print 'participants: ' + str(num_participants) + ', prefixes: ' + str(num_prefixes) + ', routes: ' + \
+          str(num_routes) + ', distinct as paths: ' + str(len(rib.as_paths))
+    print 'dict rows:          ' + str(dict_size / num_routes) + ' bytes per route'
+    print 'namedtuple entries: ' + str(entry_size / num_routes) + ' bytes per route'
+    print 'compact records:    ' + str(record_size / num_routes) + ' bytes per route'
+
+
+''' main '''
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('num_participants', help='number of participants')
+    parser.add_argument('num_prefixes', help='number of prefixes announced by each participant')
+    parser.add_argument('num_as_paths', help='number of distinct as paths per participant')
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import resource
+
+from Queue import Queue, Empty
+from collections import defaultdict
+
+BASE_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", ".."))
+
+sys.path.append(os.path.join(BASE_PATH, "xctrl"))
+sys.path.append(os.path.join(BASE_PATH, "evaluation", "example_generator"))
+
+from config import Config
+from route_server import route_server as route_server_module
+from route_server.route_server import RouteServer
+from route_server.framing import parse_batch
+from vmac_encoder.supersets import SuperSetEncoder
+
+from config_generator import generate_config
+from rib_generator import generate_table
+
+
+class StageTimer(object):
+    """
+    collects the duration of every call of the wrapped functions per stage
+    """
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def wrap(self, stage, function):
+        samples = self.samples[stage]
+
+        def timed(*args, **kwargs):
+            start = time.time()
+            result = function(*args, **kwargs)
+            samples.append(time.time() - start)
+            return result
+        return timed
+
+    def add(self, stage, duration):
+        self.samples[stage].append(duration)
+
+
+def percentile(values, p):
+    """
+    nearest-rank percentile
+    :param values: sorted list of values
+    :param p: percentile (0 - 100)
+    :return: value
+    """
+    if not values:
+        return 0
+    index = int(round(p / 100.0 * len(values) + 0.5)) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+def replay(config, rate, supersets):
+    """
+    replays the route log of the SDX through the route server, the VNH assignment and the advertisement of the
+    best routes to the participants
+    :param config: Config of the SDX, the route log is read from <base_path>/bgp/<id>.log
+    :param rate: replay speed - 1 replays one tick of the log per second, 0 replays as fast as possible
+    :param supersets: if True the supersets are updated as well
+    :return: tuple (number of BGP messages, number of sent advertisements, elapsed seconds, StageTimer)
+    """
+    timer = StageTimer()
+
+    event_queue = Queue()
+    route_server = RouteServer(config, event_queue, False, True)
+    route_server.server.sender_queue = Queue()
+    encoder = SuperSetEncoder(config, event_queue, False, route_server.rib, None, True)
+
+    # time each stage of the processing of a BGP message
+    route_server.rib.update = timer.wrap('rib update', route_server.rib.update)
+    route_server_module.decision_process = timer.wrap('decision process', route_server_module.decision_process)
+    vnh_assignment = timer.wrap('vnh assignment', encoder.vnh_assignment)
+    update_supersets = timer.wrap('supersets', encoder.update_supersets)
+    update_neighbors = timer.wrap('bgp update peers', route_server.update_neighbors)
+
+    routes = route_server.server.routes
+    ticks = sorted(routes.keys())
+
+    num_messages = 0
+    num_advertisements = 0
+
+    start_time = time.time()
+    for tick in ticks:
+        arrival_time = start_time
+        if rate:
+            arrival_time = start_time + (tick - ticks[0]) / float(rate)
+            delay = arrival_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+        # the messages of a tick arrive as one batch
+        batch = [json.dumps(message) for message in routes[tick]]
+
+        parse_start = time.time()
+        messages = parse_batch(batch)
+        timer.add('parse', time.time() - parse_start)
+
+        for message in messages:
+            message_start = time.time()
+
+            route_server.process_route(message)
+
+            while True:
+                try:
+                    event = event_queue.get(False)
+                except Empty:
+                    break
+
+                vnh_assignment(event.data)
+                if supersets:
+                    update_supersets(event.data)
+                update_neighbors(event.data)
+
+            end = time.time()
+            timer.add('total', end - message_start)
+            if rate:
+                timer.add('since arrival', end - arrival_time)
+            num_messages += 1
+
+        while True:
+            try:
+                num_advertisements += len(route_server.server.sender_queue.get(False).split('\n'))
+            except Empty:
+                break
+
+    route_server.rib.flush()
+    elapsed = time.time() - start_time
+
+    return num_messages, num_advertisements, elapsed, timer
+
+
+def write_synthetic_example(path, num_participants, num_prefixes, num_rounds, num_as_paths):
+    """
+    writes the config and the route log of a single SDX where all participants peer with each other
+    :return:None
+    """
+    with open(os.path.join(path, "global.cfg"), 'w') as outfile:
+        json.dump(generate_config(num_participants, True), outfile)
+
+    prefixes = ['%d.%d.%d.0/24' % (10 + i / 65536, (i / 256) % 256, i % 256) for i in range(0, num_prefixes)]
+    as_paths = [','.join([str(random.randint(1000, 9000)) for _ in range(0, random.randint(1, 4))])
+                for _ in range(0, num_as_paths)]
+
+    os.mkdir(os.path.join(path, "bgp"))
+    with open(os.path.join(path, "bgp", "1.log"), 'w') as outfile:
+        for update in generate_table(range(1, num_participants + 1), prefixes, num_rounds, as_paths, 1, 1):
+            outfile.write(update + '\n')
+
+
+def main(argv):
+    random.seed(int(argv.seed))
+
+    tmp_path = None
+    if argv.synthetic:
+        tmp_path = tempfile.mkdtemp()
+        write_synthetic_example(tmp_path, int(argv.synthetic[0]), int(argv.synthetic[1]), int(argv.rounds),
+                                int(argv.as_paths))
+        base_path = tmp_path
+        sdx_id = 1
+    else:
+        base_path = os.path.abspath(argv.example)
+        sdx_id = int(argv.sdx)
+
+    try:
+        config = Config(sdx_id, base_path, os.path.join(base_path, "global.cfg"))
+        if argv.backend:
+            config.route_server.rib_backend = argv.backend
+        if argv.batch_size:
+            config.route_server.batch_size = int(argv.batch_size)
+
+        num_messages, num_advertisements, elapsed, timer = replay(config, float(argv.rate), not argv.no_supersets)
+    finally:
+        if tmp_path:
+            shutil.rmtree(tmp_path)
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+    print 'bgp messages|advertisements|elapsed (s)|updates/s|peak rss (MB)'
+    print str(num_messages) + '|' + str(num_advertisements) + '|' + '%.3f' % elapsed + '|' + \
+          '%.1f' % (num_messages / elapsed if elapsed else 0) + '|' + '%.1f' % peak_rss
+    print
+    print 'stage|calls|total (s)|p50 (ms)|p90 (ms)|p99 (ms)|max (ms)'
+    for stage in ['parse', 'rib update', 'decision process', 'vnh assignment', 'supersets', 'bgp update peers',
+                  'total', 'since arrival']:
+        samples = sorted(timer.samples.get(stage, []))
+        if not samples:
+            continue
+        print stage + '|' + str(len(samples)) + '|' + '%.3f' % sum(samples) + '|' + \
+              '|'.join(['%.3f' % (percentile(samples, p) * 1000) for p in [50, 90, 99, 100]])
+
+
+''' main '''
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--example', default=os.path.join(BASE_PATH, "examples", "test_basic"),
+                        help='path to the example containing global.cfg and bgp/<sdx>.log')
+    parser.add_argument('--sdx', default=1, help='id of the SDX whose route log is replayed')
+    parser.add_argument('--synthetic', nargs=2, metavar=('NUM_PARTICIPANTS', 'NUM_PREFIXES'),
+                        help='replay a generated route log instead of an example')
+    parser.add_argument('--rounds', default=3, help='synthetic: number of updates per participant and prefix')
+    parser.add_argument('--as-paths', default=10, help='synthetic: number of distinct AS paths')
+    parser.add_argument('--rate', default=0, help='replay speed multiplier - 1 is real time, 0 as fast as possible')
+    parser.add_argument('--backend', help='RIB backend (sqlite or local), overrides the config')
+    parser.add_argument('--batch-size', help='number of BGP messages per RIB transaction, overrides the config')
+    parser.add_argument('--no-supersets', action='store_true', help='do not update the supersets')
+    parser.add_argument('--seed', default=1, help='random seed of the generator')
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import time
+import random
+import bisect
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "xctrl")))
+
+from vmac_encoder.supersets import SuperSetEncoder, compute_supersets, popcount
+
+
+class StaticRIB(object):
+    """
+    provides the participants advertising each prefix to the SuperSetEncoder
+    """
+    def __init__(self, prefix_2_participants):
+        self.prefix_2_participants = prefix_2_participants
+
+    def get_all_participants_advertising(self, prefix):
+        return self.prefix_2_participants[prefix]
+
+    def get_all_participant_sets(self, prefix_2_vnh):
+        return [self.prefix_2_participants[prefix] for prefix in prefix_2_vnh]
+
+
+class EncoderConfig(object):
+    def __init__(self, max_superset_size, superset_threshold, prefixes):
+        self.max_superset_size = max_superset_size
+        self.superset_threshold = superset_threshold
+        self.prefix_2_vnh = dict((prefix, None) for prefix in prefixes)
+
+
+class Config(object):
+    def __init__(self, vmac_encoder, participants):
+        self.vmac_encoder = vmac_encoder
+        self.participants = participants
+
+
+def generate_participant_sets(num_participants, num_prefixes, skew):
+    """
+    generates the sets of participants advertising each prefix similar to the ones at an IXP: most prefixes are
+    advertised by one or a few participants, while a few large participants (transit providers and route servers of
+    other IXPs) advertise most of the prefixes. The popularity of the participants follows a Zipf distribution.
+    :param num_participants: number of participants
+    :param num_prefixes: number of prefixes
+    :param skew: exponent of the Zipf distribution
+    :return: list of sets of participants (one per prefix)
+    """
+    weights = [1.0 / (rank ** skew) for rank in range(1, num_participants + 1)]
+    cumulative_weights = list()
+    total = 0
+    for weight in weights:
+        total += weight
+        cumulative_weights.append(total)
+
+    participant_sets = list()
+    for _ in range(0, num_prefixes):
+        # geometric distribution of the number of participants advertising the prefix
+        set_size = 1
+        while random.random() < 0.6 and set_size < num_participants:
+            set_size += 1
+
+        participant_set = set()
+        while len(participant_set) < set_size:
+            index = bisect.bisect_left(cumulative_weights, random.random() * total)
+            participant_set.add(min(index, num_participants - 1) + 1)
+        participant_sets.append(participant_set)
+
+    return participant_sets
+
+
+def incremental_supersets(participant_sets, max_superset_size):
+    """
+    adds the sets one after the other to the supersets as SuperSetEncoder.update_supersets does for new
+    announcements, without ever recomputing all supersets
+    :return: tuple (number of supersets, elapsed seconds)
+    """
+    prefixes = ['%d.%d.%d.0/24' % (10 + i / 65536, (i / 256) % 256, i % 256) for i in range(0, len(participant_sets))]
+    rib = StaticRIB(dict(zip(prefixes, participant_sets)))
+    config = Config(EncoderConfig(max_superset_size, len(participant_sets) + 1, prefixes),
+                    set().union(*participant_sets))
+    encoder = SuperSetEncoder(config, None, False, rib, None, True)
+
+    start_time = time.time()
+    for prefix in prefixes:
+        encoder.update_supersets([{'announce': {'prefix': prefix}}])
+    return len(encoder.supersets), time.time() - start_time
+
+
+def main(argv):
+    random.seed(int(argv.seed))
+
+    num_participants = int(argv.num_participants)
+    max_superset_size = int(argv.max_superset_size)
+
+    print 'prefixes|unique sets|supersets|recompute (s)|incremental supersets|incremental (s)'
+    for num_prefixes in [int(num_prefixes) for num_prefixes in argv.num_prefixes]:
+        participant_sets = generate_participant_sets(num_participants, num_prefixes, float(argv.skew))
+        masks = [sum(1 << (participant - 1) for participant in participant_set)
+                 for participant_set in participant_sets]
+
+        start_time = time.time()
+        supersets = compute_supersets(masks, max_superset_size)
+        recompute_time = time.time() - start_time
+
+        # every set has to be covered by one of the supersets, only a set that is larger than the max size itself
+        # can lead to a larger superset
+        unique_masks = set(masks)
+        if any(popcount(superset) > max_superset_size and superset not in unique_masks for superset in supersets) or \
+                any(not any(mask & superset == mask for superset in supersets) for mask in unique_masks):
+            print 'Error: invalid supersets for ' + str(num_prefixes) + ' prefixes'
+
+        num_incremental, incremental_time = incremental_supersets(participant_sets, max_superset_size)
+
+        print str(num_prefixes) + '|' + str(len(set(masks))) + '|' + str(len(supersets)) + '|' + \
+              '%.3f' % recompute_time + '|' + str(num_incremental) + '|' + '%.3f' % incremental_time
+
+
+''' main '''
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('num_participants', help='number of participants')
+    parser.add_argument('max_superset_size', help='max number of participants in a superset')
+    parser.add_argument('num_prefixes', nargs='+', help='number of prefixes, one run per value')
+    parser.add_argument('--skew', default=1.0, help='exponent of the Zipf distribution of the participant popularity')
+    parser.add_argument('--seed', default=1, help='random seed of the generator')
+    args = parser.parse_args()
+
+    main(args)
@@ -5,6 +5,23 @@ import json
 
 
 def main(argv):
+    num_participants = int(argv.num_participants)
+
+    config_file = argv.out_path + "global.cfg"
+
+    config = generate_config(num_participants)
+
+    with open(config_file, 'w') as outfile:
+        json.dump(config, outfile)
+
+
+def generate_config(num_participants, full_mesh=False):
+    """
+    generates the config of the local SDX and two remote SDXes
+    :param num_participants: number of participants at the local SDX
+    :param full_mesh: if True all participants peer with each other, otherwise participant one peers with all others
+    :return: config dict
+    """
     config = {"SDXes": dict()}
 
     current_sdx = 1
@@ -14,10 +31,6 @@ def main(argv):
     ip_generator = IPAddressGenerator(local_sdx_network)
     asn_generator = ASNGenerator()
 
-    num_participants = int(argv.num_participants)
-
-    config_file = argv.out_path + "global.cfg"
-
     # local SDX config
     tmp_sdx = {"Address": "localhost",
                "VNHs": "172.1.1.1/8",
@@ -57,7 +70,9 @@ def main(argv):
             "ASN": asn_generator.get_asn()
         }
 
-        if i == 1:
+        if full_mesh:
+            tmp_sdx["Participants"][str(i)]["Peers"] = [j for j in range(1, num_participants + 1) if j != i]
+        elif i == 1:
             tmp_sdx["Participants"][str(i)]["Peers"] = range(2, num_participants + 1)
         else:
             tmp_sdx["Participants"][str(i)]["Peers"] = [1]
@@ -95,8 +110,7 @@ def main(argv):
         }
     }
 
-    with open(config_file, 'w') as outfile:
-        json.dump(config, outfile)
+    return config
 
 
 class IPAddressGenerator(object):
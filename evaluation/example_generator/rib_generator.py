@@ -2,6 +2,11 @@ import argparse
 import random
 from netaddr import IPNetwork, IPAddress
 
+# local SDX default settings - the same as in config_generator.py
+LOCAL_SDX_NETWORK = "172.0.0.0/16"
+LOCAL_ADDRESS = '172.1.255.254'
+LOCAL_ASN = '65000'
+
 
 def main(argv):
     announcements_file = argv.out_path + "1.log"
@@ -10,11 +15,7 @@ def main(argv):
     start_time = int(argv.start_time)
     curr_announcement = 0
 
-    local_sdx_network = "172.0.0.0/16"
-    ip_generator = IPAddressGenerator(local_sdx_network)
-
-    local_address = '172.1.255.254'
-    local_asn = '65000'
+    ip_generator = IPAddressGenerator(LOCAL_SDX_NETWORK)
 
     num_announcements = int(argv.num_announcements)
 
@@ -58,12 +59,49 @@ def main(argv):
                 else:
                     as_path = ''
 
-                announcement = str(time) + '|' + str(msg_type) + '|' + str(ip_generator.get_address(from_participant)) + '|' + str(from_participant + 100) \
-                               + '|' + str(local_address) + '|' + str(local_asn) + '|' + str(as_path) + '|' + str(prefix)
+                announcement = format_update(ip_generator, time, msg_type, from_participant, as_path, prefix)
 
                 outfile.write(announcement + '\n')
 
 
+def format_update(ip_generator, time, msg_type, from_participant, as_path, prefix):
+    return str(time) + '|' + str(msg_type) + '|' + str(ip_generator.get_address(from_participant)) + '|' + \
+           str(from_participant + 100) + '|' + str(LOCAL_ADDRESS) + '|' + str(LOCAL_ASN) + '|' + str(as_path) + '|' + \
+           str(prefix)
+
+
+def generate_table(from_participants, prefixes, num_rounds, as_paths, start_time, interval):
+    """
+    generates updates of every participant for every prefix. In the first round all participants announce all
+    prefixes (table dump), in every further round each route is randomly withdrawn, re-announced or announced with a
+    new AS path
+    :param from_participants: list of participant ids
+    :param prefixes: list of prefixes
+    :param num_rounds: number of rounds
+    :param as_paths: list of AS paths (comma separated ASes) - the ASN of the participant is prepended
+    :param start_time: time of the first round
+    :param interval: time between two rounds
+    :return: list of updates in the format of the route log
+    """
+    ip_generator = IPAddressGenerator(LOCAL_SDX_NETWORK)
+
+    updates = list()
+    announced = set()
+    for i in range(0, num_rounds):
+        time = start_time + i * interval
+
+        for prefix in prefixes:
+            for from_participant in from_participants:
+                if (from_participant, prefix) in announced and random.choice(['announce', 'withdraw']) == 'withdraw':
+                    announced.discard((from_participant, prefix))
+                    updates.append(format_update(ip_generator, time, 'withdraw', from_participant, '', prefix))
+                else:
+                    announced.add((from_participant, prefix))
+                    as_path = str(from_participant + 100) + ',' + random.choice(as_paths)
+                    updates.append(format_update(ip_generator, time, 'announce', from_participant, as_path, prefix))
+    return updates
+
+
 class IPAddressGenerator(object):
     def __init__(self, network):
         self.network = IPNetwork(network)
@@ -19,6 +19,3 @@ sudo pip install requests
 
 # Install ExaBGP
 sudo pip install -U exabgp
-
-# Install PyMongo
-sudo pip install pymongo
\ No newline at end of file
@@ -2,16 +2,21 @@
 #  Rudiger Birkner (Networked Systems Group ETH Zurich)
 
 ## RouteServer-specific imports
+import os
 import logging
 import json
 from netaddr import IPNetwork
 from collections import defaultdict
 
 from route_server.route_server import RouteServerConfig
+from route_server.framing import MAX_BATCH_SIZE, MAX_BATCH_LATENCY, MAX_QUEUED_BATCHES
 from vmac_encoder.supersets import SuperSetEncoderConfig
+from vmac_encoder.vnh_pool import VNH_HOLD_DOWN
 from arp_proxy.arp_proxy import ARPProxyConfig
-from loop_detection.loop_detector import LoopDetectorConfig
+from loop_detection.loop_detector import LoopDetectorConfig, CORRECTNESS_WORKERS
+from loop_detection.notification_batcher import NOTIFICATION_BATCH_SIZE, NOTIFICATION_BATCH_LATENCY
 from policies.policies import PolicyHandlerConfig
+from state_store import StateStoreConfig, SNAPSHOT_INTERVAL
 
 
 class Config(object):
@@ -28,6 +33,7 @@ class Config(object):
         self.vmac_encoder = None
         self.loop_detector = None
         self.policy_handler = None
+        self.state = None
 
         self.participants = dict()
         self.port_2_participant = dict()
@@ -51,6 +57,10 @@ class Config(object):
         config = json.load(open(config_file, 'r'))
 
         max_random_value = 1000
+        notification_batch_size = NOTIFICATION_BATCH_SIZE
+        notification_batch_latency = NOTIFICATION_BATCH_LATENCY
+        correctness_workers = CORRECTNESS_WORKERS
+        cib_backend = "local"
 
         if "SDXes" in config:
 
@@ -74,7 +84,19 @@ class Config(object):
                     if "VNHs" in sdx:
                         vnhs = IPNetwork(sdx["VNHs"])
 
+                    if "State" in sdx and "Directory" in sdx["State"]:
+                        snapshot_interval = SNAPSHOT_INTERVAL
+                        if "Snapshot Interval" in sdx["State"]:
+                            snapshot_interval = sdx["State"]["Snapshot Interval"]
+                        self.state = StateStoreConfig(os.path.join(self.base_path, sdx["State"]["Directory"]),
+                                                      snapshot_interval)
+
                     if "VMAC Computation" in sdx:
+                        vnh_hold_down = VNH_HOLD_DOWN
+                        vnh_state_file = None
+                        # the VNH assignment is kept with the rest of the state, unless it has its own file
+                        if self.state:
+                            vnh_state_file = os.path.join(self.state.directory, "vnhs")
                         if "VMAC Size" in sdx["VMAC Computation"]:
                             vmac_size = sdx["VMAC Computation"]["VMAC Size"]
                         if "Superset ID Size" in sdx["VMAC Computation"]:
@@ -85,19 +107,33 @@ class Config(object):
                             best_path_size = sdx["VMAC Computation"]["Best Path Size"]
                         if "Superset Threshold" in sdx["VMAC Computation"]:
                             superset_threshold = sdx["VMAC Computation"]["Superset Threshold"]
+                        if "VNH Hold Down" in sdx["VMAC Computation"]:
+                            vnh_hold_down = sdx["VMAC Computation"]["VNH Hold Down"]
+                        if "VNH State File" in sdx["VMAC Computation"]:
+                            vnh_state_file = os.path.join(self.base_path, sdx["VMAC Computation"]["VNH State File"])
 
                         self.vmac_encoder = SuperSetEncoderConfig(vmac_size,
                                                                   superset_id_size,
                                                                   max_superset_size,
                                                                   best_path_size,
                                                                   superset_threshold,
-                                                                  vnhs)
+                                                                  vnhs,
+                                                                  vnh_hold_down,
+                                                                  vnh_state_file)
 
                     if "Loop Detector" in sdx:
                         if "Max Random Value" in sdx["Loop Detector"]:
                             max_random_value = sdx["Loop Detector"]["Max Random Value"]
                         if "Port" in sdx["Loop Detector"]:
                             loop_handler_port = sdx["Loop Detector"]["Port"]
+                        if "Notification Batch Size" in sdx["Loop Detector"]:
+                            notification_batch_size = sdx["Loop Detector"]["Notification Batch Size"]
+                        if "Notification Batch Latency" in sdx["Loop Detector"]:
+                            notification_batch_latency = sdx["Loop Detector"]["Notification Batch Latency"]
+                        if "Correctness Workers" in sdx["Loop Detector"]:
+                            correctness_workers = sdx["Loop Detector"]["Correctness Workers"]
+                        if "CIB Backend" in sdx["Loop Detector"]:
+                            cib_backend = sdx["Loop Detector"]["CIB Backend"]
 
                     if "Policy Handler" in sdx:
                         if "Address" in sdx["Policy Handler"]:
@@ -107,6 +143,11 @@ class Config(object):
                         self.policy_handler = PolicyHandlerConfig(tmp_address, tmp_port)
 
                     if "Route Server" in sdx:
+                        batch_size = 1
+                        rib_backend = "sqlite"
+                        message_batch_size = MAX_BATCH_SIZE
+                        message_batch_latency = MAX_BATCH_LATENCY
+                        receive_queue_size = MAX_QUEUED_BATCHES
                         if "IP" in sdx["Route Server"]:
                             ip = sdx["Route Server"]["IP"]
                         if "Connection Port" in sdx["Route Server"]:
@@ -119,10 +160,22 @@ class Config(object):
                             fabric_port = sdx["Route Server"]["Fabric Port"]
                         if "MAC" in sdx["Route Server"]:
                             mac = sdx["Route Server"]["MAC"]
+                        if "Batch Size" in sdx["Route Server"]:
+                            batch_size = sdx["Route Server"]["Batch Size"]
+                        if "RIB Backend" in sdx["Route Server"]:
+                            rib_backend = sdx["Route Server"]["RIB Backend"]
+                        if "Message Batch Size" in sdx["Route Server"]:
+                            message_batch_size = sdx["Route Server"]["Message Batch Size"]
+                        if "Message Batch Latency" in sdx["Route Server"]:
+                            message_batch_latency = sdx["Route Server"]["Message Batch Latency"]
+                        if "Receive Queue Size" in sdx["Route Server"]:
+                            receive_queue_size = sdx["Route Server"]["Receive Queue Size"]
 
                         rs_port = Port(fabric_port, mac, ip)
 
-                        self.route_server = RouteServerConfig(ip, connection_port, connection_key, rs_port, interface)
+                        self.route_server = RouteServerConfig(ip, connection_port, connection_key, rs_port, interface,
+                                                              batch_size, rib_backend, message_batch_size,
+                                                              message_batch_latency, receive_queue_size)
 
                         self.arp_proxy = ARPProxyConfig(interface, rs_port)
 
@@ -176,7 +229,9 @@ class Config(object):
                     sdx_2_asn[sdx_id].add(participant["ASN"])
                     asn_2_sdx[participant["ASN"]].add(sdx_id)
 
-            self.loop_detector = LoopDetectorConfig(sdx_2_asn, asn_2_sdx, max_random_value, loop_handler_port)
+            self.loop_detector = LoopDetectorConfig(sdx_2_asn, asn_2_sdx, max_random_value, loop_handler_port,
+                                                    notification_batch_size, notification_batch_latency,
+                                                    correctness_workers, cib_backend)
 
 
 class SDX(object):
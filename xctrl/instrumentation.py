@@ -0,0 +1,196 @@
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import json
+import math
+import time
+
+from threading import Lock
+
+# every power of two (in microseconds) is split into SUB_BUCKETS buckets, so the percentiles are accurate to ~20%
+SUB_BUCKETS = 4
+NUM_BUCKETS = 40 * SUB_BUCKETS
+
+
+def bucket_index(microseconds):
+    # everything below one microsecond ends up in the bucket with the upper bound of one microsecond
+    if microseconds < 1:
+        return SUB_BUCKETS - 1
+    mantissa, exponent = math.frexp(microseconds)
+    return min(exponent * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS), NUM_BUCKETS - 1)
+
+
+def bucket_upper_bound(index):
+    """
+    :param index: bucket index
+    :return: upper bound of the bucket in microseconds
+    """
+    exponent, sub_bucket = divmod(index, SUB_BUCKETS)
+    return (0.5 + 0.5 * (sub_bucket + 1) / SUB_BUCKETS) * 2 ** exponent
+
+
+class Histogram(object):
+    """
+    Latency histogram with exponentially growing buckets. Recording a sample only increments a few counters, so it
+    can be used on the hot path.
+    """
+    def __init__(self):
+        self.lock = Lock()
+
+        self.buckets = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, duration):
+        """
+        :param duration: duration in seconds
+        :return:None
+        """
+        index = bucket_index(duration * 1000000)
+
+        with self.lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total += duration
+            if self.min is None or duration < self.min:
+                self.min = duration
+            if self.max is None or duration > self.max:
+                self.max = duration
+
+    def percentile(self, p):
+        """
+        approximates the percentile by the upper bound of the bucket it falls into
+        :param p: percentile (0 - 100)
+        :return: duration in seconds
+        """
+        if not self.count:
+            return 0
+        rank = p / 100.0 * self.count
+        cumulative = 0
+        for index, count in enumerate(self.buckets):
+            cumulative += count
+            if count and cumulative >= rank:
+                return min(bucket_upper_bound(index) / 1000000.0, self.max)
+        return self.max
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "count": self.count,
+                "total": self.total,
+                "mean": self.total / self.count if self.count else 0,
+                "min": self.min,
+                "max": self.max,
+                "p50": self.percentile(50),
+                "p90": self.percentile(90),
+                "p99": self.percentile(99),
+                # upper bound of each bucket in microseconds to number of samples
+                "buckets": dict((str(bucket_upper_bound(index)), count) for index, count in enumerate(self.buckets)
+                                if count),
+            }
+
+
+class Timer(object):
+    """
+    context manager that records the duration of the block in the histogram of the stage
+    """
+    __slots__ = ('instrumentation', 'stage', 'start')
+
+    def __init__(self, instrumentation, stage):
+        self.instrumentation = instrumentation
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.instrumentation.record(self.stage, time.time() - self.start)
+        return False
+
+
+class NoTimer(object):
+    """
+    context manager that does nothing - used while the instrumentation is disabled
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NO_TIMER = NoTimer()
+
+
+class Instrumentation(object):
+    """
+    Keeps a latency histogram per processing stage of the controller in memory. The stages are:
+    ingest (RIB update), decision (decision process), vnh (VNH assignment), superset, export (advertisements to the
+    participants), cib update (after a RIB update), correctness message (processing of a received message),
+    notification send, policy activation, flow-mod send and arp
+    """
+    def __init__(self):
+        self.enabled = False
+        self.lock = Lock()
+        self.histograms = dict()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def record(self, stage, duration):
+        """
+        records a single measurement
+        :param stage: name of the stage
+        :param duration: duration in seconds
+        :return:None
+        """
+        if not self.enabled:
+            return
+
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(stage, Histogram())
+        histogram.record(duration)
+
+    def measure(self, stage):
+        """
+        with timing.measure('decision'):
+            ...
+        :param stage: name of the stage
+        :return: context manager that records the duration of the block
+        """
+        if not self.enabled:
+            return NO_TIMER
+        return Timer(self, stage)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = dict()
+
+    def dump(self):
+        """
+        :return: dict of stage to histogram summary
+        """
+        with self.lock:
+            histograms = dict(self.histograms)
+        return dict((stage, histogram.to_dict()) for stage, histogram in histograms.iteritems())
+
+    def dump_to_file(self, file_name):
+        """
+        writes the summary of all histograms as JSON
+        :param file_name:
+        :return:None
+        """
+        with open(file_name, 'w') as outfile:
+            json.dump(self.dump(), outfile, indent=4, sort_keys=True)
+
+
+# instrumentation shared by all modules of the controller
+timing = Instrumentation()
@@ -32,6 +32,9 @@ class CIB(object):
 
             self.db.commit()
 
+        # records all changes of the tables if the state is kept on disk (see StateStore)
+        self.journal = None
+
     def commit(self):
 
         with self.lock:
@@ -56,18 +59,22 @@ class CIB(object):
                            (ingress_participant, prefix, sender_sdx))
             old_entry = cursor.fetchone()
             if type == "withdraw":
-                cursor.execute('DELETE FROM input WHERE i_participant = ? AND prefix = ? AND sender_sdx = ?',
-                               (ingress_participant, prefix, sender_sdx))
-                self.db.commit()
-                return True, old_entry, None
+                if old_entry:
+                    cursor.execute('DELETE FROM input WHERE i_participant = ? AND prefix = ? AND sender_sdx = ?',
+                                   (ingress_participant, prefix, sender_sdx))
+                    self.db.commit()
+                    if self.journal:
+                        self.journal('input', ingress_participant, prefix, sender_sdx, None)
+                    return True, old_entry, None
             else:
-                sdx_set = list(sdx_set)
-                sdx_set.sort()
+                sdx_set = ";".join(str(v) for v in sorted(sdx_set))
                 if not old_entry or old_entry["sdx_set"] != sdx_set:
                     cursor.execute('INSERT OR REPLACE INTO input (i_participant, prefix, sender_sdx, sdx_set)'
                                    'VALUES (?,?,?,?)',
-                                   (ingress_participant, prefix, sender_sdx, ";".join(str(v) for v in new_entry["sdx_set"])))
+                                   (ingress_participant, prefix, sender_sdx, sdx_set))
                     self.db.commit()
+                    if self.journal:
+                        self.journal('input', ingress_participant, prefix, sender_sdx, frozenset(new_entry["sdx_set"]))
 
                     return True, old_entry, new_entry
             return False, None, None
@@ -87,18 +94,22 @@ class CIB(object):
 
             if ci_entries:
                 new_entry = CIB.merge_ci_entries(ci_entries)
-                if not old_entry or new_entry["sdx_set"] != old_entry["sdx_set"]:
+                sdx_set = ";".join(str(v) for v in new_entry["sdx_set"])
+                if not old_entry or sdx_set != old_entry["sdx_set"]:
                     cursor.execute('INSERT OR REPLACE INTO local (i_participant, prefix, sdx_set) '
                                    'VALUES (?,?,?)',
-                                   (ingress_participant, prefix, ";".join(str(v) for v in new_entry["sdx_set"])))
+                                   (ingress_participant, prefix, sdx_set))
                     self.db.commit()
+                    if self.journal:
+                        self.journal('local', ingress_participant, prefix, frozenset(new_entry["sdx_set"]))
 
                     return True, old_entry, new_entry
-            else:
-                if old_entry:
-                    cursor.execute('DELETE FROM local WHERE i_participant = ? AND prefix = ?',
-                                   (ingress_participant, prefix))
-                    self.db.commit()
+            elif old_entry:
+                cursor.execute('DELETE FROM local WHERE i_participant = ? AND prefix = ?',
+                               (ingress_participant, prefix))
+                self.db.commit()
+                if self.journal:
+                    self.journal('local', ingress_participant, prefix, None)
                 return True, old_entry, None
             return False, None, None
 
@@ -145,27 +156,35 @@ class CIB(object):
                         cursor.execute('DELETE FROM output WHERE e_participant = ? AND prefix = ? AND receiver_participant = ?',
                                     (egress_participant, prefix, old_entry["receiver_participant"]))
                         self.db.commit()
+                    if self.journal:
+                        self.journal('output', egress_participant, prefix, receiver_participant,
+                                     frozenset(new_entry["sdx_set"]))
                     return True, old_entry, new_entry
             elif old_entry:
                 cursor.execute('DELETE FROM output WHERE e_participant = ? AND prefix = ?',
                                 (egress_participant, prefix))
                 self.db.commit()
+                if self.journal:
+                    self.journal('output', egress_participant, prefix, None, None)
                 return True, old_entry, None
             return False, None, None
 
     def delete_out_entry(self, egress_participant, prefix):
-        cursor = self.db.cursor()
-        cursor.execute('SELECT e_participant, prefix, receiver_participant, sdx_set FROM output '
+        with self.lock:
+            cursor = self.db.cursor()
+            cursor.execute('SELECT e_participant, prefix, receiver_participant, sdx_set FROM output '
                            'WHERE e_participant = ? AND prefix = ?',
                            (egress_participant, prefix))
-        old_entry = cursor.fetchone()
+            old_entry = cursor.fetchone()
 
-        if old_entry:
-            cursor.execute('DELETE FROM output WHERE e_participant = ? AND prefix = ?',
-                                (egress_participant, prefix))
-            self.db.commit()
-            return True, old_entry, None
-        return False, None, None
+            if old_entry:
+                cursor.execute('DELETE FROM output WHERE e_participant = ? AND prefix = ?',
+                               (egress_participant, prefix))
+                self.db.commit()
+                if self.journal:
+                    self.journal('output', egress_participant, prefix, None, None)
+                return True, old_entry, None
+            return False, None, None
 
     @staticmethod
     def merge_cl_entries(egress_participant, prefix, sdx_id, cl_entries, receiver_participant, policy):
@@ -194,6 +213,356 @@ class CIB(object):
             cl_entry = cursor.fetchone()
         return cl_entry
 
+    def get_sdx_set(self, prefix, ingress_participant):
+        """
+        :param prefix:
+        :param ingress_participant:
+        :return: set of SDXes of the local entry, empty if there is none
+        """
+        cl_entry = self.get_cl_entry(prefix, ingress_participant)
+        if cl_entry:
+            return set([int(v) for v in cl_entry["sdx_set"].split(";")])
+        return set()
+
+    def get_state(self):
+        """
+        :return: dict of table name to list of all entries of the table as tuples (see replay)
+        """
+        with self.lock:
+            cursor = self.db.cursor()
+            cursor.execute('SELECT i_participant, prefix, sender_sdx, sdx_set FROM input')
+            input_entries = [(row[0], row[1], row[2], CIB.parse_sdx_set(row[3])) for row in cursor.fetchall()]
+            cursor.execute('SELECT i_participant, prefix, sdx_set FROM local')
+            local_entries = [(row[0], row[1], CIB.parse_sdx_set(row[2])) for row in cursor.fetchall()]
+            cursor.execute('SELECT e_participant, prefix, receiver_participant, sdx_set FROM output')
+            output_entries = [(row[0], row[1], row[2], CIB.parse_sdx_set(row[3])) for row in cursor.fetchall()]
+
+        return {"input": input_entries, "local": local_entries, "output": output_entries}
+
+    def set_state(self, state):
+        with self.lock:
+            cursor = self.db.cursor()
+            for table in ["input", "local", "output"]:
+                cursor.execute('DELETE FROM ' + table)
+            for table, entries in state.iteritems():
+                for entry in entries:
+                    self.replay((table,) + tuple(entry))
+            self.db.commit()
+
+    def replay(self, record):
+        """
+        sets an entry to the value given in the record, an entry is deleted if the value is None
+        :param record: tuple ('input', i_participant, prefix, sender_sdx, sdx_set), ('local', i_participant, prefix,
+        sdx_set) or ('output', e_participant, prefix, receiver_participant, sdx_set)
+        :return:None
+        """
+        with self.lock:
+            cursor = self.db.cursor()
+            if record[0] == "input":
+                _, ingress_participant, prefix, sender_sdx, sdx_set = record
+                cursor.execute('DELETE FROM input WHERE i_participant = ? AND prefix = ? AND sender_sdx = ?',
+                               (ingress_participant, prefix, sender_sdx))
+                if sdx_set is not None:
+                    cursor.execute('INSERT INTO input (i_participant, prefix, sender_sdx, sdx_set) VALUES (?,?,?,?)',
+                                   (ingress_participant, prefix, sender_sdx, CIB.join_sdx_set(sdx_set)))
+            elif record[0] == "local":
+                _, ingress_participant, prefix, sdx_set = record
+                cursor.execute('DELETE FROM local WHERE i_participant = ? AND prefix = ?', (ingress_participant, prefix))
+                if sdx_set is not None:
+                    cursor.execute('INSERT INTO local (i_participant, prefix, sdx_set) VALUES (?,?,?)',
+                                   (ingress_participant, prefix, CIB.join_sdx_set(sdx_set)))
+            elif record[0] == "output":
+                _, egress_participant, prefix, receiver_participant, sdx_set = record
+                cursor.execute('DELETE FROM output WHERE e_participant = ? AND prefix = ?', (egress_participant, prefix))
+                if sdx_set is not None:
+                    cursor.execute('INSERT INTO output (e_participant, prefix, receiver_participant, sdx_set) '
+                                   'VALUES (?,?,?,?)',
+                                   (egress_participant, prefix, receiver_participant, CIB.join_sdx_set(sdx_set)))
+
+    @staticmethod
+    def parse_sdx_set(sdx_set):
+        return frozenset([int(v) for v in sdx_set.split(';')])
+
+    @staticmethod
+    def join_sdx_set(sdx_set):
+        return ";".join(str(v) for v in sorted(sdx_set))
+
+
+class LocalCIB(object):
+    """
+    In-memory CIB - the input, local and output tables are dicts keyed by participant and prefix and the SDX sets are
+    stored as frozensets, so they can be merged and compared without parsing. An update only reports a change if
+    the entry actually changed.
+    """
+    def __init__(self, sdx_id):
+        self.lock = lock()
+
+        # (i_participant, prefix) to dict of sender_sdx to sdx_set
+        self.input = dict()
+        # (i_participant, prefix) to sdx_set
+        self.local = dict()
+        # (e_participant, prefix) to tuple (receiver_participant, sdx_set)
+        self.output = dict()
+
+        # records all changes of the tables if the state is kept on disk (see StateStore)
+        self.journal = None
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def update_in(self, type, ingress_participant, prefix, sender_sdx, sdx_set=False):
+        key = (ingress_participant, prefix)
+
+        with self.lock:
+            sender_sets = self.input.get(key)
+            old_sdx_set = sender_sets.get(sender_sdx) if sender_sets else None
+            old_entry = LocalCIB.in_entry(ingress_participant, prefix, sender_sdx, old_sdx_set)
+
+            if type == "withdraw":
+                if old_sdx_set is not None:
+                    del sender_sets[sender_sdx]
+                    if not sender_sets:
+                        del self.input[key]
+                    if self.journal:
+                        self.journal('input', ingress_participant, prefix, sender_sdx, None)
+                    return True, old_entry, None
+            else:
+                sdx_set = frozenset(sdx_set)
+                if sdx_set != old_sdx_set:
+                    if sender_sets is None:
+                        sender_sets = dict()
+                        self.input[key] = sender_sets
+                    sender_sets[sender_sdx] = sdx_set
+                    if self.journal:
+                        self.journal('input', ingress_participant, prefix, sender_sdx, sdx_set)
+
+                    return True, old_entry, LocalCIB.in_entry(ingress_participant, prefix, sender_sdx, sdx_set)
+            return False, None, None
+
+    def update_loc(self, ingress_participant, prefix):
+        key = (ingress_participant, prefix)
+
+        with self.lock:
+            sender_sets = self.input.get(key)
+            old_sdx_set = self.local.get(key)
+            old_entry = LocalCIB.loc_entry(ingress_participant, prefix, old_sdx_set)
+
+            if sender_sets:
+                sdx_set = frozenset().union(*sender_sets.itervalues())
+                if sdx_set != old_sdx_set:
+                    self.local[key] = sdx_set
+                    if self.journal:
+                        self.journal('local', ingress_participant, prefix, sdx_set)
+                    return True, old_entry, LocalCIB.loc_entry(ingress_participant, prefix, sdx_set)
+            elif old_sdx_set is not None:
+                del self.local[key]
+                if self.journal:
+                    self.journal('local', ingress_participant, prefix, None)
+                return True, old_entry, None
+            return False, None, None
+
+    def update_out(self, egress_participant, prefix, receiver_participant, ingress_participants, sdx_id, policy):
+        key = (egress_participant, prefix)
+
+        with self.lock:
+            cl_sets = [self.local[(participant, prefix)] for participant in ingress_participants
+                       if (participant, prefix) in self.local]
+
+            old_value = self.output.get(key)
+            old_entry = LocalCIB.out_entry(egress_participant, prefix, old_value)
+
+            if policy or cl_sets:
+                sdx_set = frozenset([sdx_id]).union(*cl_sets)
+                new_value = (receiver_participant, sdx_set)
+                if new_value != old_value:
+                    self.output[key] = new_value
+                    if self.journal:
+                        self.journal('output', egress_participant, prefix, receiver_participant, sdx_set)
+                    return True, old_entry, LocalCIB.out_entry(egress_participant, prefix, new_value)
+            elif old_value is not None:
+                del self.output[key]
+                if self.journal:
+                    self.journal('output', egress_participant, prefix, None, None)
+                return True, old_entry, None
+            return False, None, None
+
+    def delete_out_entry(self, egress_participant, prefix):
+        with self.lock:
+            old_value = self.output.pop((egress_participant, prefix), None)
+            if old_value is not None:
+                if self.journal:
+                    self.journal('output', egress_participant, prefix, None, None)
+                return True, LocalCIB.out_entry(egress_participant, prefix, old_value), None
+            return False, None, None
+
+    def get_cl_entry(self, prefix, ingress_participant):
+        with self.lock:
+            return LocalCIB.loc_entry(ingress_participant, prefix, self.local.get((ingress_participant, prefix)))
+
+    def get_sdx_set(self, prefix, ingress_participant):
+        with self.lock:
+            return set(self.local.get((ingress_participant, prefix), ()))
+
+    def get_state(self):
+        """
+        :return: dict of table name to list of all entries of the table as tuples (see replay)
+        """
+        with self.lock:
+            return {"input": [(key[0], key[1], sender_sdx, sdx_set) for key, sender_sets in self.input.iteritems()
+                              for sender_sdx, sdx_set in sender_sets.iteritems()],
+                    "local": [(key[0], key[1], sdx_set) for key, sdx_set in self.local.iteritems()],
+                    "output": [(key[0], key[1], value[0], value[1]) for key, value in self.output.iteritems()]}
+
+    def set_state(self, state):
+        with self.lock:
+            self.input = dict()
+            self.local = dict()
+            self.output = dict()
+            for table, entries in state.iteritems():
+                for entry in entries:
+                    self.replay((table,) + tuple(entry))
+
+    def replay(self, record):
+        """
+        sets an entry to the value given in the record, an entry is deleted if the value is None
+        :param record: tuple ('input', i_participant, prefix, sender_sdx, sdx_set), ('local', i_participant, prefix,
+        sdx_set) or ('output', e_participant, prefix, receiver_participant, sdx_set)
+        :return:None
+        """
+        with self.lock:
+            key = (record[1], record[2])
+            if record[0] == "input":
+                sender_sdx, sdx_set = record[3], record[4]
+                if sdx_set is not None:
+                    self.input.setdefault(key, dict())[sender_sdx] = frozenset(sdx_set)
+                elif key in self.input:
+                    self.input[key].pop(sender_sdx, None)
+                    if not self.input[key]:
+                        del self.input[key]
+            elif record[0] == "local":
+                if record[3] is not None:
+                    self.local[key] = frozenset(record[3])
+                else:
+                    self.local.pop(key, None)
+            elif record[0] == "output":
+                if record[4] is not None:
+                    self.output[key] = (record[3], frozenset(record[4]))
+                else:
+                    self.output.pop(key, None)
+
+    @staticmethod
+    def in_entry(ingress_participant, prefix, sender_sdx, sdx_set):
+        if sdx_set is None:
+            return None
+        return {"i_participant": ingress_participant, "prefix": prefix, "sender_sdx": sender_sdx, "sdx_set": sdx_set}
+
+    @staticmethod
+    def loc_entry(ingress_participant, prefix, sdx_set):
+        if sdx_set is None:
+            return None
+        return {"i_participant": ingress_participant, "prefix": prefix, "sdx_set": sdx_set}
+
+    @staticmethod
+    def out_entry(egress_participant, prefix, value):
+        if value is None:
+            return None
+        return {"e_participant": egress_participant, "prefix": prefix, "receiver_participant": value[0],
+                "sdx_set": value[1]}
+
+
+# available CIB backends - can be selected in the config using "CIB Backend"
+CIB_BACKENDS = {
+    "sqlite": CIB,
+    "local": LocalCIB
+}
+
+
+def prefix_partition(prefix, num_partitions):
+    """
+    :param prefix:
+    :param num_partitions:
+    :return: index of the partition the prefix belongs to
+    """
+    return hash(prefix) % num_partitions
+
+
+class PartitionedCIB(object):
+    """
+    CIB split by prefix into independent partitions, each with its own tables and lock. All entries of a prefix
+    are in the same partition, so prefixes of different partitions can be updated at the same time.
+    """
+    def __init__(self, sdx_id, num_partitions, cib_backend="local"):
+        self.num_partitions = num_partitions
+        self.partitions = [CIB_BACKENDS[cib_backend](sdx_id) for _ in range(0, num_partitions)]
+
+        # records all changes of the tables if the state is kept on disk (see StateStore)
+        self.journal = None
+        for partition in self.partitions:
+            partition.journal = self.write_journal
+
+    def write_journal(self, *record):
+        if self.journal:
+            self.journal(*record)
+
+    def get_state(self):
+        """
+        :return: dict of table name to list of all entries of the table, independent of the number of partitions
+        """
+        state = {"input": [], "local": [], "output": []}
+        for partition in self.partitions:
+            for table, entries in partition.get_state().iteritems():
+                state[table].extend(entries)
+        return state
+
+    def set_state(self, state):
+        partition_states = [dict((table, list()) for table in state) for _ in self.partitions]
+        for table, entries in state.iteritems():
+            for entry in entries:
+                # the second element of every entry is the prefix
+                partition_states[prefix_partition(entry[1], self.num_partitions)][table].append(entry)
+
+        for partition, partition_state in zip(self.partitions, partition_states):
+            partition.set_state(partition_state)
+
+    def replay(self, record):
+        self.partition(record[2]).replay(record)
+
+    def restored(self):
+        pass
+
+    def partition(self, prefix):
+        return self.partitions[prefix_partition(prefix, self.num_partitions)]
+
+    def commit(self):
+        for partition in self.partitions:
+            partition.commit()
+
+    def rollback(self):
+        for partition in self.partitions:
+            partition.rollback()
+
+    def update_in(self, type, ingress_participant, prefix, sender_sdx, sdx_set=False):
+        return self.partition(prefix).update_in(type, ingress_participant, prefix, sender_sdx, sdx_set)
+
+    def update_loc(self, ingress_participant, prefix):
+        return self.partition(prefix).update_loc(ingress_participant, prefix)
+
+    def update_out(self, egress_participant, prefix, receiver_participant, ingress_participants, sdx_id, policy):
+        return self.partition(prefix).update_out(egress_participant, prefix, receiver_participant,
+                                                 ingress_participants, sdx_id, policy)
+
+    def delete_out_entry(self, egress_participant, prefix):
+        return self.partition(prefix).delete_out_entry(egress_participant, prefix)
+
+    def get_cl_entry(self, prefix, ingress_participant):
+        return self.partition(prefix).get_cl_entry(prefix, ingress_participant)
+
+    def get_sdx_set(self, prefix, ingress_participant):
+        return self.partition(prefix).get_sdx_set(prefix, ingress_participant)
+
 
 ''' main '''
 if __name__ == '__main__':
@@ -0,0 +1,228 @@
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import socket
+import struct
+import logging
+import cPickle as pickle
+
+from time import time
+from select import select
+from collections import deque
+from threading import Condition, Lock, Thread
+
+# time in seconds before a failed connection is retried, doubled after each failed attempt up to MAX_RECONNECT_DELAY
+MIN_RECONNECT_DELAY = 0.1
+MAX_RECONNECT_DELAY = 10
+# max number of messages kept per SDX while it is not reachable, the oldest ones are dropped first
+MAX_PENDING_MESSAGES = 10000
+# time in seconds to wait for a connection to be established
+CONNECT_TIMEOUT = 2
+# time in seconds a message may take to be sent before the connection is considered broken
+SEND_TIMEOUT = 5
+
+
+def open_connection(address, port):
+    """
+    opens a connection to a multiprocessing.connection.Listener (without authentication), but fails right away if
+    nobody is listening instead of retrying for 20 seconds like multiprocessing.connection.Client
+    :param address:
+    :param port:
+    :return: socket
+    """
+    return socket.create_connection((address, port), CONNECT_TIMEOUT)
+
+
+def send_message(sock, obj, timeout):
+    """
+    sends the object in the format of multiprocessing.connection.Connection.send (length-prefixed pickle), but
+    gives up once the whole message could not be sent within the timeout, even if the other side reads slowly
+    :param sock: socket
+    :param obj: picklable object
+    :param timeout: time in seconds
+    :return:None
+    """
+    data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    data = memoryview(struct.pack('!i', len(data)) + data)
+
+    deadline = time() + timeout
+    while data:
+        remaining = deadline - time()
+        if remaining <= 0:
+            raise socket.timeout('sending the message timed out')
+        sock.settimeout(remaining)
+        data = data[sock.send(data):]
+
+
+class SDXConnection(object):
+    """
+    Connection to a single neighbor SDX and the messages that could not be sent yet. The messages are sent by a
+    thread of the connection, so an SDX that is not reachable or does not read does not hold up the messages to the
+    other SDXes.
+    """
+    def __init__(self, sdx_id, address, port):
+        self.logger = logging.getLogger("ConnectionPool")
+
+        self.sdx_id = sdx_id
+        self.address = address
+        self.port = port
+
+        # the condition protects pending, next_attempt and run, the connection is only used by the thread
+        self.condition = Condition(Lock())
+        self.pending = deque()
+        self.conn = None
+
+        self.reconnect_delay = MIN_RECONNECT_DELAY
+        self.next_attempt = 0
+
+        self.run = True
+        self.thread = Thread(target=self.process, name="sender SDX " + str(sdx_id))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, data):
+        """
+        queues the data to be sent to the SDX
+        :param data: string
+        :return:None
+        """
+        with self.condition:
+            if len(self.pending) >= MAX_PENDING_MESSAGES:
+                self.pending.popleft()
+                self.logger.debug('dropped the oldest pending message to SDX ' + str(self.sdx_id))
+            self.pending.append(data)
+            self.condition.notify()
+
+    def process(self):
+        while True:
+            with self.condition:
+                while self.run and (not self.pending or time() < self.next_attempt):
+                    if self.pending:
+                        self.condition.wait(self.next_attempt - time())
+                    else:
+                        self.condition.wait()
+                if not self.run:
+                    break
+                data = self.pending[0]
+
+            sent = self.send(data)
+
+            with self.condition:
+                if not sent:
+                    self.back_off()
+                # the message might have been dropped in the meantime, if too many messages were queued
+                elif self.pending and self.pending[0] is data:
+                    self.pending.popleft()
+
+        self.disconnect()
+
+    def send(self, data):
+        """
+        :param data: string
+        :return: True if the data was sent
+        """
+        # try once more with a new connection, as the connection might have been closed while idle
+        for _ in range(0, 2):
+            if not self.connect():
+                return False
+
+            try:
+                send_message(self.conn, data, SEND_TIMEOUT)
+                return True
+            except (IOError, socket.error) as e:
+                self.logger.debug('sending to SDX ' + str(self.sdx_id) + ' failed: ' + str(e))
+                self.disconnect()
+        return False
+
+    def connect(self):
+        """
+        makes sure the connection is open and healthy
+        :return: True if the connection can be used
+        """
+        if self.conn is not None:
+            try:
+                # the other side only ever closes the connection
+                readable, _, _ = select([self.conn], [], [], 0)
+                if not readable:
+                    return True
+            except (IOError, socket.error):
+                pass
+            self.disconnect()
+
+        try:
+            self.conn = open_connection(self.address, self.port)
+        except (IOError, socket.error) as e:
+            self.logger.debug('connecting to SDX ' + str(self.sdx_id) + ' failed: ' + str(e))
+            return False
+
+        with self.condition:
+            self.reconnect_delay = MIN_RECONNECT_DELAY
+        return True
+
+    def back_off(self):
+        """
+        delays the next attempt - the condition has to be held by the caller
+        :return:None
+        """
+        self.logger.debug('retry SDX ' + str(self.sdx_id) + ' in ' + str(self.reconnect_delay) + 's')
+        self.next_attempt = time() + self.reconnect_delay
+        self.reconnect_delay = min(self.reconnect_delay * 2, MAX_RECONNECT_DELAY)
+
+    def disconnect(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except (IOError, socket.error):
+                pass
+            self.conn = None
+
+    def stop(self):
+        """
+        stops the thread once it is done with the current message, the pending messages are dropped
+        :return:None
+        """
+        with self.condition:
+            self.run = False
+            self.condition.notify()
+
+
+class ConnectionPool(object):
+    """
+    Keeps one long-lived connection per neighbor SDX. A connection is opened when the first message is sent to the
+    SDX. Before each use it is checked whether the other side closed it (the other side never sends anything, so a
+    readable connection is closed). If a connection cannot be (re)established, the messages are kept and sent once
+    the connection is back - the next attempt is made after a delay that doubles with every failed attempt.
+
+    The lock of the pool only protects the dict of connections, each connection sends its messages in its own thread.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.connections = dict()
+
+    def send(self, sdx_id, address, port, data):
+        """
+        queues the data to be sent to the SDX
+        :param sdx_id:
+        :param address: address of the loop detector of the SDX
+        :param port: port of the loop detector of the SDX
+        :param data: string
+        :return:None
+        """
+        with self.lock:
+            connection = self.connections.get(sdx_id)
+            if connection is None:
+                connection = SDXConnection(sdx_id, address, port)
+                self.connections[sdx_id] = connection
+
+        connection.put(data)
+
+    def close(self):
+        with self.lock:
+            connections = self.connections.values()
+            self.connections = dict()
+
+        for connection in connections:
+            connection.stop()
+        # a thread might be stuck in a connect or a send
+        for connection in connections:
+            connection.thread.join(CONNECT_TIMEOUT + SEND_TIMEOUT)
@@ -5,48 +5,61 @@
 import json
 
 from random import randint
-from time import time, clock
+from time import time
 from collections import defaultdict
-from multiprocessing.connection import Listener, Client
+from multiprocessing.connection import Listener
 from multiprocessing.queues import Queue
-from Queue import Empty
+from Queue import Queue as WorkerQueue, Empty
 from threading import Thread
 
 from lib import XCTRLModule, XCTRLEvent
+from instrumentation import timing
 
-from cib import CIB
+from cib import PartitionedCIB, prefix_partition
+from connection_pool import ConnectionPool
+from notification_batcher import NotificationBatcher, NOTIFICATION_BATCH_SIZE, NOTIFICATION_BATCH_LATENCY
 
 LOG = False
 
+# number of threads processing the received correctness messages, the CIB is partitioned accordingly
+CORRECTNESS_WORKERS = 4
+
 
 class LoopDetector(XCTRLModule):
-    def __init__(self, config, event_queue, debug, rib, policy_handler, test, no_notifications, rib_timing, notification_timing):
+    def __init__(self, config, event_queue, debug, rib, policy_handler, test, no_notifications):
         super(LoopDetector, self).__init__(config, event_queue, debug)
 
         self.config = config
 
-        self.cib = CIB(self.config.id)
+        # the received correctness messages are processed by several workers, each owns a partition of the CIB
+        self.num_workers = self.config.loop_detector.num_workers
+        self.cib = PartitionedCIB(self.config.id, self.num_workers, self.config.loop_detector.cib_backend)
+        self.worker_queues = [WorkerQueue(1000) for _ in range(0, self.num_workers)]
+
         self.rib = rib
         self.policy_handler = policy_handler
 
-        # mapping of participant and prefix to list of forbidden forward participants
+        # mapping of participant and prefix to list of forbidden forward participants - the entries of the
+        # participants are created upfront as they are accessed by all workers
         self.forbidden_paths = defaultdict(lambda: defaultdict(list))
+        for participant in self.config.participants:
+            self.forbidden_paths[participant] = defaultdict(list)
+        # the cached VMACs of a participant and prefix depend on the forbidden paths
+        self.vmac_encoder = None
+        # records the changes of the forbidden paths if the state is kept on disk (see StateStore)
+        self.journal = None
 
         self.run = False
         self.listener = Listener((self.config.sdx.address, self.config.loop_detector.port), authkey=None)
         self.msg_in_queue = Queue(1000)
         self.msg_out_queue = Queue(1000)
+        # connections to the neighbor SDXes, kept open between messages
+        self.connection_pool = ConnectionPool()
+        self.notification_batcher = NotificationBatcher(self.config.loop_detector.notification_batch_latency,
+                                                        self.config.loop_detector.notification_batch_size)
 
         self.no_notifications = no_notifications
 
-        self.rib_timing = rib_timing
-        if self.rib_timing:
-            self.rib_timing_file = 'rib_timing_' + str(int(time())) + '.log'
-
-        self.notification_timing = notification_timing
-        if self.notification_timing:
-            self.notification_timing_file = 'notification_timing_' + str(int(time())) + '.log'
-
     def start(self):
         self.run = True
 
@@ -54,24 +67,55 @@ class LoopDetector(XCTRLModule):
         msg_in_processor.daemon = True
         msg_in_processor.start()
 
+        for i, worker_queue in enumerate(self.worker_queues):
+            worker = Thread(target=self.correctness_message_worker, args=(worker_queue,),
+                            name="correctness worker " + str(i))
+            worker.daemon = True
+            worker.start()
+
         msg_out_processor = Thread(target=self.correctness_message_sender)
         msg_out_processor.daemon = True
         msg_out_processor.start()
 
         while self.run:
             conn = self.listener.accept()
-            tmp = conn.recv()
-            conn.close()
 
-            if tmp == 'DONE':
-                print 'DONE RECEIVED ' + str(time())
-                self.msg_in_queue.put(tmp)
-                continue
+            # a neighbor SDX keeps its connection open and sends all its messages over it
+            receiver = Thread(target=self.receive_correctness_messages, args=(conn,), name="correctness receiver")
+            receiver.daemon = True
+            receiver.start()
 
-            self.msg_in_queue.put(json.loads(tmp))
+    def receive_correctness_messages(self, conn):
+        """
+        receives messages until the other side closes the connection
+        :param conn: accepted connection
+        :return:None
+        """
+        try:
+            while self.run:
+                tmp = conn.recv()
+
+                if tmp == 'DONE':
+                    print 'DONE RECEIVED ' + str(time())
+                    self.msg_in_queue.put(tmp)
+                    continue
+
+                try:
+                    self.msg_in_queue.put(json.loads(tmp))
+                except ValueError:
+                    self.logger.debug("Error: received invalid correctness message " + str(tmp))
+        except (EOFError, IOError):
+            pass
+        finally:
+            conn.close()
 
     def stop(self):
         self.run = False
+        self.connection_pool.close()
+
+        statistics = self.notification_batcher.get_statistics()
+        self.logger.info("correctness messages - queued: " + str(statistics["received"]) +
+                         ", sent: " + str(statistics["emitted"]) + ", cancelled: " + str(statistics["cancelled"]))
 
     def activate_policy(self, ingress_participant, egress_participant):
         """
@@ -125,8 +169,9 @@ class LoopDetector(XCTRLModule):
 
     def process_correctness_message(self):
         """
-        processes a correctness message that has been received from another SDX. The CIB is updated accordingly
-        and other SDXes are notified if necessary
+        distributes the correctness messages that have been received from other SDXes to the workers. The messages
+        are partitioned by prefix like the CIB, so all messages of a prefix are processed by the same worker in the
+        order they were received
         :return:None
         """
 
@@ -139,81 +184,113 @@ class LoopDetector(XCTRLModule):
                 continue
 
             if messages == 'DONE':
+                # wait until the workers processed all messages received before
+                for worker_queue in self.worker_queues:
+                    worker_queue.join()
                 print 'DONE Processed ' + str(time())
                 continue
 
             if not isinstance(messages, list):
                 messages = [messages]
-            else:
-                messages = messages
 
+            partitioned_messages = defaultdict(list)
             for msg in messages:
+                partitioned_messages[prefix_partition(msg["prefix"], self.num_workers)].append(msg)
+
+            for partition, partition_messages in partitioned_messages.iteritems():
+                self.worker_queues[partition].put(partition_messages)
+
+    def correctness_message_worker(self, worker_queue):
+        """
+        processes the correctness messages of one partition of the prefixes
+        :param worker_queue: queue of lists of correctness messages
+        :return:None
+        """
+
+        while self.run:
+            try:
+                messages = worker_queue.get(True, 1)
+
+            except Empty:
+                continue
+
+            for msg in messages:
+                try:
+                    self.handle_correctness_message(msg)
+                except Exception:
+                    self.logger.exception("Error while processing correctness message concerning " + str(msg["prefix"]))
+
+            worker_queue.task_done()
+
+    def handle_correctness_message(self, msg):
+        """
+        processes a correctness message that has been received from another SDX. The CIB is updated accordingly
+        and other SDXes are notified if necessary
+        :param msg: correctness message
+        :return:None
+        """
+
+        self.logger.debug("Received Correctness Message from " + str(msg["sender_sdx"]) +
+                          " concerning " + str(msg["prefix"]))
+
+        start_time = time()
+
+        changes = list()
+        ingress_participant = self.config.asn_2_participant[msg["ingress_participant"]]
+
+        ci_update, old_ci_entry, new_ci_entry = self.cib.update_in(msg["type"],
+                                                                   ingress_participant,
+                                                                   msg["prefix"],
+                                                                   msg["sender_sdx"],
+                                                                   msg["sdx_set"])
+
+        if ci_update:
+            cl_update, old_cl_entry, new_cl_entry = self.cib.update_loc(ingress_participant, msg["prefix"])
+
+            if cl_update:
+                egress_participants = self.policy_handler.get_egress_participants(ingress_participant)
+                best_participants = self.rib.get_best_path_participants(ingress_participant)
+                egress_participants = egress_participants.union(best_participants)
+                filter_participants = self.rib.get_all_participants_advertising(msg["prefix"])
+                egress_participants = egress_participants.intersection(filter_participants)
+
+                for filter_participant in filter_participants:
+                    changes.append(self.update_forbidden_paths(msg["prefix"],
+                                                               None,
+                                                               set(msg["sdx_set"]),
+                                                               ingress_participant,
+                                                               filter_participant))
+
+                for egress_participant in egress_participants:
+                    ingress_participants = set(self.policy_handler.get_ingress_participants(egress_participant))
+                    active_policies = True if ingress_participants else False
+                    ingress_participants.update(self.rib.get_all_participants_using_best_path(msg["prefix"],
+                                                                                              egress_participant))
+                    filter_participants_2 = self.rib.get_all_receiver_participants(msg["prefix"],
+                                                                                   egress_participant)
+                    ingress_participants = ingress_participants.intersection(filter_participants_2)
+                    ingress_participants = ingress_participants.difference(filter_participants)
+
+                    receiver_participant = self.get_first_sdx_participant_on_path(msg["prefix"], egress_participant)
+
+                    if receiver_participant:
+                        co_update, old_co_entry, new_co_entry = self.cib.update_out(egress_participant,
+                                                                                    msg["prefix"],
+                                                                                    receiver_participant,
+                                                                                    ingress_participants,
+                                                                                    self.config.id,
+                                                                                    active_policies)
+
+                        random_value = randint(0, self.config.loop_detector.max_random_value)
+                        timestamp = time()
 
-                self.logger.debug("Received Correctness Message from " + str(msg["sender_sdx"]) +
-                                  " concerning " + str(msg["prefix"]))
-
-                if self.notification_timing:
-                    start_time = clock()
-
-                changes = list()
-                ingress_participant = self.config.asn_2_participant[msg["ingress_participant"]]
-
-                ci_update, old_ci_entry, new_ci_entry = self.cib.update_in(msg["type"],
-                                                                           ingress_participant,
-                                                                           msg["prefix"],
-                                                                           msg["sender_sdx"],
-                                                                           msg["sdx_set"])
-
-                if ci_update:
-                    cl_update, old_cl_entry, new_cl_entry = self.cib.update_loc(ingress_participant, msg["prefix"])
-
-                    if cl_update:
-                        egress_participants = self.policy_handler.get_egress_participants(ingress_participant)
-                        best_participants = self.rib.get_best_path_participants(ingress_participant)
-                        egress_participants = egress_participants.union(best_participants)
-                        filter_participants = self.rib.get_all_participants_advertising(msg["prefix"])
-                        egress_participants = egress_participants.intersection(filter_participants)
-
-                        for filter_participant in filter_participants:
-                            changes.append(self.update_forbidden_paths(msg["prefix"],
-                                                                       None,
-                                                                       set(msg["sdx_set"]),
-                                                                       ingress_participant,
-                                                                       filter_participant))
-
-                        for egress_participant in egress_participants:
-                            ingress_participants = self.policy_handler.get_ingress_participants(egress_participant)
-                            active_policies = True if ingress_participants else False
-                            ingress_participants.update(self.rib.get_all_participants_using_best_path(msg["prefix"],
-                                                                                                      egress_participant))
-                            filter_participants_2 = self.rib.get_all_receiver_participants(msg["prefix"],
-                                                                                           egress_participant)
-                            ingress_participants = ingress_participants.intersection(filter_participants_2)
-                            ingress_participants = ingress_participants.difference(filter_participants)
-
-                            receiver_participant = self.get_first_sdx_participant_on_path(msg["prefix"], egress_participant)
-
-                            if receiver_participant:
-                                co_update, old_co_entry, new_co_entry = self.cib.update_out(egress_participant,
-                                                                                            msg["prefix"],
-                                                                                            receiver_participant,
-                                                                                            ingress_participants,
-                                                                                            self.config.id,
-                                                                                            active_policies)
-
-                                random_value = randint(0, self.config.loop_detector.max_random_value)
-                                timestamp = time()
-
-                                self.notify_nh_sdx(co_update, old_co_entry, new_co_entry, timestamp, random_value)
-
-                        if changes:
-                            event = XCTRLEvent("LoopDetector", "FORBIDDEN PATHS CHANGE", changes)
-                            self.event_queue.put(event)
-
-                if self.notification_timing:
-                    end_time = clock()
-                    with open(self.notification_timing_file, "a") as outfile:
-                        outfile.write(str(end_time - start_time) + '\n')
+                        self.notify_nh_sdx(co_update, old_co_entry, new_co_entry, timestamp, random_value)
+
+                if changes:
+                    event = XCTRLEvent("LoopDetector", "FORBIDDEN PATHS CHANGE", changes)
+                    self.event_queue.put(event)
+
+        timing.record('correctness message', time() - start_time)
 
     def rib_update(self, updates):
         """
@@ -224,8 +301,7 @@ class LoopDetector(XCTRLModule):
 
         self.logger.debug("RIB Update")
 
-        if self.rib_timing:
-            start_time = clock()
+        start_time = time()
 
         for tmp_update in updates:
             if 'announce' in tmp_update:
@@ -248,7 +324,7 @@ class LoopDetector(XCTRLModule):
                                             advertising_participant)
 
             if 'announce' in tmp_update:
-                ingress_participants = self.policy_handler.get_ingress_participants(advertising_participant)
+                ingress_participants = set(self.policy_handler.get_ingress_participants(advertising_participant))
                 active_policies = True if ingress_participants else False
                 ingress_participants.update(self.rib.get_all_participants_using_best_path(update["prefix"],
                                                                                           advertising_participant))
@@ -281,10 +357,7 @@ class LoopDetector(XCTRLModule):
 
                 self.notify_nh_sdx(co_update, old_co_entry, new_co_entry, timestamp, random_value)
 
-        if self.rib_timing:
-            end_time = clock()
-            with open(self.rib_timing_file, "a") as outfile:
-                outfile.write(str(end_time - start_time) + '\n')
+        timing.record('cib update', time() - start_time)
 
         self.logger.debug("Done processing RIB Update")
 
@@ -305,24 +378,29 @@ class LoopDetector(XCTRLModule):
 
     def correctness_message_sender(self):
         """
-        retrieves messages from the queue and send them to the respective neighbor SDX
+        retrieves messages from the queue and sends them to the respective neighbor SDX - the messages to the same SDX
+        are collected for a short time and sent together as a list
         :return:None
         """
         while self.run:
+            timeout = self.notification_batcher.time_left()
             try:
-                msg = self.msg_out_queue.get(True, 1)
+                msg = self.msg_out_queue.get(True, 1 if timeout is None else max(timeout, 0.001))
 
             except Empty:
-                # self.logger.debug("Empty Queue")
-                continue
+                msg = None
 
-            if msg[0] in self.config.sdx_registry:
-                next_sdx = self.config.sdx_registry[msg[0]]
-                conn = Client((next_sdx.address, next_sdx.port))
-                conn.send(json.dumps(msg[1]))
-                conn.close()
-            else:
-                self.logger.debug("Error: SDX " + str(msg[0]) + " is not in the SDX registry")
+            if msg is not None:
+                if msg[0] in self.config.sdx_registry:
+                    self.notification_batcher.add(msg[0], msg[1])
+                else:
+                    self.logger.debug("Error: SDX " + str(msg[0]) + " is not in the SDX registry")
+
+            if self.notification_batcher.is_due():
+                for sdx_id, messages in self.notification_batcher.flush():
+                    next_sdx = self.config.sdx_registry[sdx_id]
+                    with timing.measure('notification send'):
+                        self.connection_pool.send(sdx_id, next_sdx.address, next_sdx.port, json.dumps(messages))
 
     def notify_nh_sdx(self, update, old_cib_entry, new_cib_entry, timestamp, random_value):
         """
@@ -355,7 +433,7 @@ class LoopDetector(XCTRLModule):
                 announce_msg = {"type": "announce",
                                 "prefix": new_cib_entry["prefix"],
                                 "sender_sdx": self.config.id,
-                                "sdx_set": new_cib_entry["sdx_set"],
+                                "sdx_set": sorted(new_cib_entry["sdx_set"]),
                                 "ingress_participant": new_cib_entry["receiver_participant"],
                                 "timestamp": timestamp,
                                 "random_value": random_value
@@ -390,6 +468,7 @@ class LoopDetector(XCTRLModule):
             else:
                 if egress_participant in self.forbidden_paths[ingress_participant][prefix]:
                     self.forbidden_paths[ingress_participant][prefix].remove(egress_participant)
+                    self.forbidden_paths_changed(prefix, ingress_participant)
                 self.logger.debug("update forbidden paths for " + str(ingress_participant) + " - " + str(prefix) +
                                   " results in " + str(self.forbidden_paths[ingress_participant][prefix]))
 
@@ -399,19 +478,17 @@ class LoopDetector(XCTRLModule):
                 return change
         as_path_sdxes = self.get_sdxes_on_path([int(v) for v in as_path.split(" ")])
         if not sdx_set:
-            cl_entry = self.cib.get_cl_entry(prefix, ingress_participant)
-            if cl_entry:
-                sdx_set = set([int(v) for v in cl_entry["sdx_set"].split(";")])
-            else:
-                sdx_set = set()
+            sdx_set = self.cib.get_sdx_set(prefix, ingress_participant)
 
         intersection = sdx_set.intersection(as_path_sdxes)
 
         if len(intersection) > 0:
             if egress_participant not in self.forbidden_paths[ingress_participant][prefix]:
                 self.forbidden_paths[ingress_participant][prefix].append(egress_participant)
+                self.forbidden_paths_changed(prefix, ingress_participant)
         elif egress_participant in self.forbidden_paths[ingress_participant][prefix]:
             self.forbidden_paths[ingress_participant][prefix].remove(egress_participant)
+            self.forbidden_paths_changed(prefix, ingress_participant)
 
         self.logger.debug("update forbidden paths for " + str(ingress_participant) + " - " +
                           str(prefix) + " results in " + str(self.forbidden_paths[ingress_participant][prefix]))
@@ -421,6 +498,35 @@ class LoopDetector(XCTRLModule):
 
         return change
 
+    def forbidden_paths_changed(self, prefix, participant):
+        if self.vmac_encoder:
+            self.vmac_encoder.invalidate_prefix_vmacs(prefix, participant)
+        if self.journal:
+            # the current list is recorded, so the last record of the prefix is always up to date, even if it was
+            # changed by another thread in the meantime
+            self.journal(participant, prefix, list(self.forbidden_paths[participant][prefix]))
+
+    def get_state(self):
+        """
+        :return: forbidden paths as dict of participant to dict of prefix to list of forbidden forward participants
+        """
+        return dict((participant, dict((prefix, list(forward_participants))
+                                       for prefix, forward_participants in paths.items() if forward_participants))
+                    for participant, paths in self.forbidden_paths.items())
+
+    def set_state(self, state):
+        # the forbidden paths are shared with the VMAC encoder, so they are replaced in place
+        for participant, paths in state.iteritems():
+            self.forbidden_paths[participant].clear()
+            self.forbidden_paths[participant].update(paths)
+
+    def replay(self, record):
+        participant, prefix, forward_participants = record
+        self.forbidden_paths[participant][prefix] = forward_participants
+
+    def restored(self):
+        pass
+
     def get_sdxes_on_path(self, as_path):
         """
         Finds all the potential SDXes on the AS path
@@ -468,8 +574,15 @@ class LoopDetector(XCTRLModule):
 
 
 class LoopDetectorConfig(object):
-    def __init__(self, sdx_2_asn, asn_2_sdx, max_random_value, port):
+    def __init__(self, sdx_2_asn, asn_2_sdx, max_random_value, port,
+                 notification_batch_size=NOTIFICATION_BATCH_SIZE,
+                 notification_batch_latency=NOTIFICATION_BATCH_LATENCY,
+                 num_workers=CORRECTNESS_WORKERS, cib_backend="local"):
         self.sdx_2_asn = sdx_2_asn
         self.asn_2_sdx = asn_2_sdx
         self.max_random_value = max_random_value
         self.port = port
+        self.notification_batch_size = notification_batch_size
+        self.notification_batch_latency = notification_batch_latency
+        self.num_workers = num_workers
+        self.cib_backend = cib_backend
@@ -0,0 +1,126 @@
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import time
+
+from collections import OrderedDict
+
+# max number of messages to a single SDX that are sent together
+NOTIFICATION_BATCH_SIZE = 1000
+# max time in seconds a message is held back to be sent together with the following ones
+NOTIFICATION_BATCH_LATENCY = 0.05
+# max number of withdrawn prefixes and ingress participants remembered per SDX, the least recently withdrawn are
+# forgotten first
+MAX_WITHDRAWN_KEYS = 100000
+
+
+class NotificationBatcher(object):
+    """
+    Collects the correctness messages to the neighbor SDXes and sends all messages to the same SDX as one list. The
+    receiving SDX only keeps the last message of each prefix and ingress participant (an announcement replaces the
+    entry, a withdrawal removes it), so only the last message of each prefix and ingress participant is sent.
+    A withdrawal cancels an announcement of the same batch, i.e. both are dropped, if the last message sent to the SDX
+    for the prefix and ingress participant was a withdrawal, so the SDX has no entry to remove. Nothing is assumed
+    about the messages sent before a restart, so until then the withdrawal is sent. The same holds for the withdrawals
+    that were forgotten because more than max_withdrawn withdrawals were sent to the SDX later on.
+    """
+    def __init__(self, max_delay=NOTIFICATION_BATCH_LATENCY, max_size=NOTIFICATION_BATCH_SIZE,
+                 max_withdrawn=MAX_WITHDRAWN_KEYS):
+        self.max_delay = max_delay
+        self.max_size = max_size
+        self.max_withdrawn = max_withdrawn
+
+        # messages per SDX - prefix and ingress participant to the last message
+        self.pending = OrderedDict()
+        self.first_message_time = None
+        self.full = False
+
+        # prefixes and ingress participants per SDX whose last sent message was a withdrawal, in the order they were
+        # withdrawn (used as LRU set, the values are not used)
+        self.withdrawn = dict()
+
+        # statistics
+        self.received = 0
+        self.emitted = 0
+        self.cancelled = 0
+
+    def add(self, sdx, msg):
+        """
+        :param sdx: id of the receiving SDX
+        :param msg: correctness message
+        :return:None
+        """
+        if not self.pending:
+            self.first_message_time = time.time()
+
+        messages = self.pending.get(sdx)
+        if messages is None:
+            messages = OrderedDict()
+            self.pending[sdx] = messages
+
+        key = (msg["prefix"], msg["ingress_participant"])
+        pending_msg = messages.pop(key, None)
+
+        self.received += 1
+        if msg["type"] == "withdraw" and pending_msg is not None and pending_msg["type"] != "withdraw" and \
+                key in self.withdrawn.get(sdx, ()):
+            self.cancelled += 1
+            return
+
+        messages[key] = msg
+        if len(messages) >= self.max_size:
+            self.full = True
+
+    def is_due(self):
+        """
+        :return: True if the messages of one SDX fill a batch or the messages have been held back for max_delay
+        """
+        return bool(self.pending) and (self.full or time.time() - self.first_message_time >= self.max_delay)
+
+    def time_left(self):
+        """
+        :return: seconds until the pending messages are due, None if there are no pending messages
+        """
+        if not self.pending:
+            return None
+        if self.full:
+            return 0
+        return max(self.first_message_time + self.max_delay - time.time(), 0)
+
+    def flush(self):
+        """
+        :return: list of tuples (sdx, list of messages) in the order the SDXes were first addressed
+        """
+        batches = list()
+        for sdx, messages in self.pending.iteritems():
+            withdrawn = self.withdrawn.get(sdx)
+            if withdrawn is None:
+                withdrawn = OrderedDict()
+                self.withdrawn[sdx] = withdrawn
+
+            batch = list()
+            for key, msg in messages.iteritems():
+                withdrawn.pop(key, None)
+                if msg["type"] == "withdraw":
+                    withdrawn[key] = None
+                batch.append(msg)
+
+            while len(withdrawn) > self.max_withdrawn:
+                withdrawn.popitem(last=False)
+
+            if batch:
+                self.emitted += len(batch)
+                batches.append((sdx, batch))
+
+        self.pending = OrderedDict()
+        self.first_message_time = None
+        self.full = False
+
+        return batches
+
+    def get_statistics(self):
+        return {
+            "received": self.received,
+            "emitted": self.emitted,
+            "cancelled": self.cancelled,
+        }
@@ -0,0 +1,180 @@
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import time
+import logging
+
+from threading import Thread
+from Queue import Queue, Empty
+from collections import OrderedDict
+
+# max number of items waiting in front of a stage before the previous stage is blocked
+STAGE_QUEUE_SIZE = 1000
+
+
+class PipelineStage(object):
+    """
+    A single stage of the event processing. Each stage has its own worker thread and a bounded input queue. The items
+    are processed in the order they arrived, so the order of the updates (and therefore of the updates of each prefix)
+    is the same in every stage. The result of the handler is passed on to all downstream stages.
+    """
+    def __init__(self, name, handler, queue_size=STAGE_QUEUE_SIZE):
+        self.logger = logging.getLogger("PipelineStage")
+
+        self.name = name
+        self.handler = handler
+        self.queue = Queue(queue_size)
+        self.next_stages = list()
+
+        self.run = False
+        self.thread = None
+
+        # statistics
+        self.processed = 0
+        self.total_wait_time = 0
+        self.total_processing_time = 0
+        self.max_processing_time = 0
+
+    def connect(self, stage):
+        """
+        passes the results of this stage on to stage
+        :param stage: PipelineStage
+        :return:None
+        """
+        self.next_stages.append(stage)
+
+    def put(self, data):
+        """
+        adds data to the input queue - blocks if the queue is full
+        :param data:
+        :return:None
+        """
+        self.queue.put((time.time(), data))
+
+    def start(self):
+        self.run = True
+        self.thread = Thread(target=self.process, name="stage " + self.name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.run = False
+        if self.thread:
+            self.thread.join()
+
+    def process(self):
+        while self.run:
+            try:
+                enqueue_time, data = self.queue.get(True, 1)
+            except Empty:
+                continue
+
+            start_time = time.time()
+            try:
+                result = self.handler(data)
+            except Exception:
+                self.logger.exception("Error in stage " + self.name)
+                result = None
+            end_time = time.time()
+
+            self.processed += 1
+            self.total_wait_time += start_time - enqueue_time
+            self.total_processing_time += end_time - start_time
+            self.max_processing_time = max(self.max_processing_time, end_time - start_time)
+
+            if result is not None:
+                for stage in self.next_stages:
+                    stage.put(result)
+
+    def get_statistics(self):
+        """
+        current queue depth and latencies of the stage
+        :return: dict
+        """
+        return {
+            "queue depth": self.queue.qsize(),
+            "processed": self.processed,
+            "avg wait time": self.total_wait_time / self.processed if self.processed else 0,
+            "avg processing time": self.total_processing_time / self.processed if self.processed else 0,
+            "max processing time": self.max_processing_time,
+        }
+
+
+class UpdateCoalescer(object):
+    """
+    Collects the updates of consecutive RIB UPDATE events and merges the updates of the same route, so that only the
+    net change of each route is processed. A route is identified by its prefix and next hop (the advertising
+    participant). A re-announcement carries the local route of the participant that receives it, so it is only
+    merged with re-announcements of the same prefix to the same participant and never replaces an announcement or a
+    withdrawal. The updates are held back for at most max_delay seconds.
+    """
+    def __init__(self, max_delay):
+        self.max_delay = max_delay
+
+        self.pending = OrderedDict()
+        self.first_update_time = None
+
+        # statistics
+        self.received = 0
+        self.emitted = 0
+
+    def add(self, updates):
+        """
+        merges the updates with the pending ones
+        :param updates: list of updates as returned by RIB.update
+        :return:None
+        """
+        if not self.pending:
+            self.first_update_time = time.time()
+
+        for update in updates:
+            self.received += 1
+
+            route = None
+            for update_type in ('announce', 're-announce', 'withdraw'):
+                if update_type in update:
+                    route = update[update_type]
+                    break
+            if route is None:
+                continue
+
+            if update_type == 're-announce':
+                key = (update_type, route['participant'], route['prefix'])
+            else:
+                key = (route['prefix'], route['next_hop'])
+            previous = self.pending.pop(key, None)
+
+            # the participants whose best route changed with the superseded update still have to be updated
+            if previous is not None:
+                if 'changed_participants' in previous and 'changed_participants' in update:
+                    update['changed_participants'] = update['changed_participants'].union(
+                        previous['changed_participants'])
+                elif 'changed_participants' in update:
+                    del update['changed_participants']
+
+            self.pending[key] = update
+
+    def is_due(self):
+        """
+        :return: True if there are pending updates that have been held back for max_delay
+        """
+        return bool(self.pending) and time.time() - self.first_update_time >= self.max_delay
+
+    def time_left(self):
+        """
+        :return: seconds until the pending updates are due, None if there are no pending updates
+        """
+        if not self.pending:
+            return None
+        return max(self.first_update_time + self.max_delay - time.time(), 0)
+
+    def flush(self):
+        """
+        :return: list of all pending updates in the order of their last change
+        """
+        updates = self.pending.values()
+        self.emitted += len(updates)
+
+        self.pending = OrderedDict()
+        self.first_update_time = None
+        return updates
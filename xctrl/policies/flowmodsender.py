@@ -5,6 +5,8 @@
 import json
 import requests
 
+from instrumentation import timing
+
 
 class FlowModSender():
     def __init__(self, url):
@@ -12,7 +14,8 @@ class FlowModSender():
 
     def send(self, msg):
         payload = msg
-        r = requests.post(self.url, data=json.dumps(payload))
+        with timing.measure('flow-mod send'):
+            r = requests.post(self.url, data=json.dumps(payload))
 
         if r.status_code == requests.codes.ok:
             print "FlowMod Succeeded - "+str(r.status_code)
@@ -158,6 +158,20 @@ class GSS(object):
         self.sender.send(self.fm_builder.get_msg())
 
     def add_flow_rule(self, participant, rule_type, match, fwd):
+        cookie = self.build_flow_rule(participant, rule_type, match, fwd)
+        if cookie == -1:
+            return -1
+
+        msg = self.fm_builder.get_msg()
+        print str(msg)
+        self.sender.send(msg)
+        return cookie
+
+    def build_flow_rule(self, participant, rule_type, match, fwd):
+        """
+        adds the flow mod of a policy to the message that is currently built
+        :return: cookie of the flow mod, -1 if the rule type is unknown
+        """
         if rule_type == "outbound":
             priority = PARTICIPANT_OUTBOUND
             action = self.get_outbound_action(fwd)
@@ -183,16 +197,25 @@ class GSS(object):
         else:
             return -1
 
-        cookie = self.fm_builder.add_flow_mod("insert", rule_type, priority, match, action)
-        msg = self.fm_builder.get_msg()
-        print str(msg)
-        self.sender.send(msg)
-        return cookie
+        return self.fm_builder.add_flow_mod("insert", rule_type, priority, match, action)
 
     def update_flow_rule(self, participant, rule_type, cookie, match, fwd_participant):
-        self.delete_flow_rule(rule_type, cookie)
-        cookie = self.add_flow_rule(participant, rule_type, match, fwd_participant)
-        return cookie
+        return self.update_flow_rules(rule_type, [(participant, cookie, match, fwd_participant)])[0]
+
+    def update_flow_rules(self, rule_type, rules):
+        """
+        replaces flow rules - the removal of the old and the insertion of the new flow mods are sent in one message
+        :param rule_type:
+        :param rules: list of tuples (participant, cookie, match, fwd participant)
+        :return: list of the new cookies (same order as the rules)
+        """
+        cookies = list()
+        for participant, cookie, match, fwd_participant in rules:
+            self.fm_builder.delete_flow_mod("remove", rule_type, cookie)
+            cookies.append(self.build_flow_rule(participant, rule_type, match, fwd_participant))
+
+        self.sender.send(self.fm_builder.get_msg())
+        return cookies
 
     def get_inbound_action(self, participant, port):
         vmac = self.vmac_builder.participant_port_match(participant, port)
@@ -11,18 +11,16 @@ from collections import defaultdict
 from gss import GSSmT
 from flowmodsender import FlowModSender
 from lib import XCTRLModule
+from instrumentation import timing
 
 
 class PolicyHandler(XCTRLModule):
-    def __init__(self, config, event_queue, debug, vmac_encoder, loop_detector, test, timing):
+    def __init__(self, config, event_queue, debug, vmac_encoder, loop_detector, test):
         super(PolicyHandler, self).__init__(config, event_queue, debug)
         self.logger = logging.getLogger('xctrl')
         self.logger.info('init')
 
         self.test = test
-        self.timing = timing
-        if self.timing:
-            self.timing_file = 'policy_timing_' + str(int(time.time())) + '.log'
 
         self.loop_detector = loop_detector
         self.vmac_encoder = vmac_encoder
@@ -63,8 +61,7 @@ class PolicyHandler(XCTRLModule):
 
             i = 0
 
-            if self.timing:
-                start_time = time.clock()
+            start_time = time.time()
 
             for policy in policies:
 
@@ -100,10 +97,7 @@ class PolicyHandler(XCTRLModule):
 
                     i += 1
 
-            if self.timing:
-                end_time = time.clock()
-                with open(self.timing_file, "a") as outfile:
-                    outfile.write(str(end_time - start_time) + '\n')
+            timing.record('policy activation', time.time() - start_time)
 
             reply = "Total Received Policies: " + str(len(policies)) + " Accepted Policies: " + str(i)
             conn.send(reply)
@@ -119,15 +113,32 @@ class PolicyHandler(XCTRLModule):
     def get_ingress_participants(self, egress_participant):
         return self.ingress_participants[egress_participant]
 
-    def update_policies(self):
-        # after change of supersets, update policies in the dataplane, only outbound policies need to be changed
-        for policies in self.policies.values():
+    def update_policies(self, participants=None):
+        """
+        after change of supersets, update policies in the dataplane, only outbound policies need to be changed. All
+        flow rules are replaced with a single message.
+        :param participants: participants whose superset identifier or position changed, only the policies that
+        forward to them are updated - None to update all policies
+        :return:None
+        """
+        updated_policies = list()
+        for ingress_participant, policies in self.policies.items():
             for policy in policies["outbound"]:
-                if not self.test:
-                    cookie = self.controller.update_flow_rule("outbound",
-                                                              policy.cookie,
-                                                              policy.match,
-                                                              policy.forward_participant)
+                if participants is None or policy.forward_participant in participants:
+                    updated_policies.append((ingress_participant, policy))
+
+        if not updated_policies or self.test:
+            return
+
+        cookies = self.controller.update_flow_rules("outbound",
+                                                    [(ingress_participant,
+                                                      policy.cookie,
+                                                      policy.match,
+                                                      policy.forward_participant)
+                                                     for ingress_participant, policy in updated_policies])
+
+        for (_, policy), cookie in zip(updated_policies, cookies):
+            policy.cookie = cookie
 
 
 class PolicyHandlerConfig(object):
@@ -0,0 +1,114 @@
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import time
+import logging
+import threading
+
+from collections import defaultdict
+
+# time in seconds between two samples
+SAMPLE_INTERVAL = 0.005
+# time in seconds the profiler runs once it is started
+PROFILE_WINDOW = 10
+
+
+class SamplingProfiler(object):
+    """
+    Statistical profiler for a running process. While active, a background thread periodically records the stack of
+    every other thread. The stacks are written in the collapsed format (one line per stack with the frames from the
+    root to the leaf separated by semicolons followed by the number of samples), which can be turned into a flame
+    graph with flamegraph.pl.
+
+    The profiler is toggled by a signal handler, i.e. always on the main thread, so toggle never blocks: a stopped
+    thread finishes writing its samples on its own while the next one might already be running.
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL, window=PROFILE_WINDOW):
+        self.logger = logging.getLogger("SamplingProfiler")
+
+        self.interval = interval
+        self.window = window
+
+        self.thread = None
+        # each sampling thread has its own event, so a finishing thread can not stop the next one
+        self.stop_event = None
+        # sampling threads that might still be writing their samples
+        self.threads = list()
+        # number of profiles taken so far, part of the file name
+        self.num_profiles = 0
+
+    def toggle(self):
+        """
+        starts the profiler if it is not running, otherwise stops it before the end of the window
+        :return:None
+        """
+        if self.stop_event and not self.stop_event.is_set():
+            self.stop_event.set()
+            return
+
+        self.num_profiles += 1
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.sample, args=(self.stop_event, self.num_profiles),
+                                       name="profiler")
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.threads = [thread for thread in self.threads if thread.is_alive()]
+        self.threads.append(self.thread)
+
+    def stop(self):
+        """
+        stops the profiler and waits until all samples are written
+        :return:None
+        """
+        if self.stop_event:
+            self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+
+    def sample(self, stop_event, profile_id):
+        stacks = defaultdict(int)
+        num_samples = 0
+
+        own_id = threading.current_thread().ident
+        self.logger.info("profiling for " + str(self.window) + "s")
+
+        end_time = time.time() + self.window
+        while not stop_event.is_set() and time.time() < end_time:
+            thread_names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stacks[SamplingProfiler.collapse(thread_names.get(thread_id, str(thread_id)), frame)] += 1
+            num_samples += 1
+
+            time.sleep(self.interval)
+
+        stop_event.set()
+
+        file_name = 'profile_' + str(int(time.time())) + '_' + str(profile_id) + '.folded'
+        with open(file_name, 'w') as outfile:
+            for stack, count in stacks.iteritems():
+                outfile.write(stack + ' ' + str(count) + '\n')
+
+        self.logger.info("wrote " + str(num_samples) + " samples to " + file_name)
+
+    @staticmethod
+    def collapse(thread_name, frame):
+        """
+        :param thread_name:
+        :param frame: innermost frame of the thread
+        :return: stack in the collapsed format - thread;root frame;...;innermost frame
+        """
+        frames = list()
+        while frame is not None:
+            code = frame.f_code
+            frames.append(code.co_name + ' (' + os.path.basename(code.co_filename) + ':' + str(code.co_firstlineno) +
+                          ')')
+            frame = frame.f_back
+        frames.append(thread_name)
+        frames.reverse()
+        return ';'.join(frames)
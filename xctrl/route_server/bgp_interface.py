@@ -2,6 +2,10 @@
 #  Author:
 #  Rudiger Birkner (Networked Systems Group ETH Zurich)
 
+from collections import OrderedDict
+
+from rib_backend import Route
+
 LOG = False
 
 
@@ -37,78 +41,100 @@ def get_all_participant_sets(config):
 
 
 def bgp_update_peers(updates, config, route_server):
+    """
+    computes the changes of the advertisements for a whole batch of updates at once. The local routes of all affected
+    participants and prefixes are fetched in bulk and compared to the export cache, so only advertisements that
+    actually changed are written to the output rib and sent. All announcements are sent to ExaBGP in a single message.
+    :param updates: list of updates as returned by RIB.update
+    :param config:
+    :param route_server:
+    :return: list of changes of existing advertisements (participant and prefix)
+    """
     changes = []
 
+    # all participants and prefixes that are affected by the batch of updates (in the order of their appearance)
+    affected = OrderedDict()
     for update in updates:
-        if 'announce' in update or 're-announce' in update:
-            as_sets = {}
-            if 'announce' in update:
-                prefix = update['announce']['prefix']
-            else:
-                prefix = update['re-announce']['prefix']
-                    
-            # send custom route advertisements based on peerings
-            for participant_name in config.participants:
-                route = bgp_make_route_advertisement(route_server, participant_name, prefix)
-        
-                # only announce route if at least one of the peers advertises it to that participant
-                if route:     
-                    # check if we have already announced that route
-                    prev_route = route_server.rib.get_routes("output", None, participant_name, prefix, None, False)
-                    
-                    if not bgp_routes_are_equal(route, prev_route):
-                        # store announcement in output rib
-                        route_server.rib.delete_route("output", participant_name, prefix)
-                        route_server.rib.add_route("output", participant_name, prefix, route)
-
-                        # we only care for changes in existing routes, as only in this case a gratuituous ARP has to
-                        # be sent
-                        if prev_route:
-                            changes.append({"participant": participant_name,
-                                            "prefix": prefix})
-                        
-                        # announce the route to each router of the participant
-                        for neighbor in config.participant_2_portip[participant_name]:
-                            announcement = announce_route(neighbor, prefix, route["next_hop"], route["as_path"])
-                            if LOG:
-                                print announcement
-                            route_server.server.sender_queue.put(announcement)
-        
+        if 'announce' in update:
+            prefix = update['announce']['prefix']
+        elif 're-announce' in update:
+            prefix = update['re-announce']['prefix']
         elif 'withdraw' in update:
-            as_sets = {}
             prefix = update['withdraw']['prefix']
-            
-            # send custom route advertisements based on peerings
-            for participant_name in config.participants:
-                # only modify route advertisement if this route has been advertised to the participant
-                prev_route = route_server.rib.get_routes("output", None, participant_name, prefix, None, False)
-                if prev_route: 
-                    route = bgp_make_route_advertisement(route_server, participant_name, prefix)
-                    # withdraw if no one advertises that route, else update reachability
-                    if route:
-                        # check if we have already announced that route
-                        if not bgp_routes_are_equal(route, prev_route):
-                            # store announcement in output rib
-                            route_server.rib.delete_route("output", participant_name, prefix)
-                            route_server.rib.add_route("output", participant_name, prefix, route)
-                            
-                            changes.append({"participant": participant_name,
-                                            "prefix": prefix})
-                            
-                            # announce the route to each router of the participant
-                            for neighbor in config.participant_2_portip[participant_name]:
-                                announcement = announce_route(neighbor, prefix, route["next_hop"], route["as_path"])
-                                if LOG:
-                                    print announcement
-                                route_server.server.sender_queue.put(announcement)
-                    else:
-                        route_server.rib.delete_route("output", participant_name, prefix)
-                        for neighbor in config.participant_2_portip[participant_name]:
-                            next_hop = config.vmac_encoder.prefix_2_vnh[prefix]
-                            announcement = withdraw_route(neighbor, prefix, next_hop)
-                            if LOG:
-                                print announcement
-                            route_server.server.sender_queue.put(announcement)
+        else:
+            continue
+
+        # if the decision process reported which participants' best routes changed, only those are updated
+        if 'changed_participants' in update:
+            participants = update['changed_participants']
+        else:
+            participants = config.participants
+
+        for participant_name in participants:
+            affected[(participant_name, prefix)] = None
+
+    if not affected:
+        return changes
+
+    export_cache = route_server.rib.export_cache
+
+    prefixes = set([prefix for _, prefix in affected])
+    local_routes = route_server.rib.get_routes_for_prefixes('local', None, prefixes)
+
+    new_output_routes = []
+    withdrawn_output_routes = []
+
+    announcements = OrderedDict()
+    withdrawals = OrderedDict()
+
+    for participant_name, prefix in affected:
+        local_route = local_routes.get((participant_name, prefix))
+
+        # only announce route if at least one of the peers advertises it to that participant and we have not
+        # already announced that route
+        if local_route:
+            route = bgp_advertisement_from_route(local_route, config.vmac_encoder.prefix_2_vnh[prefix])
+
+            changed, existed = export_cache.announce(participant_name, prefix, route["next_hop"], route["as_path"])
+            if not changed:
+                continue
+
+            # store announcement in output rib
+            new_output_routes.append((participant_name, route))
+
+            # we only care for changes in existing routes, as only in this case a gratuituous ARP has to
+            # be sent
+            if existed:
+                changes.append({"participant": participant_name,
+                                "prefix": prefix})
+
+            # announce the route to each router of the participant
+            for neighbor in config.participant_2_portip[participant_name]:
+                key = (neighbor, route["next_hop"], route["as_path"])
+                announcements.setdefault(key, []).append(prefix)
+
+        # withdraw if no one advertises that route anymore
+        elif export_cache.withdraw(participant_name, prefix):
+            withdrawn_output_routes.append((participant_name, prefix))
+
+            for neighbor in config.participant_2_portip[participant_name]:
+                key = (neighbor, config.vmac_encoder.prefix_2_vnh[prefix])
+                withdrawals.setdefault(key, []).append(prefix)
+
+    route_server.rib.delete_routes("output", withdrawn_output_routes)
+    route_server.rib.add_routes("output", new_output_routes)
+
+    messages = []
+    for (neighbor, next_hop, as_path), announced_prefixes in announcements.iteritems():
+        messages.append(announce_routes(neighbor, announced_prefixes, next_hop, as_path))
+    for (neighbor, next_hop), withdrawn_prefixes in withdrawals.iteritems():
+        messages.append(withdraw_routes(neighbor, withdrawn_prefixes, next_hop))
+
+    if messages:
+        if LOG:
+            print '\n'.join(messages)
+        route_server.server.sender_queue.put('\n'.join(messages))
+
     return changes
 
 
@@ -130,16 +156,19 @@ def bgp_make_route_advertisement(route_server, participant_name, prefix):
     next_hop = route_server.config.vmac_encoder.prefix_2_vnh[prefix]
 
     if route:
-        route = {"next_hop": str(next_hop),
-                 "origin": "",
-                 "as_path": route['as_path'],
-                 "communities": "",
-                 "med": "",
-                 "atomic_aggregate": ""}
-        return route
+        return bgp_advertisement_from_route(route, next_hop)
     return None
 
 
+def bgp_advertisement_from_route(route, next_hop):
+    return Route(prefix=route['prefix'],
+                 next_hop=str(next_hop),
+                 origin="",
+                 as_path=route['as_path'],
+                 communities="",
+                 med="",
+                 atomic_aggregate="")
+
 
 def get_as_set(config, participant_name, peers, prefix):
     as_path = []
@@ -238,3 +267,23 @@ def withdraw_route(neighbor, prefix, next_hop):
     msg = "neighbor " + neighbor + " withdraw route " + prefix + " next-hop " + str(next_hop)
 
     return msg
+
+
+def announce_routes(neighbor, prefixes, next_hop, as_path):
+    # all prefixes with the same attributes can be announced with a single command
+    if len(prefixes) == 1:
+        return announce_route(neighbor, prefixes[0], next_hop, as_path)
+
+    msg = "neighbor " + neighbor + " announce attributes next-hop " + str(next_hop)
+    msg += " as-path [ " + as_path + " ] nlri " + " ".join(prefixes)
+
+    return msg
+
+
+def withdraw_routes(neighbor, prefixes, next_hop):
+    if len(prefixes) == 1:
+        return withdraw_route(neighbor, prefixes[0], next_hop)
+
+    msg = "neighbor " + neighbor + " withdraw attributes next-hop " + str(next_hop) + " nlri " + " ".join(prefixes)
+
+    return msg
@@ -8,6 +8,9 @@ from threading import Thread
 from multiprocessing.connection import Client
 import os
 import argparse
+from Queue import Queue
+
+from framing import send_batch, recv_batch, collect_batch, MAX_BATCH_SIZE, MAX_BATCH_LATENCY, MAX_QUEUED_BATCHES
 
 
 '''Write output to stdout'''
@@ -16,8 +19,8 @@ def _write(stdout,data):
     stdout.flush()
 
 
-''' Sender function '''
-def _sender(conn,stdin):
+''' Reader function '''
+def _reader(queue,stdin):
     # Warning: when the parent dies we are seeing continual newlines, so we only access so many before stopping
     counter = 0
 
@@ -32,24 +35,42 @@ def _sender(conn,stdin):
                 continue
             counter = 0
 
-            conn.send(line)
+            # blocks if the route server does not keep up, so ExaBGP is slowed down instead of buffering everything
+            queue.put(line)
 		
         except:
             pass
+
+
+''' Sender function '''
+def _sender(conn,queue,max_batch_size,max_batch_latency):
+    # all lines that arrive within max_batch_latency are sent to the route server as a single frame
+
+    while True:
+        try:
+            batch = collect_batch(queue, max_batch_size, max_batch_latency)
+            send_batch(conn, batch)
+
+        except (EOFError, IOError):
+            break
+        except:
+            pass
 	
 ''' Receiver function '''
 def _receiver(conn,stdout):
 	
     while True:
         try:
-            line = conn.recv()
+            lines = recv_batch(conn)
 	
-            if line == "":
+            if not lines:
                 continue
 			
-            _write(stdout, line) 
+            _write(stdout, '\n'.join(lines))
             ''' example: announce route 1.2.3.4 next-hop 5.6.7.8 as-path [ 100 200 ] '''
-		
+
+        except (EOFError, IOError):
+            break
         except:
             pass
 
@@ -59,18 +80,30 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--port", type=int, help="port to connect to route server")
     parser.add_argument("--key", help="authentication key to connect to route server")
+    parser.add_argument("--batch-size", type=int, help="max number of messages sent to the route server at once")
+    parser.add_argument("--batch-latency", type=float, help="max time in seconds a message is held back for batching")
+    parser.add_argument("--queue-size", type=int, help="max number of messages buffered before stdin is not read")
     args = parser.parse_args()
 
     port = args.port if args.port else 6000
     key = args.key if args.key else 'xrs'
+    batch_size = args.batch_size if args.batch_size else MAX_BATCH_SIZE
+    batch_latency = args.batch_latency if args.batch_latency is not None else MAX_BATCH_LATENCY
+    queue_size = args.queue_size if args.queue_size else MAX_QUEUED_BATCHES * batch_size
     
     conn = Client(('localhost', port), authkey=key)
+
+    queue = Queue(queue_size)
+
+    reader = Thread(target=_reader, args=(queue,sys.stdin))
+    reader.start()
     
-    sender = Thread(target=_sender, args=(conn,sys.stdin))
+    sender = Thread(target=_sender, args=(conn,queue,batch_size,batch_latency))
     sender.start()
     
     receiver = Thread(target=_receiver, args=(conn,sys.stdout))
     receiver.start()
     
+    reader.join()
     sender.join()
     receiver.join()
@@ -6,51 +6,92 @@
 import socket
 import struct
 
+# positions of the attributes in the ranking key of a route
+PATH_LENGTH = 0
+NEIGHBOR_AS = 1
+MED = 2
+ROUTER_ID = 3
+
+
+def decision_process(rib, affected_participants, participants_structure, route, statistics=None):
+    """
+    updates the local rib of all affected participants after the routes for a prefix changed. The local route of a
+    participant is only rewritten if its best route actually changed.
+    :param rib:
+    :param affected_participants: participants that receive the routes of the participant that sent the update
+    :param participants_structure:
+    :param route: update as returned by RIB.update
+    :param statistics: optional dict of counters, the number of recomputed and unchanged best routes is added to it
+    :return: list of changes - dict with participant, prefix and the new best route (None if there is no route left)
+    """
+    changes = []
 
-def decision_process(rib, affected_participants, participants_structure, route):
-    best_routes = []
+    if 'announce' in route:
+        prefix = route['announce']['prefix']
+    elif 'withdraw' in route and route['withdraw'] is not None:
+        prefix = route['withdraw']['prefix']
+    else:
+        return changes
+
+    if not affected_participants:
+        return changes
+
+    current_routes = rib.get_routes('local', None, list(affected_participants), prefix, None, True)
+    current_routes = dict([(current_route['participant'], current_route) for current_route in current_routes])
 
-    # Need to loop through all participants
     if 'announce' in route:
-        announce_route = route['announce']
-        
-        for participant in affected_participants:
-            routes = []
-            # Need to loop through participants to build up routes, don't include current participant
-
-            advertising_participants = participants_structure[participant].peers_out
-
-            routes = rib.get_routes('input', None, advertising_participants, announce_route['prefix'], None, True)
-
-            if routes:
-                best_route = best_path_selection(routes)
-                best_routes.append({'announce': best_route})
-            
-                # TODO: can be optimized? check to see if current route == best_route?
-                rib.delete_route('local', participant, announce_route['prefix'])
-                rib.add_route('local', participant, best_route['prefix'], best_route)
-
-    elif'withdraw' in route:
-        deleted_route = route['withdraw']
-        
-        if deleted_route is not None:
-            for participant in affected_participants:
-                
-                # delete route if being used
-                if rib.get_routes('local', ['prefix'], participant, deleted_route['prefix'], None, True):
-                    rib.delete_route('local', participant, deleted_route['prefix'])
-
-                    advertising_participants = participants_structure[participant].peers_out
-
-                    routes = rib.get_routes('input', None, advertising_participants, deleted_route['prefix'], None, True)
-                    
-                    if routes:
-                        best_route = best_path_selection(routes)
-                        best_routes.append({'withdraw': best_route})
-                    
-                        rib.add_route('local', participant, best_route['prefix'], best_route)
-    
-    return best_routes
+        participants = affected_participants
+    else:
+        # only participants that have a route for the prefix are affected by a withdraw
+        participants = [participant for participant in affected_participants if participant in current_routes]
+
+    # all routes for the prefix are fetched once and the best route of each participant is selected from the
+    # candidates advertised by its peers
+    candidates = rib.get_routes('input', None, None, prefix, None, True) if participants else []
+
+    local_routes = []
+    deleted_routes = []
+    for participant in participants:
+        routes = get_candidates(candidates, participants_structure[participant].peers_out)
+        best_route = best_path_selection(routes) if routes else None
+
+        if statistics is not None:
+            statistics['recomputed'] += 1
+
+        if routes_are_equal(best_route, current_routes.get(participant)):
+            if statistics is not None:
+                statistics['unchanged'] += 1
+            continue
+
+        if best_route:
+            local_routes.append((participant, best_route))
+        else:
+            deleted_routes.append((participant, prefix))
+
+        changes.append({'participant': participant,
+                        'prefix': prefix,
+                        'route': best_route})
+
+    rib.delete_routes('local', deleted_routes)
+    # existing local routes are replaced
+    rib.add_routes('local', local_routes)
+
+    return changes
+
+
+def get_candidates(routes, advertising_participants):
+    advertising_participants = set(advertising_participants)
+    return [route for route in routes if route['participant'] in advertising_participants]
+
+
+def routes_are_equal(route1, route2):
+    if route1 is None or route2 is None:
+        return route1 is None and route2 is None
+
+    for attribute in ['next_hop', 'origin', 'as_path', 'communities', 'med', 'atomic_aggregate']:
+        if route1[attribute] != route2[attribute]:
+            return False
+    return True
 
 
 def best_path_selection(routes):
@@ -67,94 +108,56 @@ def best_path_selection(routes):
     # 7. Lowest Router ID (tie breaker!)
     #
     # I believe that steps 0, 1, 3, 5, and 6 are out
+    #
+    # All the attributes are taken from the ranking key of the route which is computed once when the route is
+    # received (see ranking_key)
+
+    ranked_routes = [(get_rank(route), route) for route in routes]
+
+    # The MED is only compared among routes that have been advertised by the same AS. If all routes come from
+    # different ASes, the MED step is skipped and the selection is a single min() over (AS path length, router id)
+    neighbor_ases = set([rank[NEIGHBOR_AS] for rank, _ in ranked_routes])
+    if len(neighbor_ases) == len(ranked_routes):
+        return min(ranked_routes, key=lambda x: (x[0][PATH_LENGTH], x[0][ROUTER_ID]))[1]
 
     # 1. Lowest AS Path Length
-    
-    best_routes = []
-    min_route_length = 9999
-
-    for route in routes:
-            
-        # find ones with smallest AS Path Length
-        if not best_routes:
-            # prime the pump
-            min_route_length = aspath_length(route['as_path'])
-            best_routes.append(route)
-        elif min_route_length == aspath_length(route['as_path']):
-            best_routes.append(route)
-        elif min_route_length > aspath_length(route['as_path']):
-            best_routes = []
-            min_route_length = aspath_length(route['as_path'])
-            best_routes.append(route)
-
-    # If there's only 1, it's the best route    
-    
-    if len(best_routes) == 1:
-        return best_routes.pop()
-
-    # 2. Lowest MED
-
-    # Compare the MED only among routes that have been advertised by the same AS. 
-    # Put it differently, you should skip this step if two routes are advertised by two different ASes. 
-    
-    # get the list of origin ASes
-    as_list = []
-    post_med_best_routes = []
-    for route in best_routes:
-        as_list.append(get_advertised_as(route['as_path']))
-
-    # sort the advertiser's list and 
-    # look at ones who's count != 1
-    as_list.sort()
-
-    i = 0
-    while i < len(as_list):
-        
-        if as_list.count(as_list[i]) > 1:
-            
-            # get all that match the particular AS
-            from_as_list = [x for x in best_routes if get_advertised_as(x['as_path']) == as_list[i]]
-
-            # MED comparison here
-            j = 0
-            lowest_med = from_as_list[j]['med']
-            
-            j += 1
-            while j < len(from_as_list):
-                if lowest_med > from_as_list[j]['med']:
-                    lowest_med = from_as_list[j]['med']
-                j += 1
-            
-            # add to post-MED list - this could be more than one if MEDs match
-            temp_routes = [x for x in from_as_list if x['med'] == lowest_med]
-            for el in temp_routes:
-                post_med_best_routes.append(el)
-            
-            i += as_list.count(as_list[i])
-        
-        else:
-            temp_routes = [x for x in best_routes if get_advertised_as(x['as_path']) == as_list[i]]
-            for el in temp_routes:
-                post_med_best_routes.append(el)
-            i += 1
-    
+    min_route_length = min([rank[PATH_LENGTH] for rank, _ in ranked_routes])
+    ranked_routes = [(rank, route) for rank, route in ranked_routes if rank[PATH_LENGTH] == min_route_length]
+
     # If there's only 1, it's the best route
-    if len(post_med_best_routes) == 1:
-        return post_med_best_routes.pop()
+    if len(ranked_routes) == 1:
+        return ranked_routes[0][1]
+
+    # 2. Lowest MED - among the routes of each advertising AS
+    lowest_meds = dict()
+    for rank, _ in ranked_routes:
+        if rank[NEIGHBOR_AS] not in lowest_meds or lowest_meds[rank[NEIGHBOR_AS]] > rank[MED]:
+            lowest_meds[rank[NEIGHBOR_AS]] = rank[MED]
+
+    ranked_routes = [(rank, route) for rank, route in ranked_routes if rank[MED] == lowest_meds[rank[NEIGHBOR_AS]]]
+
+    # 3. Lowest Router ID - Origin IP of the routers left.
+    return min(ranked_routes, key=lambda x: x[0][ROUTER_ID])[1]
+
+
+def ranking_key(as_path, med, next_hop):
+    """
+    computes the ranking key of a route that contains all attributes used by the best path selection
+    :param as_path: AS path string (the AS set is enclosed in parentheses)
+    :param med:
+    :param next_hop: IP address string
+    :return: tuple (AS path length, neighbor AS, MED, router id)
+    """
+    as_path = as_path if as_path else ''
+    return aspath_length(as_path), get_advertised_as(as_path), med, ip_to_long(next_hop)
 
-    # 3. Lowest Router ID
 
-    # Lowest Router ID - Origin IP of the routers left.
-    i = 0
-    lowest_ip_as_long = ip_to_long(post_med_best_routes[i]['next_hop'])
-    
-    i += 1
-    while i < len(post_med_best_routes):
-        if lowest_ip_as_long > ip_to_long(post_med_best_routes[i]['next_hop']):
-            lowest_ip_as_long = ip_to_long(post_med_best_routes[i]['next_hop'])
-        i += 1
-    
-    return post_med_best_routes[get_index(post_med_best_routes, 'next_hop', long_to_ip(lowest_ip_as_long))]
+def get_rank(route):
+    # routes stored without a ranking key (e.g. plain dicts) are ranked on the fly
+    rank = getattr(route, 'rank', None)
+    if rank is None:
+        rank = ranking_key(route['as_path'], route['med'], route['next_hop'])
+    return rank
 
 
 def aspath_length(as_path_set):
@@ -167,20 +170,10 @@ def aspath_length(as_path_set):
 
 
 def get_advertised_as(as_path_set):
-    temp = as_path_set.split('(')
-    as_path = temp[0].split()
-    as_set = temp[1].replace(')', '').split() if len(temp) > 1 else []
+    as_path = as_path_set.split('(')[0].split()
 
-    return as_path[0]
+    return as_path[0] if as_path else None
 
 
 def ip_to_long(ip):
     return struct.unpack('!L', socket.inet_aton(ip))[0]
-
-
-def long_to_ip(ip):
-    return socket.inet_ntoa(struct.pack('!L', ip))
-
-
-def get_index(seq, attr, value):
-    return next(index for (index, d) in enumerate(seq) if d[attr] == value)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+from threading import Lock
+from collections import defaultdict
+
+
+class ExportCache(object):
+    """
+    Keeps the attributes (next hop and AS path) of the last advertisement that was exported to each participant for
+    each prefix. It allows to decide whether an advertisement has to be sent without reading the output rib.
+
+    The cache is used by the export stage and by the route server when a session goes down, so all methods hold the
+    lock.
+    """
+    def __init__(self):
+        self.lock = Lock()
+
+        # (participant, prefix) -> (next_hop, as_path)
+        self.exports = dict()
+        # participant -> set of prefixes with an exported advertisement
+        self.participant_prefixes = defaultdict(set)
+
+        # per participant counters of the advertisements that were sent and the ones that were skipped as unchanged
+        self.emitted = defaultdict(int)
+        self.suppressed = defaultdict(int)
+
+    def announce(self, participant, prefix, next_hop, as_path):
+        """
+        records the advertisement of prefix to participant
+        :param participant:
+        :param prefix:
+        :param next_hop:
+        :param as_path:
+        :return: tuple (changed, existed) - whether the advertisement has to be sent and whether there was one before
+        """
+        key = (participant, prefix)
+        attributes = (next_hop, as_path)
+
+        with self.lock:
+            previous = self.exports.get(key)
+            if previous == attributes:
+                self.suppressed[participant] += 1
+                return False, True
+
+            self.exports[key] = attributes
+            self.participant_prefixes[participant].add(prefix)
+            self.emitted[participant] += 1
+        return True, previous is not None
+
+    def withdraw(self, participant, prefix):
+        """
+        records the withdrawal of prefix from participant
+        :param participant:
+        :param prefix:
+        :return: True if an advertisement was exported before and has to be withdrawn
+        """
+        with self.lock:
+            if self.exports.pop((participant, prefix), None) is None:
+                return False
+
+            self.participant_prefixes[participant].discard(prefix)
+            self.emitted[participant] += 1
+        return True
+
+    def remove_participant(self, participant):
+        """
+        forgets all advertisements exported to participant (e.g. after the session went down)
+        :param participant:
+        :return:None
+        """
+        with self.lock:
+            for prefix in self.participant_prefixes.pop(participant, ()):
+                del self.exports[(participant, prefix)]
+
+    def __len__(self):
+        with self.lock:
+            return len(self.exports)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.exports
+
+    def get_statistics(self):
+        """
+        number of emitted and suppressed advertisements per participant
+        :return: dict of participant to dict with the counters
+        """
+        with self.lock:
+            participants = set(self.emitted.keys()).union(self.suppressed.keys())
+            return dict((participant, {"emitted": self.emitted[participant],
+                                       "suppressed": self.suppressed[participant]})
+                        for participant in participants)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import json
+import time
+from Queue import Empty
+
+# Messages between the ExaBGP client and the route server are exchanged in batches. Each batch is a single
+# length-prefixed frame (multiprocessing.connection send_bytes/recv_bytes) holding newline-delimited messages,
+# so no pickling is involved and a full table dump only takes a handful of reads.
+
+# max number of messages in a single frame
+MAX_BATCH_SIZE = 1000
+# max time in seconds a message waits for further messages before the frame is sent
+MAX_BATCH_LATENCY = 0.05
+# max number of frames that are buffered before the reading side stops reading from the connection
+MAX_QUEUED_BATCHES = 100
+
+
+def send_batch(conn, messages):
+    """
+    sends all messages as a single frame
+    :param conn: multiprocessing.connection Connection
+    :param messages: list of strings, a single string may contain multiple newline-delimited messages
+    :return:None
+    """
+    conn.send_bytes('\n'.join(messages))
+
+
+def recv_batch(conn):
+    """
+    receives a single frame
+    :param conn: multiprocessing.connection Connection
+    :return: list of messages
+    """
+    data = conn.recv_bytes()
+    return [message for message in data.split('\n') if message]
+
+
+def collect_batch(queue, max_size=MAX_BATCH_SIZE, max_latency=MAX_BATCH_LATENCY):
+    """
+    blocks until a message is available and then keeps collecting messages until either max_size messages are
+    collected or max_latency seconds have passed since the first one
+    :param queue: Queue of messages
+    :param max_size:
+    :param max_latency:
+    :return: list of messages
+    """
+    batch = [queue.get()]
+    deadline = time.time() + max_latency
+
+    while len(batch) < max_size:
+        timeout = deadline - time.time()
+        try:
+            if timeout > 0:
+                batch.append(queue.get(True, timeout))
+            else:
+                batch.append(queue.get(False))
+        except Empty:
+            break
+    return batch
+
+
+def parse_batch(messages):
+    """
+    parses a batch of JSON messages with a single call
+    :param messages: list of JSON strings
+    :return: list of parsed messages
+    """
+    return json.loads('[' + ','.join(messages) + ']')
@@ -3,17 +3,45 @@
 #  Muhammad Shahbaz (muhammad.shahbaz@gatech.edu)
 #  Rudiger Birkner (Networked Systems Group ETH Zurich)
 
-from rib_backend import SQLRIB, LocalRIB
+from collections import OrderedDict
+
+from decision_process import ranking_key
+from export_cache import ExportCache
+from rib_backend import SQLRIB, LocalRIB, Route
 
 LOG = False
 
+# available RIB backends - can be selected in the config using "RIB Backend"
+RIB_BACKENDS = {
+    "sqlite": SQLRIB,
+    "local": LocalRIB
+}
+
+# max number of variables in a single sqlite statement
+MAX_QUERY_VARIABLES = 900
+
 
 class RIB(object):
     def __init__(self, config):
         self.down = True
         self.config = config
         sdx_id = self.config.id
-        self.rib = SQLRIB(sdx_id, ["input", "local", "output"])
+
+        rib_backend = "sqlite"
+        # number of updates that are applied to the rib before the transaction is committed
+        self.batch_size = 1
+        if self.config.route_server:
+            rib_backend = self.config.route_server.rib_backend
+            self.batch_size = self.config.route_server.batch_size
+
+        self.rib = RIB_BACKENDS[rib_backend](sdx_id, ["input", "local", "output"])
+        self.uncommitted_updates = 0
+
+        # last advertisements exported to the participants - mirrors the output rib
+        self.export_cache = ExportCache()
+
+        # records all changes of the tables if the state is kept on disk (see StateStore)
+        self.journal = None
 
     def update(self, participant, route):
         origin = None
@@ -34,9 +62,10 @@ class RIB(object):
                 for route_item in routes:
                     route_list.append({'withdraw': route_item})
 
-                self.delete_all_routes(participant, 'output')
+                self.delete_all_routes('output', participant)
+                self.export_cache.remove_participant(participant)
 
-                self.delete_all_routes(participant, 'input')
+                self.delete_all_routes('input', participant)
 
             elif route['neighbor']['state'] == 'up':
                 # announce all existing prefixes from local rib
@@ -82,33 +111,37 @@ class RIB(object):
                 if 'announce' in route['neighbor']['message']['update']:
                     announce = route['neighbor']['message']['update']['announce']
                     if 'ipv4 unicast' in announce:
+                        # collect all announced routes first and insert them in a single statement, the routes
+                        # are built here to avoid reading them back from the rib
+                        announced_routes = OrderedDict()
                         for next_hop in announce['ipv4 unicast'].keys():
                             for prefix in announce['ipv4 unicast'][next_hop].keys():
-                                self.add_route("input",
-                                               participant,
-                                               prefix,
-                                               (
-                                                   next_hop,
-                                                   origin,
-                                                   as_path,
-                                                   communities,
-                                                   med,
-                                                   atomic_aggregate
-                                               )
-                                               )
-                                self.rib.commit()
-                                announce_route = self.get_routes("input", None, participant, prefix, None, False)
-
-                                route_list.append({'announce': announce_route})
+                                announced_routes[prefix] = Route(int(participant),
+                                                                 prefix,
+                                                                 next_hop,
+                                                                 origin,
+                                                                 as_path,
+                                                                 communities,
+                                                                 med,
+                                                                 atomic_aggregate,
+                                                                 ranking_key(as_path, med, next_hop))
+
+                        self.add_routes("input", [(participant, announce_route)
+                                                  for announce_route in announced_routes.values()])
+
+                        for announce_route in announced_routes.values():
+                            route_list.append({'announce': announce_route})
 
                 elif 'withdraw' in route['neighbor']['message']['update']:
                     withdraw = route['neighbor']['message']['update']['withdraw']
                     if 'ipv4 unicast' in withdraw:
-                        for prefix in withdraw['ipv4 unicast'].keys():
-                            deleted_route = self.get_routes("input", None, participant, prefix, None, False)
-                            self.delete_route("input", participant, prefix)
+                        prefixes = withdraw['ipv4 unicast'].keys()
+                        deleted_routes = self.get_routes_for_prefixes("input", participant, prefixes)
+                        self.delete_routes("input", [(participant, prefix) for prefix in prefixes])
 
-                            route_list.append({'withdraw': deleted_route})
+                        for prefix in prefixes:
+                            if (int(participant), prefix) in deleted_routes:
+                                route_list.append({'withdraw': deleted_routes[(int(participant), prefix)]})
         return route_list
 
     def process_notification(self, participant, route):
@@ -116,13 +149,89 @@ class RIB(object):
             self.delete_all_routes("input", participant)
             self.delete_all_routes("local", participant)
             self.delete_all_routes("output", participant)
+            self.export_cache.remove_participant(participant)
 
             # TODO: send shutdown notification to participants
 
+    def end_update(self):
+        """
+        marks the end of the processing of one update, the open transaction is committed once batch_size updates
+        have been applied
+        :return:None
+        """
+        self.uncommitted_updates += 1
+        if self.uncommitted_updates >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        commits all changes that have been applied since the last commit
+        :return:None
+        """
+        if self.uncommitted_updates > 0:
+            self.rib.commit()
+            self.uncommitted_updates = 0
+
+    # State
+    def get_state(self):
+        """
+        :return: dict of table name to list of all items of the table (see add_routes)
+        """
+        state = dict()
+        for rib_name in ["input", "local", "output"]:
+            state[rib_name] = [RIB.route_to_item(route) for route in self.rib.get(rib_name, None, None, None, True)]
+        return state
+
+    def set_state(self, state):
+        for rib_name, items in state.iteritems():
+            self.rib.delete(rib_name, None)
+            self.rib.add_many(rib_name, items)
+        self.rib.commit()
+
+    def replay(self, record):
+        if record[0] == 'add':
+            self.rib.add(*record[1:])
+        elif record[0] == 'add_many':
+            self.rib.add_many(*record[1:])
+        elif record[0] == 'delete':
+            self.rib.delete(*record[1:])
+        elif record[0] == 'delete_many':
+            self.rib.delete_many(*record[1:])
+
+    def restored(self):
+        """
+        rebuilds the export cache from the restored output rib
+        :return:None
+        """
+        self.rib.commit()
+        for route in self.rib.get('output', None, None, None, True):
+            self.export_cache.announce(route['participant'], route['prefix'], route['next_hop'], route['as_path'])
+
+    @staticmethod
+    def route_to_item(route):
+        return (route['participant'], route['prefix'], route['next_hop'], route['origin'], route['as_path'],
+                route['communities'], route['med'], route['atomic_aggregate'], route['rank'])
+
     # Helper Methods
     def add_route(self, rib_name, participant, prefix, attributes):
         self.rib.add(rib_name, int(participant), prefix, attributes)
-        self.rib.commit()
+        if self.journal:
+            self.journal('add', rib_name, int(participant), prefix, attributes)
+
+    def add_routes(self, rib_name, participant_routes):
+        """
+        adds all routes with a single statement
+        :param rib_name:
+        :param participant_routes: list of (participant, route) tuples
+        :return:None
+        """
+        if participant_routes:
+            items = [(int(participant), route['prefix'], route['next_hop'], route['origin'], route['as_path'],
+                      route['communities'], route['med'], route['atomic_aggregate'], getattr(route, 'rank', None))
+                     for participant, route in participant_routes]
+            self.rib.add_many(rib_name, items)
+            if self.journal:
+                self.journal('add_many', rib_name, items)
 
     def get_routes(self, rib_name, columns, participants, prefix, next_hop, all_entries):
         key_items = dict()
@@ -146,14 +255,57 @@ class RIB(object):
             "prefix": prefix
         }
         self.rib.delete(rib_name, key_items)
-        self.rib.commit()
+        if self.journal:
+            self.journal('delete', rib_name, key_items)
+
+    def delete_routes(self, rib_name, participant_prefixes):
+        """
+        deletes all routes with a single statement
+        :param rib_name:
+        :param participant_prefixes: list of (participant, prefix) tuples
+        :return:None
+        """
+        if participant_prefixes:
+            keys = ['participant', 'prefix']
+            values = [(int(participant), prefix) for participant, prefix in participant_prefixes]
+            self.rib.delete_many(rib_name, keys, values)
+            if self.journal:
+                self.journal('delete_many', rib_name, keys, values)
 
     def delete_all_routes(self, rib_name, participant):
         key_items = {
             "participant": int(participant)
         }
         self.rib.delete(rib_name, key_items)
-        self.rib.commit()
+        if self.journal:
+            self.journal('delete', rib_name, key_items)
+
+    def get_routes_for_prefixes(self, rib_name, participants, prefixes):
+        """
+        all routes of the participants for the given prefixes
+        :param rib_name:
+        :param participants: single participant, list of participants or None for all participants
+        :param prefixes: list of prefix strings
+        :return: dict of (participant, prefix) to route
+        """
+        routes = dict()
+        key_items = dict()
+        participant_filter = None
+
+        if participants is not None:
+            if isinstance(participants, (list, set)):
+                participant_filter = set([int(participant) for participant in participants])
+            else:
+                key_items['participant'] = int(participants)
+
+        prefixes = list(prefixes)
+        for i in range(0, len(prefixes), MAX_QUERY_VARIABLES):
+            key_sets = ('prefix', prefixes[i:i + MAX_QUERY_VARIABLES])
+            for route in self.rib.get(rib_name, None, key_sets, dict(key_items), True):
+                if participant_filter is None or route['participant'] in participant_filter:
+                    routes[(route['participant'], route['prefix'])] = route
+
+        return routes
 
     def get_all_prefixes_advertised(self, from_participant, to_participant=None):
         """
@@ -257,9 +409,15 @@ class RIB(object):
         return None
 
     def get_all_participant_sets(self, prefix_2_vnh):
-        participant_sets = []
+        """
+        the sets of participants advertising each prefix - read with one query per chunk of prefixes
+        :param prefix_2_vnh: iterable of prefixes
+        :return: list of sets of participants (same order as the prefixes)
+        """
+        prefixes = list(prefix_2_vnh)
+        participant_sets = dict((prefix, set()) for prefix in prefixes)
 
-        for prefix in prefix_2_vnh:
-            participant_sets.append(self.get_all_participants_advertising(prefix))
+        for participant, prefix in self.get_routes_for_prefixes('input', None, prefixes):
+            participant_sets[prefix].add(participant)
 
-        return participant_sets
+        return [participant_sets[prefix] for prefix in prefixes]
@@ -6,11 +6,149 @@ import os
 import sqlite3
 from threading import RLock as lock
 
-from collections import defaultdict, namedtuple
-from pymongo import MongoClient
+from collections import defaultdict
+
+
+class Route(object):
+    """
+    Compact representation of a single route. The attributes can be accessed like the keys of a dict
+    (e.g. route['next_hop']), so it can be used wherever a RIB row used to be a dict.
+    """
+    __slots__ = ('participant', 'prefix', 'next_hop', 'origin', 'as_path', 'communities', 'med', 'atomic_aggregate',
+                 'rank')
+
+    def __init__(self, participant=None, prefix=None, next_hop=None, origin=None, as_path=None, communities=None,
+                 med=None, atomic_aggregate=None, rank=None):
+        self.participant = participant
+        self.prefix = prefix
+        self.next_hop = next_hop
+        self.origin = origin
+        self.as_path = as_path
+        self.communities = communities
+        self.med = med
+        self.atomic_aggregate = atomic_aggregate
+        # ranking key for the best path selection (see decision_process.ranking_key)
+        self.rank = rank
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in Route.__slots__
+
+    def keys(self):
+        return list(Route.__slots__)
+
+    def iteritems(self):
+        for key in Route.__slots__:
+            yield key, getattr(self, key)
+
+    def items(self):
+        return list(self.iteritems())
+
+    def __repr__(self):
+        return 'Route(' + ', '.join([key + '=' + repr(value) for key, value in self.iteritems()]) + ')'
+
+
+class ASPathTable(object):
+    """
+    Table of all AS paths stored in a RIB. Each distinct AS path is stored once and referenced by its path id.
+    """
+    def __init__(self):
+        self.path_to_id = dict()
+        self.id_to_path = dict()
+        self.references = dict()
+        self.next_id = 0
+
+    def add(self, as_path):
+        """
+        adds a reference to as_path
+        :param as_path: AS path string
+        :return: path id
+        """
+        path_id = self.path_to_id.get(as_path)
+        if path_id is None:
+            path_id = self.next_id
+            self.next_id += 1
+            self.path_to_id[as_path] = path_id
+            self.id_to_path[path_id] = as_path
+            self.references[path_id] = 0
+        self.references[path_id] += 1
+        return path_id
+
+    def remove(self, path_id):
+        """
+        removes a reference to the AS path, the path is deleted once it is no longer referenced
+        :param path_id:
+        :return:None
+        """
+        self.references[path_id] -= 1
+        if self.references[path_id] == 0:
+            del self.path_to_id[self.id_to_path.pop(path_id)]
+            del self.references[path_id]
+
+    def get(self, path_id):
+        return self.id_to_path[path_id]
+
+    def __len__(self):
+        return len(self.id_to_path)
+
+
+class ValueTable(object):
+    """
+    Table of the attribute values stored in a RIB. Equal values are stored once and shared by all entries.
+    """
+    def __init__(self):
+        # the type is part of the key, as equal values of different types (e.g. 0 and False) have to be kept apart
+        # (type, value) -> [value, number of references]
+        self.values = dict()
+
+    def add(self, value):
+        """
+        adds a reference to value
+        :param value: hashable attribute value
+        :return: the shared instance of value
+        """
+        key = (value.__class__, value)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = [value, 0]
+            self.values[key] = entry
+        entry[1] += 1
+        return entry[0]
+
+    def remove(self, value):
+        """
+        removes a reference to value, the value is deleted once it is no longer referenced
+        :param value:
+        :return:None
+        """
+        key = (value.__class__, value)
+        entry = self.values[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self.values[key]
+
+    def __len__(self):
+        return len(self.values)
 
 
 class SQLRIB():
+    # columns that make up the ranking key of a route
+    RANK_COLUMNS = ('path_length', 'neighbor_as', 'med', 'router_id')
+
+    # column positions of the last query - see route_factory
+    description_cache = (None, None, None)
+
     def __init__(self, sdx_id, names):
         self.lock = lock()
         with self.lock:
@@ -18,7 +156,7 @@ class SQLRIB():
             # base_path = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "ribs"))
             # self.db = sqlite3.connect(base_path + '/' + str(sdx_id) + '.db', check_same_thread=False)
             self.db = sqlite3.connect(':memory:', check_same_thread=False)
-            self.db.row_factory = SQLRIB.dict_factory
+            self.db.row_factory = SQLRIB.route_factory
 
             # Get a cursor object
             cursor = self.db.cursor()
@@ -26,7 +164,7 @@ class SQLRIB():
                 cursor.execute(
                     'CREATE TABLE IF NOT EXISTS ' + str(name) + ' (participant INT, prefix TEXT, next_hop TEXT, '
                     'origin TEXT, as_path TEXT, communities TEXT, med INT, atomic_aggregate BOOLEAN, '
-                    'PRIMARY KEY (participant, prefix))')
+                    'path_length INT, neighbor_as TEXT, router_id INT, PRIMARY KEY (participant, prefix))')
 
             self.db.commit()
 
@@ -40,14 +178,35 @@ class SQLRIB():
             cursor = self.db.cursor()
 
             if isinstance(item, tuple) or isinstance(item, list):
+                rank = item[6] if len(item) > 6 else None
                 cursor.execute('INSERT OR REPLACE INTO ' + name + '(participant, prefix, next_hop, origin, as_path, '
-                               'communities, med, atomic_aggregate) VALUES(?,?,?,?,?,?,?,?)',
-                               (participant, prefix, item[0], item[1], item[2], item[3], item[4], item[5]))
-            elif isinstance(item, dict) or isinstance(item, sqlite3.Row):
+                               'communities, med, atomic_aggregate, path_length, neighbor_as, router_id) '
+                               'VALUES(?,?,?,?,?,?,?,?,?,?,?)',
+                               (participant, prefix, item[0], item[1], item[2], item[3], item[4], item[5]) +
+                               SQLRIB.rank_columns(rank))
+            elif isinstance(item, (dict, Route, sqlite3.Row)):
+                rank = item['rank'] if 'rank' in item.keys() else None
                 cursor.execute('INSERT OR REPLACE INTO ' + name + '(participant, prefix, next_hop, origin, as_path, '
-                               'communities, med, atomic_aggregate) VALUES(?,?,?,?,?,?,?,?)',
+                               'communities, med, atomic_aggregate, path_length, neighbor_as, router_id) '
+                               'VALUES(?,?,?,?,?,?,?,?,?,?,?)',
                                (participant, prefix, item['next_hop'], item['origin'], item['as_path'],
-                                item['communities'], item['med'], item['atomic_aggregate']))
+                                item['communities'], item['med'], item['atomic_aggregate']) +
+                               SQLRIB.rank_columns(rank))
+
+    def add_many(self, name, items):
+        """
+        inserts (or replaces) all items with a single executemany statement
+        :param name: name of the table
+        :param items: list of tuples (participant, prefix, next_hop, origin, as_path, communities, med,
+        atomic_aggregate[, rank])
+        :return:None
+        """
+        with self.lock:
+            cursor = self.db.cursor()
+            cursor.executemany('INSERT OR REPLACE INTO ' + name + '(participant, prefix, next_hop, origin, as_path, '
+                               'communities, med, atomic_aggregate, path_length, neighbor_as, router_id) '
+                               'VALUES(?,?,?,?,?,?,?,?,?,?,?)',
+                               [item[:8] + SQLRIB.rank_columns(item[8] if len(item) > 8 else None) for item in items])
 
     def get(self, name, columns, key_set, key_items, all_entries):
         with self.lock:
@@ -97,6 +256,19 @@ class SQLRIB():
             else:
                 cursor.execute(query)
 
+    def delete_many(self, name, keys, values):
+        """
+        deletes all entries matching one of the value tuples with a single executemany statement
+        :param name: name of the table
+        :param keys: list of column names (e.g. ['participant', 'prefix'])
+        :param values: list of tuples, one value per column
+        :return:None
+        """
+        with self.lock:
+            cursor = self.db.cursor()
+            query = 'DELETE FROM ' + name + ' WHERE ' + ' AND '.join([key + ' = ?' for key in keys])
+            cursor.executemany(query, values)
+
     def commit(self):
         with self.lock:
             self.db.commit()
@@ -107,21 +279,68 @@ class SQLRIB():
             self.db.rollback()
 
     @staticmethod
-    def dict_factory(cursor, row):
-        d = {}
-        for idx, col in enumerate(cursor.description):
-            d[col[0]] = row[idx]
-        return d
+    def rank_columns(rank):
+        # the med is already stored in its own column
+        if rank:
+            return rank[0], rank[1], rank[3]
+        return None, None, None
+
+    @staticmethod
+    def route_factory(cursor, row):
+        # the positions of the columns only change with the query, so they are only looked up once per query
+        description = cursor.description
+        cached = SQLRIB.description_cache
+        if cached[0] is not description:
+            names = [col[0] for col in description]
+            attributes = [(idx, name) for idx, name in enumerate(names) if name in Route.__slots__]
+            rank_indices = None
+            if all(name in names for name in SQLRIB.RANK_COLUMNS):
+                rank_indices = [names.index(name) for name in SQLRIB.RANK_COLUMNS]
+            cached = (description, attributes, rank_indices)
+            SQLRIB.description_cache = cached
+
+        route = Route()
+        for idx, name in cached[1]:
+            setattr(route, name, row[idx])
+
+        rank_indices = cached[2]
+        if rank_indices and row[rank_indices[0]] is not None:
+            route.rank = tuple([row[idx] for idx in rank_indices])
+        return route
+
+
+class RIBRecord(object):
+    """
+    Entry of a LocalRIB table. All strings are shared with the other entries and the AS path is only stored as
+    the path id of the RIB's AS path table.
+    """
+    __slots__ = ('participant', 'prefix', 'next_hop', 'origin', 'path_id', 'communities', 'med', 'atomic_aggregate',
+                 'rank')
+
+    def __init__(self, participant, prefix, next_hop, origin, path_id, communities, med, atomic_aggregate, rank):
+        self.participant = participant
+        self.prefix = prefix
+        self.next_hop = next_hop
+        self.origin = origin
+        self.path_id = path_id
+        self.communities = communities
+        self.med = med
+        self.atomic_aggregate = atomic_aggregate
+        self.rank = rank
 
 
 class LocalRIB(object):
-    RIBEntry = namedtuple('RIBEntry', 'participant prefix next_hop origin as_path communities med atomic_aggregate')
-
     def __init__(self, sdx_id, names):
+        self.lock = lock()
         self.tables = defaultdict(dict)
         self.ends = defaultdict(int)
         self.names = names
 
+        # prefixes, next hops and all other attribute values are interned, as_paths are stored in the as path table
+        self.values = ValueTable()
+        self.as_paths = ASPathTable()
+
+        # secondary indexes - all of them map to the keys of the entries in self.tables
         self.participant_to_entry = defaultdict(set)
         self.prefix_to_entry = defaultdict(set)
         self.next_hop_to_entry = defaultdict(set)
@@ -138,7 +357,8 @@ class LocalRIB(object):
             communities = item[3]
             med = item[4]
             atomic_aggregate = item[5]
-        elif isinstance(item, dict) or isinstance(item, sqlite3.Row):
+            rank = item[6] if len(item) > 6 else None
+        elif isinstance(item, (dict, Route, sqlite3.Row)):
             valid = True
             next_hop = item['next_hop']
             origin = item['origin']
@@ -146,192 +366,170 @@ class LocalRIB(object):
             communities = item['communities']
             med = item['med']
             atomic_aggregate = item['atomic_aggregate']
+            rank = item['rank'] if 'rank' in item.keys() else None
 
         if valid:
-            rib_entry = LocalRIB.RIBEntry(participant, prefix, next_hop, origin, as_path, communities, med, atomic_aggregate)
-
-            self.tables[name][self.ends[name]] = rib_entry
-            self.participant_to_entry[(name, participant)].add(self.ends[name])
-            self.prefix_to_entry[(name, prefix)].add(self.ends[name])
-            self.participant_and_prefix_to_entry[name, participant, prefix] = self.ends[name]
-            self.prefix_and_next_hop_to_entry[(name, prefix, next_hop)].add(self.ends[name])
-            self.ends[name] += 1
-
-    def get(self, name, columns, key_set, key_items, all_entries):
-        participants = None
-        if key_set:
-            participants = key_set[1]
-        elif key_items and 'participant' in key_items:
-            participants = [key_items.pop('participant')]
-
-        next_hop = None
-        prefix = None
-        if key_items:
-            if 'prefix' in key_items:
-                prefix = key_items['prefix']
-
-            if 'next_hop' in key_items:
-                next_hop = key_items['next_hop']
+            with self.lock:
+                # same semantics as INSERT OR REPLACE: (participant, prefix) is the primary key
+                if (name, participant, prefix) in self.participant_and_prefix_to_entry:
+                    self.remove_entry(name, self.participant_and_prefix_to_entry[(name, participant, prefix)])
 
-        keys = set()
+                prefix = self.intern(prefix)
+                next_hop = self.intern(next_hop)
+                rib_entry = RIBRecord(participant, prefix, next_hop, self.intern(origin), self.as_paths.add(as_path),
+                                      self.intern(communities), self.intern(med), self.intern(atomic_aggregate),
+                                      self.intern(rank))
 
-        if prefix and next_hop and not participants:
-            if (name, prefix, next_hop) in self.prefix_and_next_hop_to_entry:
-                keys = self.prefix_and_next_hop_to_entry[(name, prefix, next_hop)]
+                key = self.ends[name]
+                self.ends[name] += 1
 
-        elif prefix and not next_hop and not participants:
-            if (name, prefix) in self.prefix_to_entry:
-                keys = self.prefix_to_entry[(name, prefix)]
+                self.tables[name][key] = rib_entry
+                self.participant_to_entry[(name, participant)].add(key)
+                self.prefix_to_entry[(name, prefix)].add(key)
+                self.next_hop_to_entry[(name, next_hop)].add(key)
+                self.participant_and_prefix_to_entry[(name, participant, prefix)] = key
+                self.prefix_and_next_hop_to_entry[(name, prefix, next_hop)].add(key)
 
-        elif prefix and not next_hop and participants:
-            for participant in participants:
-                if (name, participant, prefix) in self.participant_and_prefix_to_entry:
-                    keys.add(self.participant_and_prefix_to_entry[(name, participant, prefix)])
-                    if not all_entries:
-                        break
+    def add_many(self, name, items):
+        for item in items:
+            self.add(name, item[0], item[1], item[2:])
 
-        elif not prefix and not next_hop and participants:
-            for participant in participants:
-                if (name, participant) in self.participant_to_entry:
-                    keys.update(self.participant_to_entry[(name, participant)])
-                    if not all_entries:
-                        break
+    def get(self, name, columns, key_set, key_items, all_entries):
+        with self.lock:
+            keys = self.find_keys(name, key_set, key_items)
 
-        results = None
-        if all_entries:
             results = list()
-            tmp_keys = set(keys)
-            for key in keys:
-                if key in self.tables[name]:
-                    results.append(self.tables[name][key]._asdict())
-        else:
-            tmp_keys = set(keys)
             for key in keys:
-                if key in self.tables[name]:
-                    results = self.tables[name][key]._asdict()
+                results.append(self.record_to_route(self.tables[name][key], columns))
+                if not all_entries:
                     break
 
+        if not all_entries:
+            return results[0] if results else None
         return results
 
     def delete(self, name, key_items):
-        participant = None
-        if 'participant' in key_items:
-            participant = key_items['participant']
-
-        prefix = None
-        if 'prefix' in key_items:
-            prefix = key_items['prefix']
-
-        keys = None
-        if prefix and not participant and (name, prefix) in self.prefix_to_entry:
-            keys = self.prefix_to_entry[(name, prefix)]
-
-        elif prefix and participant and (name, participant, prefix) in self.participant_and_prefix_to_entry:
-            keys = [self.participant_and_prefix_to_entry[(name, participant, prefix)]]
-
-        elif not prefix and participant and (name, participant) in self.participant_to_entry:
-            keys = self.participant_to_entry[(name, participant)]
-     
-        if keys:
-            tmp_keys = set(keys)
-            for key in tmp_keys:
-                entry = self.tables[name][key]
-
-                if (name, entry.participant) in self.participant_to_entry:
-                    self.participant_to_entry[(name, entry.participant)].remove(key)
-
-                if (name, entry.prefix) in self.prefix_to_entry:
-                    self.prefix_to_entry[(name, entry.prefix)].remove(key)
-
-                if (name, entry.participant, entry.prefix) in self.participant_and_prefix_to_entry:
-                    del self.participant_and_prefix_to_entry[name, entry.participant, entry.prefix]
-
-                if (name, entry.prefix, entry.next_hop) in self.prefix_and_next_hop_to_entry:
-                    self.prefix_and_next_hop_to_entry[(name, entry.prefix, entry.next_hop)].remove(key)
-
-                if key in self.tables[name]:
-                    del self.tables[name][key]
-
-    def commit(self):
-        pass
-
-    def rollback(self):
-        pass
+        with self.lock:
+            for key in self.find_keys(name, None, key_items):
+                self.remove_entry(name, key)
+
+    def delete_many(self, name, keys, values):
+        for value in values:
+            self.delete(name, dict(zip(keys, value)))
+
+    def find_keys(self, name, key_set, key_items):
+        """
+        finds the keys of all entries in table name that match all the conditions, the most selective index is used
+        to get the candidates which are then filtered by the remaining conditions
+        :param name: name of the table
+        :param key_set: tuple (column, list of values) or None
+        :param key_items: dict of column to value or None
+        :return: sorted list of keys (insertion order)
+        """
+        conditions = dict()
+        if key_items:
+            for column, value in key_items.iteritems():
+                conditions[column] = set([value])
+        if key_set:
+            if key_set[0] in conditions:
+                conditions[key_set[0]] = conditions[key_set[0]].intersection(key_set[1])
+            else:
+                conditions[key_set[0]] = set(key_set[1])
 
+        # the records only store the path id of the AS path
+        if 'as_path' in conditions:
+            path_to_id = self.as_paths.path_to_id
+            conditions['path_id'] = set(path_to_id[as_path] for as_path in conditions.pop('as_path')
+                                        if as_path in path_to_id)
 
-class MongoDBRIB():
-    def __init__(self, sdx_id, names):
-        self.sdx_id = sdx_id
-        self.names = names
-        self.client = MongoClient("localhost", 27017)
-        self.db = self.client['demo']
-        self.sessions = dict()
+        participants = conditions.get('participant')
+        prefixes = conditions.get('prefix')
+        next_hops = conditions.get('next_hop')
 
-        for name in names:
-            table_name = name + "_" + str(self.sdx_id)
-            self.sessions[name] = self.db[table_name]
+        candidates = set()
+        if participants is not None and prefixes is not None:
+            for participant in participants:
+                for prefix in prefixes:
+                    if (name, participant, prefix) in self.participant_and_prefix_to_entry:
+                        candidates.add(self.participant_and_prefix_to_entry[(name, participant, prefix)])
+            indexed_columns = ('participant', 'prefix')
+        elif prefixes is not None and next_hops is not None:
+            for prefix in prefixes:
+                for next_hop in next_hops:
+                    candidates.update(self.prefix_and_next_hop_to_entry.get((name, prefix, next_hop), ()))
+            indexed_columns = ('prefix', 'next_hop')
+        elif prefixes is not None:
+            for prefix in prefixes:
+                candidates.update(self.prefix_to_entry.get((name, prefix), ()))
+            indexed_columns = ('prefix',)
+        elif participants is not None:
+            for participant in participants:
+                candidates.update(self.participant_to_entry.get((name, participant), ()))
+            indexed_columns = ('participant',)
+        elif next_hops is not None:
+            for next_hop in next_hops:
+                candidates.update(self.next_hop_to_entry.get((name, next_hop), ()))
+            indexed_columns = ('next_hop',)
+        else:
+            candidates = self.tables[name].keys()
+            indexed_columns = ()
 
-    def add(self, name, participant, prefix, attributes):
-        table_name = name + "_" + str(self.sdx_id)
+        # only check the conditions which are not already guaranteed by the index
+        for column in indexed_columns:
+            del conditions[column]
 
-        values = {
-            "participant": participant,
-            "prefix": prefix
-        }
+        if conditions:
+            table = self.tables[name]
+            keys = [key for key in candidates
+                    if all(getattr(table[key], column) in values for column, values in conditions.iteritems())]
+        else:
+            keys = list(candidates)
+        keys.sort()
 
-        if isinstance(attributes, tuple) or isinstance(attributes, list):
-            values["next_hop"] = attributes[1]
-            values["origin"] = attributes[2]
-            values["as_path"] = attributes[3]
-            values["communities"] = attributes[4]
-            values["med"] = attributes[5]
-            values["atomic_aggregate"] = attributes[6]
+        return keys
 
-        elif isinstance(attributes, dict):
-            values = values.update(attributes)
+    def remove_entry(self, name, key):
+        entry = self.tables[name].pop(key)
 
-        self.sessions[name].insert_one(values)
+        LocalRIB.discard(self.participant_to_entry, (name, entry.participant), key)
+        LocalRIB.discard(self.prefix_to_entry, (name, entry.prefix), key)
+        LocalRIB.discard(self.next_hop_to_entry, (name, entry.next_hop), key)
+        LocalRIB.discard(self.prefix_and_next_hop_to_entry, (name, entry.prefix, entry.next_hop), key)
+        del self.participant_and_prefix_to_entry[(name, entry.participant, entry.prefix)]
 
-    def get(self, name, columns, key_set, key_items, all_entries):
-        table_name = name + "_" + str(self.sdx_id)
+        self.as_paths.remove(entry.path_id)
+        for value in (entry.prefix, entry.next_hop, entry.origin, entry.communities, entry.med, entry.atomic_aggregate,
+                      entry.rank):
+            self.values.remove(value)
 
-        query = {'$and': []}
+    @staticmethod
+    def discard(index, index_key, key):
+        if index_key in index:
+            index[index_key].discard(key)
+            if not index[index_key]:
+                del index[index_key]
 
-        if key_set:
-            conditions = list()
-            for participant in key_set[1]:
-                conditions.append({'participant': participant})
-            query['$and'].append({
-                '$or': conditions
-            })
+    def intern(self, value):
+        return self.values.add(value)
 
-        if key_items:
-            query['$and'].append(key_items)
-
-        filter = None
+    def record_to_route(self, record, columns):
         if columns:
-            filter = dict()
-            for col in columns:
-                filter[col] = 1
-
-        if all_entries:
-            rows = self.sessions[table_name].find(key_items, filter)
-            output_rows = list(rows)
-
-        else:
-            rows = self.sessions[table_name].find_one(key_items, filter)
-            output_rows = rows
-        return output_rows
-
-    def delete(self, name, key_items):
-        table_name = name + "_" + str(self.sdx_id)
-        self.sessions[table_name].delete_many(key_items)
+            route = Route()
+            for column in columns:
+                if column == 'as_path':
+                    route.as_path = self.as_paths.get(record.path_id)
+                else:
+                    setattr(route, column, getattr(record, column))
+            return route
+        return Route(record.participant, record.prefix, record.next_hop, record.origin,
+                     self.as_paths.get(record.path_id), record.communities, record.med, record.atomic_aggregate,
+                     record.rank)
 
     def commit(self):
         pass
 
     def rollback(self):
-        print "previous rollback, does nothing"
+        pass
 
 
 def pretty_print(rib_entry, filter=None):
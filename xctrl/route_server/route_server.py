@@ -2,19 +2,25 @@
 #  Author:
 #  Rudiger Birkner (Networked Systems Group ETH Zurich)
 
-import json
 import Queue
 
 import time
 
+from collections import defaultdict
+
 from server import Server
+from framing import parse_batch, MAX_BATCH_SIZE, MAX_BATCH_LATENCY, MAX_QUEUED_BATCHES
 from test_server import TestServer
 
 from decision_process import decision_process
 from bgp_interface import bgp_update_peers
 from lib import XCTRLModule, XCTRLEvent
+from instrumentation import timing
 from rib import RIB
 
+# time in seconds between two logs of the export statistics while routes are processed
+STATISTICS_INTERVAL = 60
+
 
 class RouteServer(XCTRLModule):
     def __init__(self, config, event_queue, debug, test):
@@ -27,69 +33,126 @@ class RouteServer(XCTRLModule):
         # create RIB
         self.rib = RIB(self.config)
 
+        # counters of the decision process
+        self.statistics = defaultdict(int)
+
         if test:
             self.server = TestServer(self.config.base_path, self.config.id)
         else:
-            self.server = Server(self.config.route_server.port, self.config.route_server.key)
+            self.server = Server(self.config.route_server.port,
+                                 self.config.route_server.key,
+                                 self.config.route_server.message_batch_size,
+                                 self.config.route_server.message_batch_latency,
+                                 self.config.route_server.receive_queue_size)
         self.run = False
-        
+        self.last_statistics_log = 0
+
     def start(self):
         self.logger.debug("Start ExaBGP Interface")
         self.server.start()
 
         start_time = time.clock()
+        self.last_statistics_log = time.time()
 
         self.run = True
         while self.run:
             # get BGP messages from ExaBGP via stdin
             try:
-                route = self.server.receiver_queue.get(True, 1)
+                messages = self.server.receiver_queue.get(True, 1)
 
-                if route == "DONE":
+                if messages == ["DONE"]:
+                    self.rib.flush()
                     print str(time.clock()-start_time) + ' finished with initial RIB construction'
+                    self.log_statistics()
 
                 else:
-                    self.logger.debug("Received Route")
-
-                    route = json.loads(route)
-
-                    # process route advertisements - add/remove routes to/from rib of respective participant (neighbor)
-
-                    if 'neighbor' in route:
-                        if 'ip' in route['neighbor']:
-                            in_participant = self.config.portip_2_participant[route['neighbor']['ip']]
-                            updates = self.rib.update(in_participant, route)
-
-                            # update local ribs - select best route for each prefix
-                            for update in updates:
-                                affected_participants = self.config.participants[in_participant].peers_in
-
-                                decision_process(self.rib, affected_participants, self.config.participants, update)
-
-                            event = XCTRLEvent("RouteServer", "RIB UPDATE", updates)
-                            self.event_queue.put(event)
+                    self.logger.debug("Received " + str(len(messages)) + " Routes")
 
-                    elif 'notification' in route:
-                        for participant in self.config.participants:
-                            self.rib.process_notification(participant, route)
+                    # all routes of a batch are parsed at once
+                    for route in parse_batch(messages):
+                        self.process_route(route)
 
             except Queue.Empty:
                 # self.logger.debug("Empty Queue")
-                pass
+                # commit all pending changes while there is nothing else to do
+                self.rib.flush()
+
+            if time.time() - self.last_statistics_log >= STATISTICS_INTERVAL:
+                self.log_statistics()
+
+    def log_statistics(self):
+        """
+        logs the counters of the decision process and the emitted/suppressed advertisements per participant
+        :return:None
+        """
+        self.last_statistics_log = time.time()
+        self.logger.info('best path recomputations: ' + str(self.statistics['recomputed']) +
+                         ', unchanged best paths: ' + str(self.statistics['unchanged']))
+        for participant, counters in self.rib.export_cache.get_statistics().iteritems():
+            self.logger.info('participant ' + str(participant) + ' - emitted advertisements: ' +
+                             str(counters['emitted']) + ', suppressed advertisements: ' +
+                             str(counters['suppressed']))
+
+    def process_route(self, route):
+        # process route advertisements - add/remove routes to/from rib of respective participant (neighbor)
+
+        if 'neighbor' in route:
+            if 'ip' in route['neighbor']:
+                in_participant = self.config.portip_2_participant[route['neighbor']['ip']]
+                with timing.measure('ingest'):
+                    updates = self.rib.update(in_participant, route)
+
+                # update local ribs - select best route for each prefix
+                start_time = time.time()
+                for update in updates:
+                    affected_participants = self.config.participants[in_participant].peers_in
+
+                    changes = decision_process(self.rib,
+                                               affected_participants,
+                                               self.config.participants,
+                                               update,
+                                               self.statistics)
+
+                    # only the participants whose best route changed have to be sent new advertisements
+                    update['changed_participants'] = set([change['participant'] for change in changes])
+                timing.record('decision', time.time() - start_time)
+
+                self.rib.end_update()
+
+                event = XCTRLEvent("RouteServer", "RIB UPDATE", updates)
+                self.event_queue.put(event)
+
+        elif 'notification' in route:
+            for participant in self.config.participants:
+                self.rib.process_notification(participant, route)
+            self.rib.end_update()
 
     def update_neighbors(self, updates):
         # has to be done after the VNH assignment
-        changes = bgp_update_peers(updates, self.config, self)
+        with timing.measure('export'):
+            changes = bgp_update_peers(updates, self.config, self)
         return changes
 
     def stop(self):
         self.run = False
+        self.log_statistics()
 
 
 class RouteServerConfig(object):
-    def __init__(self, ip, port, key, fabric_port, interface):
+    def __init__(self, ip, port, key, fabric_port, interface, batch_size=1, rib_backend="sqlite",
+                 message_batch_size=MAX_BATCH_SIZE, message_batch_latency=MAX_BATCH_LATENCY,
+                 receive_queue_size=MAX_QUEUED_BATCHES):
         self.ip = ip
         self.port = port
         self.key = key
         self.fabric_port = fabric_port
         self.interface = interface
+        # number of BGP updates that are applied to the RIB in a single transaction
+        self.batch_size = batch_size
+        # storage of the RIB tables: sqlite or local (indexed in-memory tables)
+        self.rib_backend = rib_backend
+        # max number of messages and max delay in seconds of a single frame sent to the ExaBGP client
+        self.message_batch_size = message_batch_size
+        self.message_batch_latency = message_batch_latency
+        # number of received frames that are buffered before the client is blocked
+        self.receive_queue_size = receive_queue_size
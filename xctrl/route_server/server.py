@@ -3,42 +3,50 @@
 #  Muhammad Shahbaz (muhammad.shahbaz@gatech.edu)
 
 from threading import Thread
-from multiprocessing import Queue
+from Queue import Queue
 from multiprocessing.connection import Listener
-from Queue import Empty
+
+from framing import send_batch, recv_batch, collect_batch, MAX_BATCH_SIZE, MAX_BATCH_LATENCY, MAX_QUEUED_BATCHES
 
 
 class Server(object):
-    def __init__(self, port, key):
+    def __init__(self, port, key, max_batch_size=MAX_BATCH_SIZE, max_batch_latency=MAX_BATCH_LATENCY,
+                 max_queued_batches=MAX_QUEUED_BATCHES):
         self.listener = Listener(('localhost', port), authkey=str(key))
-        
+
+        self.max_batch_size = max_batch_size
+        self.max_batch_latency = max_batch_latency
+
         self.sender_queue = Queue()
-        self.receiver_queue = Queue()
-        
+        # each item is a list of messages (one frame). The queue is bounded, so if the route server falls behind,
+        # the receiver stops reading from the connection and the client is blocked instead of buffering everything
+        self.receiver_queue = Queue(max_queued_batches)
+
     def start(self):
         conn = self.listener.accept()
         print 'Connection accepted from', self.listener.last_accepted
-        
-        sender = Thread(target=_sender, args=(conn, self.sender_queue))
+
+        sender = Thread(target=_sender, args=(conn, self.sender_queue, self.max_batch_size, self.max_batch_latency))
         sender.start()
-        
+
         receiver = Thread(target=_receiver, args=(conn, self.receiver_queue))
         receiver.start()
-    
 
-def _sender(conn, queue):
+
+def _sender(conn, queue, max_batch_size, max_batch_latency):
     while True:
         try:
-            line = queue.get()
-            conn.send(line)
-        except Empty:
-            pass
-        
+            batch = collect_batch(queue, max_batch_size, max_batch_latency)
+            send_batch(conn, batch)
+        except (EOFError, IOError):
+            break
+
 
 def _receiver(conn, queue):
     while True:
         try:
-            line = conn.recv()
-            queue.put(line)
-        except Empty:
-            pass
+            batch = recv_batch(conn)
+            if batch:
+                queue.put(batch)
+        except (EOFError, IOError):
+            break
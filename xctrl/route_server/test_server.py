@@ -68,8 +68,8 @@ def _receiver(time_2_policy, queue):
     max_time = max(time_2_policy.keys())
     for ind in range(1, max_time+1):
         if ind in time_2_policy:
-            for data in time_2_policy[ind]:
-                queue.put(json.dumps(data))
+            # all routes of the same second are handed over as a single batch (see framing)
+            queue.put([json.dumps(data) for data in time_2_policy[ind]])
         time.sleep(1)
-    queue.put("DONE")
+    queue.put(["DONE"])
 
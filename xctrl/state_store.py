@@ -0,0 +1,246 @@
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import re
+import time
+import logging
+import cPickle as pickle
+
+from threading import Thread, Lock
+
+# time in seconds between two snapshots
+SNAPSHOT_INTERVAL = 300
+# time in seconds between two flushes of the journal to disk
+JOURNAL_FLUSH_INTERVAL = 1
+
+SNAPSHOT_FILE = 'snapshot'
+JOURNAL_FILE = re.compile(r'^journal\.(\d+)$')
+
+
+class StateStore(object):
+    """
+    Keeps the state of the controller on disk, so that it can be restored on a restart instead of being rebuilt from
+    the BGP sessions and the neighbor SDXes.
+
+    The state consists of a snapshot of all registered components and a journal of the changes since the snapshot.
+    A component provides get_state and set_state for the snapshot, replay for the journal records and restored,
+    which is called once the state has been restored. The component writes its changes to the journal by calling
+    its journal attribute. A record has to set the changed entries to their new value instead of describing the
+    change, so that applying a record to a state that already contains the change does not alter it.
+
+    Snapshots are taken in the background: the journal is switched to a new file, then the components are captured
+    one after the other and written to a temporary file that replaces the previous snapshot once it is complete.
+    Only then the journal files before the switch are deleted. The records written while the components are captured
+    end up in the new journal file and are applied again on a restore.
+    """
+    def __init__(self, config):
+        self.logger = logging.getLogger("StateStore")
+
+        self.directory = config.directory
+        self.snapshot_interval = config.snapshot_interval
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        self.components = dict()
+
+        self.lock = Lock()
+        self.journal = None
+        self.journal_id = 0
+
+        # only one snapshot is taken at a time
+        self.snapshot_lock = Lock()
+        self.last_snapshot = time.time()
+
+        self.run = False
+        self.thread = None
+
+    def register(self, name, component):
+        """
+        adds a component to the state
+        :param name: unique name of the component
+        :param component: object providing get_state, set_state, replay and restored
+        :return:None
+        """
+        self.components[name] = component
+        component.journal = lambda *record: self.write(name, record)
+
+    def load(self):
+        """
+        restores the state of all components from the last snapshot and the journal files written after it
+        :return: True if a state was found
+        """
+        start_time = time.time()
+
+        snapshot = None
+        snapshot_file = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_file):
+            with open(snapshot_file, 'rb') as infile:
+                snapshot = pickle.load(infile)
+
+            for name, state in snapshot["components"].iteritems():
+                if name in self.components:
+                    self.components[name].set_state(state)
+
+        journal_ids = self.get_journal_ids()
+        if snapshot:
+            journal_ids = [journal_id for journal_id in journal_ids if journal_id >= snapshot["journal"]]
+
+        num_records = 0
+        for journal_id in journal_ids:
+            num_records += self.replay(journal_id)
+
+        if journal_ids:
+            self.journal_id = journal_ids[-1]
+        elif snapshot:
+            self.journal_id = snapshot["journal"]
+
+        for component in self.components.values():
+            component.restored()
+
+        if snapshot or num_records:
+            self.logger.info('restored the state from ' + ('the snapshot and ' if snapshot else '') +
+                             str(num_records) + ' journal records in ' + '%.3f' % (time.time() - start_time) + 's')
+            return True
+        return False
+
+    def replay(self, journal_id):
+        """
+        applies all records of a journal file
+        :param journal_id:
+        :return: number of records
+        """
+        num_records = 0
+        with open(self.get_journal_file(journal_id), 'rb') as infile:
+            while True:
+                try:
+                    name, record = pickle.load(infile)
+                except EOFError:
+                    break
+                except Exception:
+                    # the last record might be incomplete if the controller was stopped while writing it
+                    self.logger.debug('skipped the incomplete end of journal ' + str(journal_id))
+                    break
+
+                if name in self.components:
+                    self.components[name].replay(record)
+                num_records += 1
+        return num_records
+
+    def start(self):
+        """
+        opens a new journal file and starts taking snapshots periodically
+        :return:None
+        """
+        with self.lock:
+            self.switch_journal()
+
+        self.run = True
+        self.thread = Thread(target=self.process, name="state store")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+        takes a last snapshot, so that the next start does not have to replay the journal
+        :return:None
+        """
+        self.run = False
+        if self.thread:
+            self.thread.join()
+
+        self.snapshot()
+
+        with self.lock:
+            if self.journal:
+                self.journal.close()
+                self.journal = None
+
+    def process(self):
+        while self.run:
+            time.sleep(JOURNAL_FLUSH_INTERVAL)
+
+            self.flush()
+
+            if time.time() - self.last_snapshot >= self.snapshot_interval:
+                try:
+                    self.snapshot()
+                except Exception:
+                    self.logger.exception('failed to take a snapshot')
+
+    def write(self, name, record):
+        with self.lock:
+            if self.journal:
+                pickle.dump((name, record), self.journal, pickle.HIGHEST_PROTOCOL)
+
+    def flush(self):
+        with self.lock:
+            if self.journal:
+                self.journal.flush()
+
+    def snapshot(self):
+        """
+        writes the state of all components to the snapshot file and deletes the journal files it replaces
+        :return:None
+        """
+        with self.snapshot_lock:
+            start_time = time.time()
+
+            with self.lock:
+                self.switch_journal()
+                journal_id = self.journal_id
+
+            snapshot = {
+                "journal": journal_id,
+                "time": start_time,
+                "components": dict((name, component.get_state()) for name, component in self.components.iteritems())
+            }
+            capture_time = time.time() - start_time
+
+            snapshot_file = os.path.join(self.directory, SNAPSHOT_FILE)
+            tmp_file = snapshot_file + '.tmp'
+            with open(tmp_file, 'wb') as outfile:
+                pickle.dump(snapshot, outfile, pickle.HIGHEST_PROTOCOL)
+                outfile.flush()
+                os.fsync(outfile.fileno())
+            os.rename(tmp_file, snapshot_file)
+
+            for old_journal_id in self.get_journal_ids():
+                if old_journal_id < journal_id:
+                    os.remove(self.get_journal_file(old_journal_id))
+
+            self.last_snapshot = time.time()
+            self.logger.info('snapshot taken in ' + '%.3f' % (self.last_snapshot - start_time) + 's (capture: ' +
+                             '%.3f' % capture_time + 's)')
+
+    def switch_journal(self):
+        """
+        continues the journal in a new file - the lock has to be held by the caller
+        :return:None
+        """
+        if self.journal:
+            self.journal.close()
+        self.journal_id += 1
+        self.journal = open(self.get_journal_file(self.journal_id), 'ab')
+
+    def get_journal_file(self, journal_id):
+        return os.path.join(self.directory, 'journal.' + str(journal_id))
+
+    def get_journal_ids(self):
+        """
+        :return: sorted list of the ids of all journal files
+        """
+        journal_ids = list()
+        for file_name in os.listdir(self.directory):
+            match = JOURNAL_FILE.match(file_name)
+            if match:
+                journal_ids.append(int(match.group(1)))
+        journal_ids.sort()
+        return journal_ids
+
+
+class StateStoreConfig(object):
+    def __init__(self, directory, snapshot_interval=SNAPSHOT_INTERVAL):
+        # directory of the snapshot and the journal files
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+
+from loop_detection.cib import CIB, LocalCIB, PartitionedCIB
+
+PREFIXES = ['10.0.' + str(i) + '.0/24' for i in range(0, 6)]
+
+
+def normalize_entry(entry):
+    """
+    :param entry: CIB entry as dict or sqlite3.Row with the SDX set as list, frozenset or string
+    :return: sorted tuple of the items with the SDX set as sorted tuple
+    """
+    if entry is None:
+        return None
+    items = dict((key, entry[key]) for key in entry.keys())
+    sdx_set = items["sdx_set"]
+    if isinstance(sdx_set, basestring):
+        sdx_set = [int(v) for v in sdx_set.split(';')]
+    items["sdx_set"] = tuple(sorted(sdx_set))
+    return tuple(sorted(items.items()))
+
+
+def normalize_result(result):
+    changed, old_entry, new_entry = result
+    return changed, normalize_entry(old_entry), normalize_entry(new_entry)
+
+
+def normalize_state(state):
+    return dict((table, sorted(tuple(entry[:-1]) + (tuple(sorted(entry[-1])),) for entry in entries))
+                for table, entries in state.iteritems())
+
+
+def random_operation(generator):
+    prefix = generator.choice(PREFIXES)
+    ingress_participant = generator.randint(1, 4)
+    operation = generator.random()
+    if operation < 0.4:
+        update_type = generator.choice(["announce", "announce", "withdraw"])
+        sdx_set = generator.sample(range(2, 8), generator.randint(1, 3)) if update_type == "announce" else []
+        return "update_in", (update_type, ingress_participant, prefix, generator.randint(2, 4), sdx_set)
+    elif operation < 0.7:
+        return "update_loc", (ingress_participant, prefix)
+    elif operation < 0.9:
+        ingress_participants = set(generator.sample(range(1, 5), generator.randint(1, 3)))
+        return "update_out", (generator.randint(5, 6), prefix, generator.randint(7, 8), ingress_participants, 1,
+                              generator.random() < 0.5)
+    return "delete_out_entry", (generator.randint(5, 6), prefix)
+
+
+class CIBTest(unittest.TestCase):
+    def test_backends_are_equivalent(self):
+        generator = random.Random(3)
+        reference = CIB(1)
+        cibs = [LocalCIB(1), PartitionedCIB(1, 4), PartitionedCIB(1, 3, "sqlite")]
+
+        for step in range(0, 5000):
+            method, args = random_operation(generator)
+
+            expected = normalize_result(getattr(reference, method)(*args))
+            for cib in cibs:
+                self.assertEqual(normalize_result(getattr(cib, method)(*args)), expected, (step, cib, method, args))
+
+            prefix = args[2] if method == "update_in" else args[1]
+            for ingress_participant in range(1, 5):
+                expected = reference.get_sdx_set(prefix, ingress_participant)
+                for cib in cibs:
+                    self.assertEqual(cib.get_sdx_set(prefix, ingress_participant), expected)
+                    self.assertEqual(normalize_entry(cib.get_cl_entry(prefix, ingress_participant)),
+                                     normalize_entry(reference.get_cl_entry(prefix, ingress_participant)))
+
+        expected = normalize_state(reference.get_state())
+        for cib in cibs:
+            self.assertEqual(normalize_state(cib.get_state()), expected)
+
+    def test_state_is_independent_of_the_backend(self):
+        generator = random.Random(5)
+        cib = PartitionedCIB(1, 4)
+        for _ in range(0, 1000):
+            method, args = random_operation(generator)
+            getattr(cib, method)(*args)
+        state = cib.get_state()
+
+        for restored_cib in [CIB(1), LocalCIB(1), PartitionedCIB(1, 2), PartitionedCIB(1, 5, "sqlite")]:
+            restored_cib.set_state(state)
+            self.assertEqual(normalize_state(restored_cib.get_state()), normalize_state(state))
+
+    def test_journal_records_rebuild_the_tables(self):
+        generator = random.Random(7)
+        for cib, replayed_cib in [(CIB(1), LocalCIB(1)), (LocalCIB(1), CIB(1)), (PartitionedCIB(1, 4),
+                                                                                  PartitionedCIB(1, 2, "sqlite"))]:
+            records = list()
+            cib.journal = lambda *record: records.append(record)
+            for _ in range(0, 1000):
+                method, args = random_operation(generator)
+                getattr(cib, method)(*args)
+
+            for record in records:
+                replayed_cib.replay(record)
+
+            self.assertEqual(normalize_state(replayed_cib.get_state()), normalize_state(cib.get_state()))
+
+    def test_update_reports_only_changes(self):
+        cib = LocalCIB(1)
+
+        self.assertEqual(cib.update_in("announce", 1, PREFIXES[0], 2, [3, 2])[0], True)
+        self.assertEqual(cib.update_in("announce", 1, PREFIXES[0], 2, [2, 3]), (False, None, None))
+        self.assertEqual(cib.update_loc(1, PREFIXES[0])[2]["sdx_set"], frozenset([2, 3]))
+        self.assertEqual(cib.update_loc(1, PREFIXES[0]), (False, None, None))
+        self.assertEqual(cib.update_in("withdraw", 1, PREFIXES[0], 3, []), (False, None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import time
+import socket
+import unittest
+
+from Queue import Queue
+from threading import Thread
+from multiprocessing.connection import Listener
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+
+from loop_detection import connection_pool
+from loop_detection.connection_pool import ConnectionPool, MIN_RECONNECT_DELAY
+
+ADDRESS = '127.0.0.1'
+
+
+class Receiver(object):
+    """
+    loop detector of a neighbor SDX - accepts connections and puts all received messages on a queue
+    """
+    def __init__(self, port=0, read=True, max_messages=None):
+        self.listener = Listener((ADDRESS, port), authkey=None)
+        self.port = self.listener.address[1]
+        self.read = read
+        # number of messages after which a connection is closed
+        self.max_messages = max_messages
+        self.messages = Queue()
+        self.connections = Queue()
+
+        self.thread = Thread(target=self.accept)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def accept(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (IOError, EOFError):
+                return
+            self.connections.put(conn)
+            if self.read:
+                receiver = Thread(target=self.receive, args=(conn,))
+                receiver.daemon = True
+                receiver.start()
+
+    def receive(self, conn):
+        num_messages = 0
+        try:
+            while num_messages != self.max_messages:
+                self.messages.put(conn.recv())
+                num_messages += 1
+        except (IOError, EOFError):
+            pass
+        conn.close()
+
+    def close(self):
+        self.listener.close()
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = ConnectionPool()
+        self.receivers = list()
+        self.send_timeout = connection_pool.SEND_TIMEOUT
+
+    def tearDown(self):
+        self.pool.close()
+        for receiver in self.receivers:
+            receiver.close()
+        connection_pool.SEND_TIMEOUT = self.send_timeout
+
+    def create_receiver(self, port=0, read=True, max_messages=None):
+        receiver = Receiver(port, read, max_messages)
+        self.receivers.append(receiver)
+        return receiver
+
+    def test_connection_is_opened_with_the_first_message(self):
+        receiver = self.create_receiver()
+
+        self.assertTrue(receiver.connections.empty())
+
+        for i in range(0, 5):
+            self.pool.send(2, ADDRESS, receiver.port, 'message ' + str(i))
+
+        self.assertEqual([receiver.messages.get(True, 5) for _ in range(0, 5)],
+                         ['message ' + str(i) for i in range(0, 5)])
+        # all messages are sent over the same connection
+        receiver.connections.get(True, 5)
+        self.assertTrue(receiver.connections.empty())
+
+    def test_reconnect_after_the_peer_closed_the_connection(self):
+        receiver = self.create_receiver(max_messages=1)
+        self.pool.send(2, ADDRESS, receiver.port, 'first')
+        self.assertEqual(receiver.messages.get(True, 5), 'first')
+
+        time.sleep(0.1)
+        self.pool.send(2, ADDRESS, receiver.port, 'second')
+
+        self.assertEqual(receiver.messages.get(True, 5), 'second')
+        self.assertEqual(receiver.connections.qsize(), 2)
+
+    def test_pending_messages_are_sent_after_the_back_off(self):
+        # a free port nobody listens on
+        sock = socket.socket()
+        sock.bind((ADDRESS, 0))
+        port = sock.getsockname()[1]
+        sock.close()
+
+        for i in range(0, 3):
+            self.pool.send(2, ADDRESS, port, 'message ' + str(i))
+        time.sleep(5 * MIN_RECONNECT_DELAY)
+
+        connection = self.pool.connections[2]
+        self.assertEqual(len(connection.pending), 3)
+        self.assertTrue(connection.reconnect_delay > MIN_RECONNECT_DELAY)
+
+        receiver = self.create_receiver(port)
+
+        self.assertEqual([receiver.messages.get(True, 10) for _ in range(0, 3)],
+                         ['message ' + str(i) for i in range(0, 3)])
+        self.assertEqual(connection.reconnect_delay, MIN_RECONNECT_DELAY)
+
+    def test_blocked_sdx_does_not_hold_up_the_others(self):
+        connection_pool.SEND_TIMEOUT = 0.5
+        blocked_receiver = self.create_receiver(read=False)
+        receiver = self.create_receiver()
+
+        # fills the socket buffers of the SDX that does not read
+        data = 'x' * 1000000
+        for _ in range(0, 20):
+            self.pool.send(2, ADDRESS, blocked_receiver.port, data)
+        time.sleep(0.1)
+
+        start_time = time.time()
+        self.pool.send(3, ADDRESS, receiver.port, 'message')
+
+        self.assertEqual(receiver.messages.get(True, 5), 'message')
+        self.assertTrue(time.time() - start_time < 0.4)
+
+        # the send to the blocked SDX is given up after the send timeout and retried on a new connection
+        blocked_receiver.connections.get(True, 5)
+        blocked_receiver.connections.get(True, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import unittest
+
+from threading import Thread
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+
+from route_server.export_cache import ExportCache
+
+
+class ExportCacheTest(unittest.TestCase):
+    def test_unchanged_advertisement_is_suppressed(self):
+        cache = ExportCache()
+
+        self.assertEqual(cache.announce(1, '10.0.0.0/24', '172.0.0.1', '100'), (True, False))
+        self.assertEqual(cache.announce(1, '10.0.0.0/24', '172.0.0.1', '100'), (False, True))
+        self.assertEqual(cache.announce(1, '10.0.0.0/24', '172.0.0.1', '100 200'), (True, True))
+        self.assertEqual(cache.get_statistics(), {1: {"emitted": 2, "suppressed": 1}})
+
+    def test_withdraw_without_advertisement_is_skipped(self):
+        cache = ExportCache()
+        cache.announce(1, '10.0.0.0/24', '172.0.0.1', '100')
+
+        self.assertTrue(cache.withdraw(1, '10.0.0.0/24'))
+        self.assertFalse(cache.withdraw(1, '10.0.0.0/24'))
+        self.assertFalse(cache.withdraw(2, '10.0.0.0/24'))
+        self.assertEqual(len(cache), 0)
+
+    def test_remove_participant(self):
+        cache = ExportCache()
+        cache.announce(1, '10.0.0.0/24', '172.0.0.1', '100')
+        cache.announce(1, '10.0.1.0/24', '172.0.0.1', '100')
+        cache.announce(2, '10.0.0.0/24', '172.0.0.1', '100')
+
+        cache.remove_participant(1)
+
+        self.assertEqual(len(cache), 1)
+        self.assertIn((2, '10.0.0.0/24'), cache)
+        self.assertEqual(cache.announce(1, '10.0.0.0/24', '172.0.0.1', '100'), (True, False))
+
+    def test_remove_participant_while_exporting(self):
+        cache = ExportCache()
+        prefixes = ['10.0.' + str(i) + '.0/24' for i in range(0, 200)]
+        errors = list()
+
+        def export():
+            try:
+                for i in range(0, 50):
+                    for prefix in prefixes:
+                        cache.announce(1, prefix, '172.0.0.1', str(i))
+                        if i % 2:
+                            cache.withdraw(1, prefix)
+            except Exception as e:
+                errors.append(e)
+
+        def remove():
+            try:
+                for _ in range(0, 2000):
+                    cache.remove_participant(1)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [Thread(target=export), Thread(target=remove)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(cache), len(cache.participant_prefixes[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import json
+import time
+import unittest
+
+from Queue import Queue
+from multiprocessing import Pipe
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+
+from route_server.framing import send_batch, recv_batch, collect_batch, parse_batch
+
+
+class FramingTest(unittest.TestCase):
+    def setUp(self):
+        self.sender, self.receiver = Pipe()
+
+    def tearDown(self):
+        self.sender.close()
+        self.receiver.close()
+
+    def test_batch_is_sent_as_one_frame(self):
+        messages = [json.dumps({"neighbor": {"ip": "172.0.0." + str(i)}}) for i in range(1, 4)]
+
+        send_batch(self.sender, messages)
+        send_batch(self.sender, messages[:1])
+
+        self.assertEqual(recv_batch(self.receiver), messages)
+        self.assertEqual(recv_batch(self.receiver), messages[:1])
+        self.assertFalse(self.receiver.poll())
+
+    def test_newline_delimited_messages_are_split(self):
+        send_batch(self.sender, ['{"a": 1}\n{"a": 2}\n', '{"a": 3}'])
+
+        self.assertEqual(recv_batch(self.receiver), ['{"a": 1}', '{"a": 2}', '{"a": 3}'])
+
+    def test_empty_frame(self):
+        send_batch(self.sender, [])
+
+        self.assertEqual(recv_batch(self.receiver), [])
+
+    def test_parse_batch(self):
+        messages = [{"announce": {"prefix": "10.0.0.0/24", "as_path": [100, 200]}}, {"withdraw": None}, []]
+
+        self.assertEqual(parse_batch([json.dumps(message) for message in messages]), messages)
+        self.assertEqual(parse_batch([]), [])
+        self.assertRaises(ValueError, parse_batch, ['{"a": 1}', '{"a": '])
+
+
+class CollectBatchTest(unittest.TestCase):
+    def test_batch_is_limited_by_size(self):
+        queue = Queue()
+        for i in range(0, 5):
+            queue.put(str(i))
+
+        self.assertEqual(collect_batch(queue, 3, 0.01), ['0', '1', '2'])
+        self.assertEqual(collect_batch(queue, 3, 0.01), ['3', '4'])
+
+    def test_batch_is_limited_by_latency(self):
+        queue = Queue()
+        queue.put('0')
+
+        start_time = time.time()
+        batch = collect_batch(queue, 10, 0.05)
+
+        self.assertEqual(batch, ['0'])
+        self.assertTrue(0.04 <= time.time() - start_time < 1)
+
+    def test_queued_messages_are_collected_after_the_deadline(self):
+        queue = Queue()
+        for i in range(0, 3):
+            queue.put(str(i))
+
+        self.assertEqual(collect_batch(queue, 10, 0), ['0', '1', '2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
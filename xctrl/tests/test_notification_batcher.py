@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+
+from loop_detection.notification_batcher import NotificationBatcher
+
+
+def message(msg_type, prefix, ingress_participant=1, as_path="100"):
+    return {"type": msg_type, "prefix": prefix, "ingress_participant": ingress_participant, "as_path": as_path}
+
+
+class NotificationBatcherTest(unittest.TestCase):
+    def test_messages_are_batched_per_sdx(self):
+        batcher = NotificationBatcher(10, 100)
+        batcher.add(2, message("announce", "10.0.0.0/24"))
+        batcher.add(3, message("announce", "10.0.0.0/24"))
+        batcher.add(2, message("announce", "10.0.1.0/24"))
+
+        batches = batcher.flush()
+
+        self.assertEqual([(sdx, [msg["prefix"] for msg in batch]) for sdx, batch in batches],
+                         [(2, ["10.0.0.0/24", "10.0.1.0/24"]), (3, ["10.0.0.0/24"])])
+        self.assertEqual(batcher.flush(), [])
+
+    def test_last_message_wins(self):
+        batcher = NotificationBatcher(10, 100)
+        batcher.add(2, message("announce", "10.0.0.0/24", as_path="100 200"))
+        batcher.add(2, message("announce", "10.0.0.0/24", as_path="100 300"))
+        batcher.add(2, message("announce", "10.0.0.0/24", 2))
+
+        batch = batcher.flush()[0][1]
+
+        self.assertEqual([(msg["ingress_participant"], msg["as_path"]) for msg in batch], [(1, "100 300"), (2, "100")])
+
+    def test_withdraw_is_sent_without_a_known_state(self):
+        # e.g. after a restart, the announcement might have been sent before
+        batcher = NotificationBatcher(10, 100)
+        batcher.add(2, message("withdraw", "10.0.0.0/24"))
+        batcher.add(2, message("announce", "10.0.1.0/24"))
+        batcher.add(2, message("withdraw", "10.0.1.0/24"))
+
+        batch = batcher.flush()[0][1]
+
+        self.assertEqual([(msg["type"], msg["prefix"]) for msg in batch],
+                         [("withdraw", "10.0.0.0/24"), ("withdraw", "10.0.1.0/24")])
+        self.assertEqual(batcher.get_statistics()["cancelled"], 0)
+
+    def test_withdraw_cancels_pending_announce(self):
+        batcher = NotificationBatcher(10, 100)
+        batcher.add(2, message("withdraw", "10.0.0.0/24"))
+        batcher.flush()
+
+        batcher.add(2, message("announce", "10.0.0.0/24"))
+        batcher.add(2, message("withdraw", "10.0.0.0/24"))
+
+        self.assertEqual(batcher.flush(), [])
+        self.assertEqual(batcher.get_statistics(), {"received": 3, "emitted": 1, "cancelled": 1})
+
+    def test_withdraw_after_sent_announce_is_kept(self):
+        batcher = NotificationBatcher(10, 100)
+        batcher.add(2, message("withdraw", "10.0.0.0/24"))
+        batcher.flush()
+        batcher.add(2, message("announce", "10.0.0.0/24", as_path="100 200"))
+        batcher.flush()
+
+        # the SDX keeps the first announcement, so the withdrawal is still needed
+        batcher.add(2, message("announce", "10.0.0.0/24", as_path="100 300"))
+        batcher.add(2, message("withdraw", "10.0.0.0/24"))
+
+        batch = batcher.flush()[0][1]
+
+        self.assertEqual([msg["type"] for msg in batch], ["withdraw"])
+
+    def test_withdrawn_keys_are_bounded(self):
+        batcher = NotificationBatcher(10, 100, 2)
+        for i in range(0, 3):
+            batcher.add(2, message("withdraw", "10.0." + str(i) + ".0/24"))
+        batcher.flush()
+        # withdrawing 10.0.1.0/24 again makes it the most recently withdrawn
+        batcher.add(2, message("withdraw", "10.0.1.0/24"))
+        batcher.add(2, message("withdraw", "10.0.3.0/24"))
+        batcher.flush()
+
+        self.assertEqual(batcher.withdrawn[2].keys(), [("10.0.1.0/24", 1), ("10.0.3.0/24", 1)])
+
+        # the withdrawal of a forgotten key is sent, as nothing is known about the state of the SDX
+        for i in range(0, 4):
+            batcher.add(2, message("announce", "10.0." + str(i) + ".0/24"))
+            batcher.add(2, message("withdraw", "10.0." + str(i) + ".0/24"))
+
+        batch = batcher.flush()[0][1]
+
+        self.assertEqual([msg["prefix"] for msg in batch], ["10.0.0.0/24", "10.0.2.0/24"])
+        self.assertEqual(len(batcher.withdrawn[2]), 2)
+
+    def test_full_batch_is_due(self):
+        batcher = NotificationBatcher(10, 2)
+        batcher.add(2, message("announce", "10.0.0.0/24"))
+
+        self.assertFalse(batcher.is_due())
+        self.assertTrue(batcher.time_left() > 0)
+
+        batcher.add(2, message("announce", "10.0.1.0/24"))
+
+        self.assertTrue(batcher.is_due())
+        self.assertEqual(batcher.time_left(), 0)
+
+        batcher.flush()
+
+        self.assertFalse(batcher.is_due())
+        self.assertEqual(batcher.time_left(), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
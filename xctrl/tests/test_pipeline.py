@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+
+from pipeline import PipelineStage, UpdateCoalescer
+from route_server.rib_backend import Route
+
+
+def route(participant, prefix, next_hop, as_path="100"):
+    return Route(participant, prefix, next_hop, "igp", as_path, "", 0, "")
+
+
+class UpdateCoalescerTest(unittest.TestCase):
+    def test_last_update_of_a_route_wins(self):
+        coalescer = UpdateCoalescer(10)
+        coalescer.add([{"announce": route(1, "10.0.0.0/24", "172.0.0.1", "100 200")}])
+        coalescer.add([{"announce": route(1, "10.0.0.0/24", "172.0.0.1", "100 300")},
+                       {"announce": route(1, "10.0.1.0/24", "172.0.0.1")}])
+        coalescer.add([{"withdraw": route(1, "10.0.1.0/24", "172.0.0.1")}])
+
+        updates = coalescer.flush()
+
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(updates[0]["announce"]["as_path"], "100 300")
+        self.assertEqual(updates[1]["withdraw"]["prefix"], "10.0.1.0/24")
+        self.assertEqual((coalescer.received, coalescer.emitted), (4, 2))
+        self.assertFalse(coalescer.pending)
+
+    def test_routes_of_different_participants_are_kept(self):
+        coalescer = UpdateCoalescer(10)
+        coalescer.add([{"announce": route(1, "10.0.0.0/24", "172.0.0.1")},
+                       {"announce": route(2, "10.0.0.0/24", "172.0.0.2")}])
+
+        self.assertEqual(len(coalescer.flush()), 2)
+
+    def test_changed_participants_are_merged(self):
+        coalescer = UpdateCoalescer(10)
+        coalescer.add([{"announce": route(1, "10.0.0.0/24", "172.0.0.1"), "changed_participants": set([2])}])
+        coalescer.add([{"announce": route(1, "10.0.0.0/24", "172.0.0.1"), "changed_participants": set([3])}])
+
+        self.assertEqual(coalescer.flush()[0]["changed_participants"], set([2, 3]))
+
+    def test_unknown_changed_participants_are_not_narrowed(self):
+        coalescer = UpdateCoalescer(10)
+        coalescer.add([{"announce": route(1, "10.0.0.0/24", "172.0.0.1")}])
+        coalescer.add([{"announce": route(1, "10.0.0.0/24", "172.0.0.1"), "changed_participants": set([3])}])
+
+        self.assertNotIn("changed_participants", coalescer.flush()[0])
+
+    def test_re_announce_does_not_replace_announce(self):
+        coalescer = UpdateCoalescer(10)
+        # participant 1 announces the prefix, then participant 3 comes up and gets its best route via participant 1
+        coalescer.add([{"announce": route(1, "10.0.0.0/24", "172.0.0.1")}])
+        coalescer.add([{"re-announce": route(3, "10.0.0.0/24", "172.0.0.1")},
+                       {"re-announce": route(4, "10.0.0.0/24", "172.0.0.1")}])
+
+        updates = coalescer.flush()
+
+        self.assertEqual([update.keys()[0] for update in updates], ["announce", "re-announce", "re-announce"])
+        self.assertEqual([update.values()[0]["participant"] for update in updates], [1, 3, 4])
+
+    def test_re_announce_to_the_same_participant_is_merged(self):
+        coalescer = UpdateCoalescer(10)
+        coalescer.add([{"re-announce": route(3, "10.0.0.0/24", "172.0.0.1")}])
+        coalescer.add([{"re-announce": route(3, "10.0.0.0/24", "172.0.0.2")}])
+
+        updates = coalescer.flush()
+
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(updates[0]["re-announce"]["next_hop"], "172.0.0.2")
+
+    def test_updates_are_due_after_max_delay(self):
+        coalescer = UpdateCoalescer(0.05)
+        self.assertIsNone(coalescer.time_left())
+        self.assertFalse(coalescer.is_due())
+
+        coalescer.add([{"announce": route(1, "10.0.0.0/24", "172.0.0.1")}])
+        self.assertFalse(coalescer.is_due())
+        self.assertGreater(coalescer.time_left(), 0)
+
+        time.sleep(0.06)
+        self.assertTrue(coalescer.is_due())
+        self.assertEqual(coalescer.time_left(), 0)
+
+
+class PipelineStageTest(unittest.TestCase):
+    def test_results_are_passed_on_in_order(self):
+        results = list()
+        first = PipelineStage("first", lambda data: data * 2)
+        second = PipelineStage("second", results.append)
+        first.connect(second)
+        first.start()
+        second.start()
+
+        for i in range(0, 100):
+            first.put(i)
+
+        deadline = time.time() + 5
+        while len(results) < 100 and time.time() < deadline:
+            time.sleep(0.01)
+        first.stop()
+        second.stop()
+
+        self.assertEqual(results, [i * 2 for i in range(0, 100)])
+        self.assertEqual(first.get_statistics()["processed"], 100)
+
+    def test_errors_do_not_stop_the_stage(self):
+        results = list()
+        stage = PipelineStage("stage", lambda data: results.append(1 / data))
+        stage.start()
+
+        stage.put(0)
+        stage.put(1)
+
+        deadline = time.time() + 5
+        while not results and time.time() < deadline:
+            time.sleep(0.01)
+        stage.stop()
+
+        self.assertEqual(results, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+
+from profiler import SamplingProfiler
+
+
+class SlowProfiler(SamplingProfiler):
+    """
+    profiler whose threads only finish writing their samples once they are released
+    """
+    def __init__(self, interval, window):
+        super(SlowProfiler, self).__init__(interval, window)
+        self.release = threading.Event()
+
+    def sample(self, stop_event, profile_id):
+        stop_event.wait()
+        self.release.wait()
+        super(SlowProfiler, self).sample(stop_event, profile_id)
+
+
+class SamplingProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def test_toggle_starts_and_stops(self):
+        profiler = SamplingProfiler(0.001, 10)
+
+        profiler.toggle()
+        thread = profiler.thread
+        profiler.toggle()
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+    def test_restart_is_not_stopped_by_the_previous_thread(self):
+        profiler = SamplingProfiler(0.001, 10)
+
+        profiler.toggle()
+        first_thread = profiler.thread
+        profiler.toggle()
+        profiler.toggle()
+        second_thread = profiler.thread
+
+        self.assertTrue(second_thread is not first_thread)
+        first_thread.join(5)
+
+        self.assertFalse(first_thread.is_alive())
+        self.assertTrue(second_thread.is_alive())
+
+        profiler.stop()
+
+        self.assertFalse(second_thread.is_alive())
+        # both profiles end within the same second, they must not overwrite each other
+        files = os.listdir(self.directory)
+        self.assertEqual(len(files), 2)
+        self.assertTrue(all(file_name.endswith('.folded') for file_name in files))
+
+    def test_restart_does_not_wait_for_the_previous_thread(self):
+        profiler = SlowProfiler(0.001, 10)
+
+        profiler.toggle()
+        first_thread = profiler.thread
+        profiler.toggle()
+        profiler.toggle()
+
+        self.assertTrue(first_thread.is_alive())
+        self.assertTrue(profiler.thread.is_alive())
+
+        profiler.release.set()
+        profiler.stop()
+
+        # stop waits for both threads to write their samples
+        self.assertFalse(first_thread.is_alive())
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_profiler_restarts_after_the_window(self):
+        profiler = SamplingProfiler(0.001, 0.01)
+
+        profiler.toggle()
+        profiler.thread.join(5)
+        profiler.toggle()
+
+        self.assertTrue(profiler.thread.is_alive())
+
+        profiler.stop()
+
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_collapse(self):
+        frame = sys._getframe()
+
+        stack = SamplingProfiler.collapse('main', frame)
+
+        self.assertTrue(stack.startswith('main;'))
+        self.assertTrue(stack.endswith(';test_collapse (test_profiler.py:' + str(frame.f_code.co_firstlineno) + ')'))
+
+
+if __name__ == '__main__':
+    unittest.main()
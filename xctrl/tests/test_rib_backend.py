@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+
+from route_server.rib import RIB_BACKENDS
+from route_server.rib_backend import SQLRIB, LocalRIB
+
+TABLES = ["input", "local", "output"]
+PARTICIPANTS = [1, 2, 3, 4]
+PREFIXES = ['10.0.' + str(i) + '.0/24' for i in range(0, 8)]
+NEXT_HOPS = ['172.0.0.' + str(i) for i in range(1, 4)]
+AS_PATHS = ['100', '100 200', '100 200 300', '300 400']
+
+
+def random_item(generator):
+    as_path = generator.choice(AS_PATHS)
+    med = generator.choice([0, 10])
+    rank = (len(as_path.split()), as_path.split()[0], med, generator.randint(1, 3))
+    return generator.choice(NEXT_HOPS), generator.choice(['igp', 'egp']), as_path, '', med, False, rank
+
+
+def as_tuple(route):
+    if route is None:
+        return None
+    return tuple(route[key] for key in route.keys())
+
+
+class RIBBackendTest(unittest.TestCase):
+    def test_backends(self):
+        self.assertEqual(sorted(RIB_BACKENDS), ["local", "sqlite"])
+
+    def test_local_rib_matches_sql_rib(self):
+        generator = random.Random(1)
+        sql_rib = SQLRIB(1, TABLES)
+        local_rib = LocalRIB(1, TABLES)
+
+        for step in range(0, 2000):
+            name = generator.choice(TABLES)
+            operation = generator.random()
+
+            if operation < 0.4:
+                participant, prefix = generator.choice(PARTICIPANTS), generator.choice(PREFIXES)
+                item = random_item(generator)
+                for rib in (sql_rib, local_rib):
+                    rib.add(name, participant, prefix, item)
+            elif operation < 0.5:
+                items = [(generator.choice(PARTICIPANTS), generator.choice(PREFIXES)) + random_item(generator)
+                         for _ in range(0, 5)]
+                for rib in (sql_rib, local_rib):
+                    rib.add_many(name, items)
+            elif operation < 0.6:
+                key_items = generator.choice([{'prefix': generator.choice(PREFIXES)},
+                                              {'participant': generator.choice(PARTICIPANTS),
+                                               'prefix': generator.choice(PREFIXES)},
+                                              {'next_hop': generator.choice(NEXT_HOPS)}])
+                for rib in (sql_rib, local_rib):
+                    rib.delete(name, key_items)
+            elif operation < 0.65:
+                values = [(generator.choice(PARTICIPANTS), generator.choice(PREFIXES)) for _ in range(0, 3)]
+                for rib in (sql_rib, local_rib):
+                    rib.delete_many(name, ['participant', 'prefix'], values)
+            else:
+                key_set = None
+                if generator.random() < 0.5:
+                    key_set = ('participant', generator.sample(PARTICIPANTS, 2))
+                key_items = dict()
+                for column, values in (('prefix', PREFIXES), ('next_hop', NEXT_HOPS), ('participant', PARTICIPANTS),
+                                       ('as_path', AS_PATHS + ['500'])):
+                    if generator.random() < 0.3:
+                        key_items[column] = generator.choice(values)
+                columns = generator.choice([None, ['participant', 'as_path'], ['next_hop']])
+
+                sql_routes = sql_rib.get(name, columns, key_set, key_items, True)
+                local_routes = local_rib.get(name, columns, key_set, key_items, True)
+
+                # sqlite does not guarantee an order without ORDER BY
+                self.assertEqual(sorted(as_tuple(route) for route in local_routes),
+                                 sorted(as_tuple(route) for route in sql_routes), step)
+
+        for name in TABLES:
+            self.assertEqual(sorted(as_tuple(route) for route in local_rib.get(name, None, None, None, True)),
+                             sorted(as_tuple(route) for route in sql_rib.get(name, None, None, None, True)))
+
+    def test_local_rib_returns_first_entry(self):
+        rib = LocalRIB(1, TABLES)
+        rib.add('input', 1, PREFIXES[0], ('172.0.0.1', 'igp', '100', '', 0, False))
+        rib.add('input', 2, PREFIXES[0], ('172.0.0.2', 'igp', '200', '', 0, False))
+
+        self.assertEqual(rib.get('input', None, None, {'prefix': PREFIXES[0]}, False)['participant'], 1)
+        self.assertEqual(rib.get('input', None, None, {'prefix': PREFIXES[1]}, False), None)
+
+    def test_local_rib_replaces_entry(self):
+        rib = LocalRIB(1, TABLES)
+        rib.add('input', 1, PREFIXES[0], ('172.0.0.1', 'igp', '100', '', 0, False))
+        rib.add('input', 1, PREFIXES[0], ('172.0.0.2', 'igp', '100 200', '', 0, False))
+
+        routes = rib.get('input', None, None, None, True)
+
+        self.assertEqual([(route['next_hop'], route['as_path']) for route in routes], [('172.0.0.2', '100 200')])
+        self.assertEqual(rib.get('input', None, None, {'next_hop': '172.0.0.1'}, True), [])
+        self.assertEqual(len(rib.as_paths), 1)
+
+    def test_local_rib_releases_interned_values(self):
+        rib = LocalRIB(1, TABLES)
+        rib.add('input', 1, PREFIXES[0], ('172.0.0.1', 'igp', '100', '', 0, False, (1, '100', 0, 1)))
+        rib.add('local', 1, PREFIXES[0], ('172.0.0.1', 'igp', '100', '', 0, False, (1, '100', 0, 1)))
+        rib.add('input', 2, PREFIXES[1], ('172.0.0.2', 'egp', '200', '', 10, False, (1, '200', 10, 2)))
+        num_values = len(rib.values)
+
+        rib.delete('input', {'participant': 1})
+
+        self.assertEqual(len(rib.values), num_values)
+
+        rib.delete('local', {'participant': 1})
+        rib.add('input', 2, PREFIXES[1], ('172.0.0.3', 'egp', '200', '', 10, False, (1, '200', 10, 2)))
+
+        self.assertEqual(set(value for value, _ in rib.values.values.values()),
+                         set([PREFIXES[1], '172.0.0.3', 'egp', '', 10, False, (1, '200', 10, 2)]))
+
+        rib.delete('input', None)
+
+        self.assertEqual((len(rib.values), len(rib.as_paths)), (0, 0))
+
+    def test_local_rib_keeps_types_of_equal_values(self):
+        rib = LocalRIB(1, TABLES)
+        rib.add('input', 1, PREFIXES[0], ('172.0.0.1', 'igp', '100', '', 0, False))
+
+        route = rib.get('input', None, None, None, False)
+
+        self.assertTrue(route['med'] is 0 and route['atomic_aggregate'] is False)
+
+    def test_local_rib_filters_by_as_path(self):
+        rib = LocalRIB(1, TABLES)
+        rib.add('input', 1, PREFIXES[0], ('172.0.0.1', 'igp', '100', '', 0, False))
+        rib.add('input', 2, PREFIXES[0], ('172.0.0.2', 'igp', '200', '', 0, False))
+
+        routes = rib.get('input', ['participant'], None, {'prefix': PREFIXES[0], 'as_path': '200'}, True)
+
+        self.assertEqual([route['participant'] for route in routes], [2])
+        self.assertEqual(rib.get('input', None, None, {'as_path': '300'}, True), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+
+import state_store
+
+from state_store import StateStore, StateStoreConfig
+from loop_detection.cib import PartitionedCIB
+
+
+class Table(object):
+    """
+    minimal component of the state store - a dict whose changes are journaled as (key, value) records
+    """
+    def __init__(self):
+        self.entries = dict()
+        self.journal = None
+        self.num_restored = 0
+
+    def set(self, key, value):
+        if value is None:
+            self.entries.pop(key, None)
+        else:
+            self.entries[key] = value
+        if self.journal:
+            self.journal(key, value)
+
+    def get_state(self):
+        return dict(self.entries)
+
+    def set_state(self, state):
+        self.entries = dict(state)
+
+    def replay(self, record):
+        key, value = record
+        if value is None:
+            self.entries.pop(key, None)
+        else:
+            self.entries[key] = value
+
+    def restored(self):
+        self.num_restored += 1
+
+
+class StateStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.flush_interval = state_store.JOURNAL_FLUSH_INTERVAL
+        state_store.JOURNAL_FLUSH_INTERVAL = 0.01
+        self.stores = list()
+
+    def tearDown(self):
+        for store in self.stores:
+            store.stop()
+        state_store.JOURNAL_FLUSH_INTERVAL = self.flush_interval
+        shutil.rmtree(self.directory)
+
+    def create_store(self, **components):
+        store = StateStore(StateStoreConfig(self.directory, 3600))
+        for name, component in components.iteritems():
+            store.register(name, component)
+        self.stores.append(store)
+        return store
+
+    def crash(self, store):
+        """
+        stops the store without the final snapshot
+        """
+        store.flush()
+        store.run = False
+        store.thread.join()
+        self.stores.remove(store)
+
+    def test_nothing_to_restore(self):
+        table = Table()
+        store = self.create_store(table=table)
+
+        self.assertFalse(store.load())
+        self.assertEqual(table.num_restored, 1)
+
+    def test_journal_is_replayed(self):
+        table = Table()
+        store = self.create_store(table=table)
+        store.load()
+        store.start()
+        table.set('a', 1)
+        table.set('b', 2)
+        table.set('a', None)
+        self.crash(store)
+
+        restored_table = Table()
+        self.assertTrue(self.create_store(table=restored_table).load())
+        self.assertEqual(restored_table.entries, {'b': 2})
+        self.assertEqual(restored_table.num_restored, 1)
+
+    def test_snapshot_and_journal_are_combined(self):
+        table = Table()
+        store = self.create_store(table=table)
+        store.load()
+        store.start()
+        for i in range(0, 10):
+            table.set(i, i)
+        store.snapshot()
+        table.set(0, None)
+        table.set(10, 10)
+        self.crash(store)
+
+        # only the journal written after the snapshot is kept
+        self.assertEqual(sorted(os.listdir(self.directory)), ['journal.2', 'snapshot'])
+
+        restored_table = Table()
+        restored_store = self.create_store(table=restored_table)
+        restored_store.load()
+        self.assertEqual(restored_table.entries, dict((i, i) for i in range(1, 11)))
+
+        # the journal continues after the last file
+        restored_store.start()
+        restored_table.set(11, 11)
+        self.crash(restored_store)
+
+        restored_table = Table()
+        self.create_store(table=restored_table).load()
+        self.assertEqual(restored_table.entries, dict((i, i) for i in range(1, 12)))
+
+    def test_records_of_the_snapshot_can_be_replayed_again(self):
+        table = Table()
+        store = self.create_store(table=table)
+        store.load()
+        store.start()
+        table.set('a', 1)
+        store.snapshot()
+        # a record that is already part of the snapshot, e.g. written while the snapshot was captured
+        table.set('a', 1)
+        table.set('b', 2)
+        self.crash(store)
+
+        restored_table = Table()
+        self.create_store(table=restored_table).load()
+        self.assertEqual(restored_table.entries, {'a': 1, 'b': 2})
+
+    def test_incomplete_record_is_skipped(self):
+        table = Table()
+        store = self.create_store(table=table)
+        store.load()
+        store.start()
+        table.set('a', 1)
+        table.set('b', 'x' * 100)
+        self.crash(store)
+
+        journal_file = store.get_journal_file(store.journal_id)
+        with open(journal_file, 'rb+') as outfile:
+            outfile.truncate(os.path.getsize(journal_file) - 10)
+
+        restored_table = Table()
+        self.create_store(table=restored_table).load()
+        self.assertEqual(restored_table.entries, {'a': 1})
+
+    def test_stop_takes_a_snapshot(self):
+        table = Table()
+        store = self.create_store(table=table)
+        store.load()
+        store.start()
+        table.set('a', 1)
+        store.stop()
+        self.stores.remove(store)
+
+        restored_table = Table()
+        restored_store = self.create_store(table=restored_table)
+        restored_store.load()
+        self.assertEqual(restored_table.entries, {'a': 1})
+        # nothing is left to replay
+        self.assertEqual([os.path.getsize(restored_store.get_journal_file(journal_id))
+                          for journal_id in restored_store.get_journal_ids()], [0])
+
+    def test_partitioned_cib_is_restored(self):
+        cib = PartitionedCIB(1, 4)
+        store = self.create_store(cib=cib)
+        store.load()
+        store.start()
+        cib.update_in("announce", 1, '10.0.0.0/24', 2, [2, 3])
+        cib.update_in("announce", 1, '10.0.1.0/24', 2, [2])
+        cib.update_loc(1, '10.0.0.0/24')
+        cib.update_loc(1, '10.0.1.0/24')
+        store.snapshot()
+        cib.update_in("withdraw", 1, '10.0.1.0/24', 2)
+        cib.update_loc(1, '10.0.1.0/24')
+        cib.update_out(5, '10.0.0.0/24', 7, set([1]), 1, False)
+        self.crash(store)
+
+        # the number of partitions can change across restarts
+        restored_cib = PartitionedCIB(1, 2, "sqlite")
+        self.create_store(cib=restored_cib).load()
+        self.assertEqual(restored_cib.get_sdx_set('10.0.0.0/24', 1), set([2, 3]))
+        self.assertEqual(restored_cib.get_sdx_set('10.0.1.0/24', 1), set())
+        self.assertEqual(restored_cib.update_out(5, '10.0.0.0/24', 7, set([1]), 1, False), (False, None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+
+from vmac_encoder.supersets import SuperSetEncoder, compute_supersets, mask_bits, popcount
+
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class StaticRIB(object):
+    def __init__(self, prefix_2_participants):
+        self.prefix_2_participants = prefix_2_participants
+
+    def get_all_participants_advertising(self, prefix):
+        return self.prefix_2_participants[prefix]
+
+    def get_all_participant_sets(self, prefixes):
+        return [self.prefix_2_participants[prefix] for prefix in prefixes]
+
+
+def create_encoder(prefix_2_participants, participants, max_superset_size=3, superset_threshold=10):
+    vmac_encoder = Namespace(max_superset_size=max_superset_size,
+                             superset_threshold=superset_threshold,
+                             prefix_2_vnh=dict((prefix, None) for prefix in prefix_2_participants))
+    config = Namespace(vmac_encoder=vmac_encoder, participants=dict((participant, None) for participant in participants))
+    return SuperSetEncoder(config, None, False, StaticRIB(prefix_2_participants), None, True)
+
+
+def announce(prefix):
+    return {"announce": {"prefix": prefix}}
+
+
+class ComputeSupersetsTest(unittest.TestCase):
+    def assertCovered(self, masks, supersets):
+        for mask in masks:
+            self.assertTrue(any(mask & superset == mask for superset in supersets), bin(mask))
+
+    def test_subsets_and_duplicates_are_merged(self):
+        masks = [0b0111, 0b0011, 0b0111, 0b0100, 0]
+
+        self.assertEqual(compute_supersets(masks, 3), [0b0111])
+
+    def test_sets_with_the_largest_intersection_are_merged(self):
+        masks = [0b000111, 0b011000, 0b001110, 0b110000]
+
+        supersets = compute_supersets(masks, 4)
+
+        self.assertCovered(masks, supersets)
+        self.assertEqual(sorted(supersets), [0b001111, 0b111000])
+
+    def test_supersets_respect_the_max_size(self):
+        masks = [(1 << i) | (1 << (i + 1)) for i in range(0, 20)]
+
+        supersets = compute_supersets(masks, 5)
+
+        self.assertCovered(masks, supersets)
+        self.assertTrue(all(popcount(superset) <= 5 for superset in supersets))
+
+    def test_oversized_sets_are_kept_on_their_own(self):
+        masks = [0b1111100, 0b0000011]
+
+        self.assertEqual(sorted(compute_supersets(masks, 3)), [0b0000011, 0b1111100])
+
+
+class SuperSetEncoderTest(unittest.TestCase):
+    def test_participant_bits_are_built_from_the_config(self):
+        encoder = create_encoder({}, [30, 10, 20])
+
+        self.assertEqual(encoder.participant_bits, {10: 0, 20: 1, 30: 2})
+        self.assertEqual(encoder.participant_mask([30, 10]), 0b101)
+        self.assertEqual(mask_bits(encoder.participant_mask([20, 30])), [1, 2])
+
+    def test_participant_mask_does_not_change_the_index(self):
+        encoder = create_encoder({}, [1, 2])
+
+        self.assertRaises(KeyError, encoder.participant_mask, [3])
+        self.assertEqual(encoder.participant_bits, {1: 0, 2: 1})
+
+    def test_superset_is_extended(self):
+        encoder = create_encoder({"10.0.0.0/24": [1, 2], "10.0.1.0/24": [2, 3], "10.0.2.0/24": [4]}, [1, 2, 3, 4])
+
+        changes = encoder.update_supersets([announce("10.0.0.0/24"), announce("10.0.1.0/24")])
+
+        self.assertEqual(encoder.supersets, [[1, 2, 3]])
+        self.assertEqual(encoder.superset_masks, [0b111])
+        self.assertEqual(changes["type"], "update")
+        self.assertEqual(changes["changed participants"], set([1, 2, 3]))
+
+        changes = encoder.update_supersets([announce("10.0.2.0/24")])
+
+        self.assertEqual(encoder.supersets, [[1, 2, 3], [4]])
+        self.assertEqual(changes["changes"], [{"participant_id": 4, "superset": 1, "position": 0}])
+
+    def test_recompute_covers_all_sets(self):
+        prefix_2_participants = {"10.0.0.0/24": [1, 2], "10.0.1.0/24": [3, 4], "10.0.2.0/24": [2, 3],
+                                 "10.0.3.0/24": [5, 6], "10.0.4.0/24": [1, 6]}
+        encoder = create_encoder(prefix_2_participants, range(1, 7), superset_threshold=1)
+
+        changes = encoder.update_supersets([announce(prefix) for prefix in sorted(prefix_2_participants)])
+
+        self.assertEqual(changes["type"], "new")
+        for participants in prefix_2_participants.values():
+            self.assertTrue(SuperSetEncoder.is_subset_of_superset(encoder.participant_mask(participants),
+                                                                  encoder.superset_masks))
+        for index, superset in enumerate(encoder.supersets):
+            self.assertTrue(len(superset) <= 3)
+            self.assertEqual(encoder.participant_mask(superset), encoder.superset_masks[index])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from netaddr import IPNetwork
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+
+from vmac_encoder.vnh_pool import VNHPool, STATE_FILE_COMPACTION_FACTOR
+
+PREFIXES = ['10.0.' + str(i) + '.0/24' for i in range(0, 10)]
+
+
+class VNHPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.directory, 'vnhs', 'state')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_vnhs_are_assigned_in_order(self):
+        pool = VNHPool(IPNetwork('172.0.1.0/29'))
+
+        self.assertEqual(pool.allocate(PREFIXES[0]), ('172.0.1.1', None))
+        self.assertEqual(pool.allocate(PREFIXES[1]), ('172.0.1.2', None))
+        self.assertEqual(pool.allocate(PREFIXES[0]), ('172.0.1.1', None))
+
+    def test_released_vnh_is_held_down(self):
+        pool = VNHPool(IPNetwork('172.0.1.0/30'), hold_down=3600)
+        pool.allocate(PREFIXES[0])
+        pool.allocate(PREFIXES[1])
+        pool.release(PREFIXES[0])
+
+        self.assertRaises(IndexError, pool.allocate, PREFIXES[2])
+        # the prefix keeps its VNH until it is reused
+        self.assertEqual(pool.prefix_2_vnh[PREFIXES[0]], '172.0.1.1')
+
+    def test_released_vnh_is_reused_after_the_hold_down(self):
+        pool = VNHPool(IPNetwork('172.0.1.0/30'), hold_down=0)
+        pool.allocate(PREFIXES[0])
+        pool.allocate(PREFIXES[1])
+        pool.release(PREFIXES[1])
+        pool.release(PREFIXES[0])
+
+        # VNHs are reused in the order they were released
+        self.assertEqual(pool.allocate(PREFIXES[2]), ('172.0.1.2', PREFIXES[1]))
+        self.assertNotIn(PREFIXES[1], pool.prefix_2_vnh)
+        self.assertEqual(pool.vnh_2_prefix['172.0.1.2'], PREFIXES[2])
+
+    def test_announced_prefix_keeps_its_vnh(self):
+        pool = VNHPool(IPNetwork('172.0.1.0/30'), hold_down=0)
+        pool.allocate(PREFIXES[0])
+        pool.allocate(PREFIXES[1])
+        pool.release(PREFIXES[0])
+
+        self.assertEqual(pool.allocate(PREFIXES[0]), ('172.0.1.1', None))
+        self.assertRaises(IndexError, pool.allocate, PREFIXES[2])
+
+    def test_state_is_restored(self):
+        pool = VNHPool(IPNetwork('172.0.1.0/29'), hold_down=3600, state_file=self.state_file)
+        for prefix in PREFIXES[:3]:
+            pool.allocate(prefix)
+        pool.release(PREFIXES[1])
+        pool.flush()
+        pool.close()
+
+        pool = VNHPool(IPNetwork('172.0.1.0/29'), hold_down=3600, state_file=self.state_file)
+
+        self.assertEqual(pool.prefix_2_vnh, {PREFIXES[0]: '172.0.1.1', PREFIXES[1]: '172.0.1.2',
+                                             PREFIXES[2]: '172.0.1.3'})
+        self.assertEqual(pool.released.keys(), [PREFIXES[1]])
+        self.assertEqual(pool.allocate(PREFIXES[3]), ('172.0.1.4', None))
+        pool.close()
+
+    def test_state_file_is_compacted(self):
+        pool = VNHPool(IPNetwork('172.0.1.0/29'), hold_down=0, state_file=self.state_file)
+        pool.allocate(PREFIXES[0])
+        for _ in range(0, 10 * STATE_FILE_COMPACTION_FACTOR):
+            pool.release(PREFIXES[0])
+            pool.allocate(PREFIXES[0])
+            pool.flush()
+
+            with open(self.state_file) as infile:
+                num_records = len(infile.readlines())
+            self.assertEqual(num_records, pool.num_records)
+            self.assertTrue(num_records <= STATE_FILE_COMPACTION_FACTOR + 2)
+
+        pool.allocate(PREFIXES[1])
+        pool.release(PREFIXES[0])
+        release_time = pool.released[PREFIXES[0]]
+        pool.flush()
+        pool.close()
+
+        pool = VNHPool(IPNetwork('172.0.1.0/29'), hold_down=0, state_file=self.state_file)
+
+        self.assertEqual(pool.prefix_2_vnh, {PREFIXES[0]: '172.0.1.1', PREFIXES[1]: '172.0.1.2'})
+        self.assertEqual(pool.released, {PREFIXES[0]: release_time})
+        pool.close()
+
+    def test_incomplete_last_line_is_skipped(self):
+        pool = VNHPool(IPNetwork('172.0.1.0/29'), state_file=self.state_file)
+        pool.allocate(PREFIXES[0])
+        pool.close()
+        with open(self.state_file, 'a') as outfile:
+            outfile.write('["allocate", "10.0')
+
+        pool = VNHPool(IPNetwork('172.0.1.0/29'), state_file=self.state_file)
+
+        self.assertEqual(pool.prefix_2_vnh, {PREFIXES[0]: '172.0.1.1'})
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
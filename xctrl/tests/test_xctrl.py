@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import sys
+import time
+import logging
+import unittest
+
+from collections import defaultdict
+from threading import Thread
+from Queue import Queue
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+
+import xctrl as xctrl_module
+
+from lib import XCTRLEvent
+from pipeline import PipelineStage, UpdateCoalescer
+from xctrl import XCTRL
+from loop_detection.cib import PartitionedCIB
+from loop_detection.loop_detector import LoopDetector
+
+
+class FakeStage(object):
+    def __init__(self):
+        self.items = list()
+
+    def put(self, data):
+        self.items.append(data)
+
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = list()
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class FakeRIB(object):
+    def __init__(self, routes):
+        # (prefix, participant) -> as path
+        self.routes = routes
+
+    def get_best_path_participants(self, ingress_participant):
+        return set()
+
+    def get_all_participants_advertising(self, prefix, to_participant=None):
+        return set(participant for route_prefix, participant in self.routes if route_prefix == prefix)
+
+    def get_route(self, prefix, from_participant, to_participant=None):
+        as_path = self.routes.get((prefix, from_participant))
+        return {"as_path": as_path} if as_path else None
+
+
+class FakePolicyHandler(object):
+    def get_egress_participants(self, participant):
+        return set()
+
+    def get_ingress_participants(self, participant):
+        return set()
+
+
+def create_xctrl(coalescer=None):
+    xctrl = object.__new__(XCTRL)
+    xctrl.logger = logging.getLogger("XCTRL")
+    xctrl.coalescer = coalescer
+    xctrl.stages = {"vmac_encoder": FakeStage(), "arp_proxy": FakeStage()}
+    return xctrl
+
+
+def create_loop_detector():
+    """
+    loop detector of SDX 1 with participant 1 (AS 100) and participant 2 (AS 200), AS 300 is a member of SDX 3
+    """
+    asn_2_sdx = defaultdict(set)
+    asn_2_sdx[100].add(1)
+    asn_2_sdx[200].add(1)
+    asn_2_sdx[300].add(3)
+
+    loop_detector = object.__new__(LoopDetector)
+    loop_detector.logger = logging.getLogger("LoopDetector")
+    loop_detector.config = Namespace(id=1,
+                                     asn_2_participant={100: 1, 200: 2},
+                                     loop_detector=Namespace(asn_2_sdx=asn_2_sdx, max_random_value=1000))
+    loop_detector.event_queue = Queue()
+    loop_detector.cib = PartitionedCIB(1, 2)
+    loop_detector.rib = FakeRIB({("10.0.0.0/24", 2): "200 300"})
+    loop_detector.policy_handler = FakePolicyHandler()
+    loop_detector.forbidden_paths = defaultdict(lambda: defaultdict(list))
+    loop_detector.vmac_encoder = None
+    loop_detector.journal = None
+    loop_detector.no_notifications = True
+    return loop_detector
+
+
+class DispatchEventTest(unittest.TestCase):
+    def test_rib_update_goes_to_vmac_encoder(self):
+        xctrl = create_xctrl()
+        updates = [{"announce": {"prefix": "10.0.0.0/24", "next_hop": "172.0.0.1"}}]
+
+        xctrl.dispatch_event(XCTRLEvent("RouteServer", "RIB UPDATE", updates))
+
+        self.assertEqual(xctrl.stages["vmac_encoder"].items, [updates])
+        self.assertEqual(xctrl.stages["arp_proxy"].items, [])
+
+    def test_rib_update_is_coalesced(self):
+        xctrl = create_xctrl(UpdateCoalescer(10))
+        updates = [{"announce": {"prefix": "10.0.0.0/24", "next_hop": "172.0.0.1"}}]
+
+        xctrl.dispatch_event(XCTRLEvent("RouteServer", "RIB UPDATE", updates))
+
+        self.assertEqual(xctrl.stages["vmac_encoder"].items, [])
+        self.assertEqual(len(xctrl.coalescer.pending), 1)
+
+    def test_forbidden_paths_change_goes_to_arp_proxy(self):
+        loop_detector = create_loop_detector()
+
+        # SDX 3 is on the path of participant 2, so SDX 2 tells us that participant 1 must not use participant 2
+        loop_detector.handle_correctness_message({"type": "announce",
+                                                  "prefix": "10.0.0.0/24",
+                                                  "sender_sdx": 2,
+                                                  "sdx_set": [2, 3],
+                                                  "ingress_participant": 100,
+                                                  "timestamp": 0,
+                                                  "random_value": 0})
+        self.assertEqual(loop_detector.forbidden_paths[1]["10.0.0.0/24"], [2])
+
+        event = loop_detector.event_queue.get_nowait()
+        xctrl = create_xctrl()
+        xctrl.dispatch_event(event)
+
+        self.assertEqual(xctrl.stages["arp_proxy"].items, [[{"participant": 1, "prefix": "10.0.0.0/24"}]])
+        self.assertEqual(xctrl.stages["vmac_encoder"].items, [])
+
+
+class PipelineStatisticsTest(unittest.TestCase):
+    def setUp(self):
+        self.interval = xctrl_module.PIPELINE_STATISTICS_INTERVAL
+        xctrl_module.PIPELINE_STATISTICS_INTERVAL = 0.01
+
+        self.handler = RecordingHandler()
+        self.logger = logging.getLogger("XCTRL")
+        self.logger.addHandler(self.handler)
+        self.level = self.logger.level
+        self.logger.setLevel(logging.INFO)
+
+    def tearDown(self):
+        xctrl_module.PIPELINE_STATISTICS_INTERVAL = self.interval
+        self.logger.removeHandler(self.handler)
+        self.logger.setLevel(self.level)
+
+    def test_statistics_are_logged_while_the_pipeline_is_congested(self):
+        xctrl = create_xctrl()
+        # a stage without a worker whose queue is full, so the next put blocks
+        stage = PipelineStage("vmac_encoder", None, 1)
+        stage.put([])
+        xctrl.stages = {"vmac_encoder": stage}
+        xctrl.run = True
+
+        blocked_put = Thread(target=stage.put, args=([],))
+        blocked_put.daemon = True
+        blocked_put.start()
+
+        thread = Thread(target=xctrl.log_pipeline_statistics_periodically)
+        thread.daemon = True
+        thread.start()
+        time.sleep(0.1)
+        xctrl.run = False
+        thread.join(1)
+
+        self.assertTrue(blocked_put.is_alive())
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(self.handler.records)
+        for record in self.handler.records:
+            self.assertEqual(record.levelno, logging.INFO)
+            self.assertTrue(record.getMessage().startswith("stage vmac_encoder - queue depth: 1,"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,71 +3,281 @@
 #  Rudiger Birkner (Networked Systems Group ETH Zurich)
 
 import logging
+from threading import Lock
+from heapq import heapify, heappush, heappop
 from collections import defaultdict
 from lib import XCTRLModule
+from vnh_pool import VNHPool, VNH_HOLD_DOWN
 
 
 from netaddr import IPNetwork
 
 
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+def mask_bits(mask):
+    """
+    :param mask: bitmask
+    :return: list of the positions of all set bits
+    """
+    bits = list()
+    while mask:
+        lowest_bit = mask & -mask
+        bits.append(lowest_bit.bit_length() - 1)
+        mask ^= lowest_bit
+    return bits
+
+
+def compute_supersets(masks, max_size):
+    """
+    combines sets of participants into as few supersets of at most max_size participants as possible, so that each
+    set is a subset of a superset. Identical sets and sets that are a subset of another set are removed, then each
+    superset is built greedily: starting from the largest remaining set, the set with the largest intersection is
+    merged until no further set fits.
+    :param masks: list of bitmasks of the sets of participants
+    :param max_size: max number of participants in a superset
+    :return: list of bitmasks of the supersets
+    """
+    # identical sets have the same bitmask
+    masks = sorted(set(mask for mask in masks if mask), key=lambda mask: (-popcount(mask), mask))
+
+    # a set can only be a subset of a set of the same or a larger size, which are already in maximal_sets. Only the
+    # sets that contain the lowest participant of the set have to be checked
+    maximal_sets = list()
+    sets_with_participant = defaultdict(list)
+    for mask in masks:
+        lowest_bit = (mask & -mask).bit_length() - 1
+        if any(mask & maximal_sets[i] == mask for i in sets_with_participant[lowest_bit]):
+            continue
+        for bit in mask_bits(mask):
+            sets_with_participant[bit].append(len(maximal_sets))
+        maximal_sets.append(mask)
+
+    sizes = [popcount(mask) for mask in maximal_sets]
+    remaining = set(range(0, len(maximal_sets)))
+
+    supersets = list()
+    for seed in range(0, len(maximal_sets)):
+        if seed not in remaining:
+            continue
+        remaining.discard(seed)
+
+        superset = maximal_sets[seed]
+        size = sizes[seed]
+
+        # priority queue of the remaining sets ordered by the size of the intersection with the superset (largest
+        # first) and then by their size (smallest first). When participants are added to the superset, the sets that
+        # contain them are pushed again with their new intersection, the outdated entries are skipped.
+        intersections = dict()
+        queue = list()
+        for i in remaining:
+            intersections[i] = popcount(maximal_sets[i] & superset)
+            queue.append((-intersections[i], sizes[i], i))
+        heapify(queue)
+
+        while queue and size < max_size:
+            intersection, _, i = heappop(queue)
+            if i not in remaining or -intersection != intersections.get(i):
+                continue
+
+            # the union only grows with the superset, so a set that does not fit now never fits into this superset
+            new_size = size + sizes[i] - intersections[i]
+            if new_size > max_size:
+                del intersections[i]
+                continue
+
+            new_members = maximal_sets[i] & ~superset
+            superset |= maximal_sets[i]
+            size = new_size
+            remaining.discard(i)
+
+            for bit in mask_bits(new_members):
+                for j in sets_with_participant[bit]:
+                    if j in intersections and j in remaining:
+                        intersections[j] += 1
+                        heappush(queue, (-intersections[j], sizes[j], j))
+
+        supersets.append(superset)
+
+    return supersets
+
+
 class SuperSetEncoder(XCTRLModule):
     def __init__(self, config, event_queue, debug, rib, loop_detection, test):
         super(SuperSetEncoder, self).__init__(config, event_queue, debug)
         self.rib = rib
         self.loop_detection = loop_detection
 
+        # each superset is an ordered list of participants - the position of a participant is its bit in the VMAC
         self.supersets = list()
 
+        # dense index of the participants, each participant is represented by one bit in the superset masks. The
+        # index is built once, so it can be read from all threads without a lock
+        self.participant_bits = dict((participant, bit)
+                                     for bit, participant in enumerate(sorted(self.config.participants)))
+        # bitmask of the members of each superset (same order as self.supersets)
+        self.superset_masks = list()
+        # position of each member in each superset (same order as self.supersets)
+        self.superset_positions = list()
+        # superset identifier and position of each participant in the first superset it is a member of
+        self.participant_2_bit = dict()
+        # participants whose entry in participant_2_bit changed since the last call of update_supersets
+        self.changed_participant_bits = set()
+
+        # VMAC of each (vnh, participant) - an entry is removed as soon as the supersets, the participants advertising
+        # the prefix, the best path or the forbidden paths of the participant change
+        self.vmac_lock = Lock()
+        self.vmac_cache = dict()
+        # keys of the cached VMACs per prefix
+        self.prefix_vmacs = defaultdict(set)
+        # keys of the cached VMACs per superset index, None for the VMACs of sets that are not covered by a superset
+        self.superset_vmacs = defaultdict(set)
+
+        # records the supersets after each change if the state is kept on disk (see StateStore)
+        self.journal = None
+        # last supersets found in the journal, they are only applied once the whole journal has been read
+        self.replayed_state = None
+
+    def participant_mask(self, participants):
+        """
+        :param participants: iterable of participant ids
+        :return: bitmask of the participants
+        """
+        mask = 0
+        for participant in participants:
+            mask |= 1 << self.participant_bits[participant]
+        return mask
+
+    def add_superset(self, members):
+        """
+        appends a new superset
+        :param members: list of participants
+        :return: index of the new superset
+        """
+        index = len(self.supersets)
+        self.supersets.append(list())
+        self.superset_masks.append(0)
+        self.superset_positions.append(dict())
+        self.extend_superset(index, members)
+        return index
+
+    def extend_superset(self, index, new_members):
+        """
+        adds new members at the end of an existing superset
+        :param index: index of the superset
+        :param new_members: list of participants that are not yet members
+        :return:None
+        """
+        superset = self.supersets[index]
+        positions = self.superset_positions[index]
+        for participant in new_members:
+            positions[participant] = len(superset)
+            superset.append(participant)
+            participant_bit = self.participant_2_bit.get(participant)
+            if participant_bit is None or participant_bit[0] > index:
+                self.participant_2_bit[participant] = (index, positions[participant])
+                self.changed_participant_bits.add(participant)
+        self.superset_masks[index] |= self.participant_mask(new_members)
+
+        # the VMACs of the sets that are now covered by this superset have to use it instead of a later one
+        superset_mask = self.superset_masks[index]
+        with self.vmac_lock:
+            self.invalidate_vmacs(self.superset_vmacs.pop(None, set()))
+            for later_index in range(index + 1, len(self.supersets)):
+                self.invalidate_vmacs([key for key in self.superset_vmacs.get(later_index, ())
+                                       if self.vmac_cache[key][2] & superset_mask == self.vmac_cache[key][2]])
+
+    def set_supersets(self, supersets):
+        """
+        replaces all supersets
+        :param supersets: list of lists of participants
+        :return:None
+        """
+        old_participant_2_bit = self.participant_2_bit
+        changed_participant_bits = self.changed_participant_bits
+
+        self.supersets = list()
+        self.superset_masks = list()
+        self.superset_positions = list()
+        self.participant_2_bit = dict()
+        self.changed_participant_bits = set()
+        with self.vmac_lock:
+            self.vmac_cache = dict()
+            self.prefix_vmacs = defaultdict(set)
+            self.superset_vmacs = defaultdict(set)
+        for superset in supersets:
+            self.add_superset(superset)
+
+        # only the participants that ended up with a different superset identifier or position changed
+        self.changed_participant_bits = changed_participant_bits
+        for participant in set(old_participant_2_bit).union(self.participant_2_bit):
+            if old_participant_2_bit.get(participant) != self.participant_2_bit.get(participant):
+                self.changed_participant_bits.add(participant)
+
     def update_supersets(self, updates):
+        """
+        adds the sets of participants advertising the announced prefixes to the supersets
+        :param updates: list of updates as returned by RIB.update
+        :return: dict with the type of the change ("update" or "new"), the changes of the supersets, and the
+        participants whose superset identifier or position changed ("changed participants")
+        """
+        self.changed_participant_bits = set()
+
         sdx_msgs = {"type": "update",
                     "changes": []}
 
         for update in updates:
+            # the participants advertising the prefix and their best paths might have changed
+            for update_type in ('announce', 'withdraw'):
+                if update_type in update:
+                    self.invalidate_prefix_vmacs(update[update_type]['prefix'])
+
             if 'announce' in update:
                 prefix = update['announce']['prefix']
 
                 # get set of all participants advertising that prefix
                 basic_set = self.rib.get_all_participants_advertising(prefix)
+                basic_mask = self.participant_mask(basic_set)
 
                 # check if this set is a subset of one of the existing supersets
-                if not SuperSetEncoder.is_subset_of_superset(basic_set, self.supersets):
+                if not SuperSetEncoder.is_subset_of_superset(basic_mask, self.superset_masks):
                     # since it is not a subset, we have to either extend an existing superset (if possible)
                     # or add a new subset
 
-                    diffs = [len(basic_set.difference(set(superset))) for superset in self.supersets]
-                    unions  = [len(basic_set.union(set(superset))) for superset in self.supersets]
-                    sorted_diff = sorted(diffs)
-
-                    new_members = None
                     superset_index = None
-                    add_superset = True
+                    min_diff = None
 
                     # check to which superset the minimal number of participants has to be added while
-                    # staying within the maximum size
-                    for i in range(0, len(sorted_diff)):
-                        index = diffs.index(sorted_diff[i])
-                        if unions[index] <= self.config.vmac_encoder.max_superset_size:
-                            new_members = list(basic_set.difference(set(self.supersets[i])))
-                            self.supersets[i].extend(new_members)
-                            add_superset = False
+                    # staying within the maximum size (the size of the union is the size of the superset plus
+                    # the number of added participants)
+                    for index, superset_mask in enumerate(self.superset_masks):
+                        diff = popcount(basic_mask & ~superset_mask)
+                        if (min_diff is None or diff < min_diff) and \
+                                len(self.supersets[index]) + diff <= self.config.vmac_encoder.max_superset_size:
                             superset_index = index
-                            break
+                            min_diff = diff
+                            # the basic set is not a subset, so at least one participant has to be added
+                            if diff == 1:
+                                break
 
                     # if it is not possible to extend a superset, a new superset has to be created
-                    if add_superset:
-                        self.supersets.append(list(basic_set))
-                        superset_index = len(self.supersets) - 1
-                        for participant in self.supersets[-1]:
-                            # changes in the superset are prepared to be sent to the controller
-                            sdx_msgs["changes"].append({"participant_id": participant,
-                                                       "superset": superset_index,
-                                                       "position": self.supersets[superset_index].index(participant)})
+                    if superset_index is None:
+                        new_members = sorted(basic_set)
+                        superset_index = self.add_superset(new_members)
                     else:
-                        for participant in new_members:
-                            # changes in the superset are prepared to be sent to the controller
-                            sdx_msgs["changes"].append({"participant_id": participant,
-                                                       "superset": superset_index,
-                                                       "position": self.supersets[superset_index].index(participant)})
+                        positions = self.superset_positions[superset_index]
+                        new_members = sorted([participant for participant in basic_set
+                                              if participant not in positions])
+                        self.extend_superset(superset_index, new_members)
+
+                    # changes in the superset are prepared to be sent to the controller
+                    positions = self.superset_positions[superset_index]
+                    for participant in new_members:
+                        sdx_msgs["changes"].append({"participant_id": participant,
+                                                   "superset": superset_index,
+                                                   "position": positions[participant]})
 
                     # if preconfigured threshold is exceeded, then start completely from scratch
                     if len(self.supersets) > self.config.vmac_encoder.superset_threshold:
@@ -76,77 +286,87 @@ class SuperSetEncoder(XCTRLModule):
                         sdx_msgs = {"type": "new",
                                     "changes": []}
 
-                        for superset in self.supersets:
+                        for index, superset in enumerate(self.supersets):
                             for participant in superset:
                                 sdx_msgs["changes"].append({"participant_id": participant,
-                                                           "superset": superset_index,
-                                                           "position": self.supersets[superset_index].index(participant)})
+                                                           "superset": index,
+                                                           "position": self.superset_positions[index][participant]})
 
             elif 'withdraw' in update:
                 continue
 
         self.logger.debug('update_supersets(): ' + str(self.supersets))
 
-        # check which participants joined a new superset
+        if self.journal and (sdx_msgs["changes"] or sdx_msgs["type"] == "new"):
+            self.journal(self.get_state())
+
+        # the VMAC matches of the outbound policies towards these participants have to be updated
+        sdx_msgs["changed participants"] = self.changed_participant_bits
+
         return sdx_msgs
 
     def recompute_all_supersets(self):
         # get all sets of participants advertising the same prefix
         peer_sets = self.rib.get_all_participant_sets(self.config.vmac_encoder.prefix_2_vnh.keys())
 
-        # remove all subsets
-        peer_sets.sort(key=len, reverse=True)
-        for i in range(0, len(peer_sets)):
-            for j in reversed(range(i+1, len(peer_sets))):
-                if peer_sets[i].issuperset(peer_sets[j]):
-                    peer_sets.remove(peer_sets[j])
+        superset_masks = compute_supersets([self.participant_mask(peer_set) for peer_set in peer_sets],
+                                           self.config.vmac_encoder.max_superset_size)
 
-        # start combining sets to supersets
-        supersets = []
+        bit_2_participant = dict((bit, participant) for participant, bit in self.participant_bits.iteritems())
+        self.set_supersets([[bit_2_participant[bit] for bit in mask_bits(mask)] for mask in superset_masks])
 
-        # start building the supersets by combining the sets with the largest intersections
-        for tmp_set in peer_sets:
-            peer_sets.remove(tmp_set)
-            superset = tmp_set
-
-            intersects = [len(superset.intersection(s)) for s in peer_sets]
-
-            for i in range(0, len(intersects)):
-                index = intersects.index(max(intersects))
-                if (len(superset) == self.config.max_size) or (intersects[index] == -1):
-                    break
-                if len(superset.union(peer_sets[index])) <= self.config.max_size:
-                    superset = superset.union(peer_sets[index])
-                    intersects[index] = -1
-            for i in reversed(range(0, len(intersects))):
-                if intersects[i] == -1:
-                    peer_sets.remove(peer_sets[i])
-            supersets.append(list(superset))
         # check if threshold is still exceeded and if so adjust it
-        if len(superset) > self.xrs.superset_threshold:
+        if len(self.supersets) > self.config.vmac_encoder.superset_threshold:
             self.config.vmac_encoder.superset_threshold *= 2
 
-        self.supersets = supersets
+    def get_state(self):
+        """
+        :return: dict with the supersets (list of lists of participants) and the current superset threshold
+        """
+        return {"supersets": [list(superset) for superset in list(self.supersets)],
+                "superset threshold": self.config.vmac_encoder.superset_threshold}
+
+    def set_state(self, state):
+        self.set_supersets(state["supersets"])
+        self.changed_participant_bits = set()
+        self.config.vmac_encoder.superset_threshold = state["superset threshold"]
+
+    def replay(self, record):
+        # every record contains all supersets, so only the last one has to be applied
+        self.replayed_state = record[0]
+
+    def restored(self):
+        if self.replayed_state:
+            self.set_state(self.replayed_state)
+            self.replayed_state = None
 
     @staticmethod
-    def is_subset_of_superset(subset, supersets):
-        for superset in supersets:
-            if (set(superset)).issuperset(subset):
+    def is_subset_of_superset(subset_mask, superset_masks):
+        for superset_mask in superset_masks:
+            if subset_mask & superset_mask == subset_mask:
                 return True
         return False
 
     def vnh_assignment(self, updates):
+        vnh_pool = self.config.vmac_encoder.vnh_pool
+
         for update in updates:
             if 'announce' in update:
-                prefix = update['announce']['prefix']
+                # get next VNH and assign it the prefix
+                vnh, reclaimed_prefix = vnh_pool.allocate(update['announce']['prefix'])
+
+                # the VNH was used for another prefix before
+                if reclaimed_prefix is not None:
+                    self.invalidate_prefix_vmacs(reclaimed_prefix)
+
+            elif 'withdraw' in update:
+                prefix = update['withdraw']['prefix']
 
-                if prefix not in self.config.vmac_encoder.prefix_2_vnh:
-                    # get next VNH and assign it the prefix
-                    self.config.vmac_encoder.num_vnhs_in_use += 1
-                    vnh = str(self.config.vmac_encoder.vnhs[self.config.vmac_encoder.num_vnhs_in_use])
+                # free the VNH once no participant advertises the prefix anymore
+                if not self.rib.get_all_participants_advertising(prefix):
+                    vnh_pool.release(prefix)
 
-                    self.config.vmac_encoder.prefix_2_vnh[prefix] = vnh
-                    self.config.vmac_encoder.vnh_2_prefix[vnh] = prefix
+        vnh_pool.flush()
 
     def prefix_to_vnh(self, prefix):
         return self.config.vmac_encoder.prefix_2_vnh[prefix]
@@ -155,144 +375,162 @@ class SuperSetEncoder(XCTRLModule):
         return self.config.vmac_encoder.vnh_2_prefix[vnh]
 
     def vmac(self, vnh, participant):
-        vmac_bitstring = ""
-        vmac_addr = ""
+        """
+        VMAC of the prefix of the VNH for the participant - the superset identifier, one bit for each member of the
+        superset that advertises the prefix and can be used by the participant, and the identifier of the best path
+        :param vnh: VNH of the prefix
+        :param participant: participant the VMAC is used by
+        :return: mac address, empty string if the participant has no route for the prefix
+        """
+        key = (vnh, participant)
+
+        vmac_entry = self.vmac_cache.get(key)
+        if vmac_entry is not None:
+            return vmac_entry[0]
+
+        if vnh not in self.config.vmac_encoder.vnh_2_prefix:
+            return ""
+
+        with self.vmac_lock:
+            vmac_entry = self.vmac_cache.get(key)
+            if vmac_entry is not None:
+                return vmac_entry[0]
 
-        if vnh in self.config.vmac_encoder.vnh_2_prefix:
             # get corresponding prefix
             prefix = self.config.vmac_encoder.vnh_2_prefix[vnh]
-            # get set of participants advertising prefix
-            basic_set = self.rib.get_all_participants_advertising(prefix)
 
+            # add identifier of best path
+            # rib_name, columns, participants, prefix, next_hop, all_entries
+            route = self.rib.get_routes('local', ['next_hop'], participant, prefix, None, False)
+            if not route:
+                return ""
+            best_participant = self.config.portip_2_participant[route['next_hop']]
 
+            # get set of participants advertising prefix
+            basic_set = self.rib.get_all_participants_advertising(prefix)
+            basic_mask = self.participant_mask(basic_set)
 
             # get corresponding superset identifier
-            superset_identifier = 0
-            for i in range(0, len(self.supersets)):
-                if (set(self.supersets[i])).issuperset(basic_set):
+            superset_identifier = None
+            for i in range(0, len(self.superset_masks)):
+                if basic_mask & self.superset_masks[i] == basic_mask:
                     superset_identifier = i
                     break
 
-            vmac_bitstring = '{num:0{width}b}'.format(num=superset_identifier,
-                                                      width=(self.config.vmac_encoder.vmac_size -
-                                                             self.config.vmac_encoder.max_superset_size -
-                                                             self.config.vmac_encoder.best_path_size)
-                                                      )
-
-            # add one bit for each participant that is a member of the basic set and has a "link" to it
-            set_bitstring = ""
-
             self.logger.debug('Basic Set: ' + str(basic_set) +
                               ', Peers Out: ' + str(self.config.participants[participant].peers_out) +
                               'Loop Detection: ' + str(self.loop_detection[participant][prefix]))
 
-            for temp_participant in self.supersets[superset_identifier]:
-                if temp_participant in basic_set and temp_participant in self.config.participants[participant].peers_out and \
-                                temp_participant not in self.loop_detection[participant][prefix]:
-                    set_bitstring += "1"
-                else:
-                    set_bitstring += "0"
-            if len(set_bitstring) < self.config.vmac_encoder.max_superset_size:
-                set_bitstring += '{num:0{width}b}'.format(num=0, width=(self.config.vmac_encoder.max_superset_size -
-                                                                        len(set_bitstring)))
-
-            vmac_bitstring += set_bitstring
-
-            # add identifier of best path
-            # rib_name, columns, participants, prefix, next_hop, all_entries
-            route = self.rib.get_routes('local', ['next_hop'], participant, prefix, None, False)
-            if route:
-                best_participant = self.config.portip_2_participant[route['next_hop']]
-
-                vmac_bitstring += '{num:0{width}b}'.format(num=best_participant,
-                                                           width=self.config.vmac_encoder.best_path_size)
-
-                # convert bitstring to hexstring and then to a mac address
-                vmac_addr = self.bitstring_to_mac_address(vmac_bitstring)
-
-                self.logger.debug('VMAC-Mapping \nParticipant: ' + str(participant) + ', Prefix: ' + str(prefix) +
-                                  'Best Path: ' + str(best_participant) + '\nSuperset ' + str(superset_identifier) +
-                                  ': ' + str(self.supersets[superset_identifier]) + '\nVMAC: ' +
-                                  str(vmac_addr) + ', Bitstring: ' + str(vmac_bitstring))
+            # add one bit for each participant that is a member of the basic set and has a "link" to it - the first
+            # member of the superset is the most significant bit. Members beyond the max superset size (a set that was
+            # larger than the max size is added as a superset of its own) cannot be encoded.
+            max_superset_size = self.config.vmac_encoder.max_superset_size
+            set_bits = 0
+            if self.supersets:
+                positions = self.superset_positions[superset_identifier or 0]
+                peers_out = self.config.participants[participant].peers_out
+                forbidden_participants = self.loop_detection[participant][prefix]
+                for temp_participant in basic_set:
+                    position = positions.get(temp_participant)
+                    if position is not None and position < max_superset_size and temp_participant in peers_out and \
+                            temp_participant not in forbidden_participants:
+                        set_bits |= 1 << (max_superset_size - 1 - position)
+
+            best_path_size = self.config.vmac_encoder.best_path_size
+            vmac_addr = self.int_to_mac_address(((superset_identifier or 0) << (max_superset_size + best_path_size)) |
+                                                (set_bits << best_path_size) | best_participant)
+
+            self.vmac_cache[key] = (vmac_addr, superset_identifier, basic_mask)
+            self.prefix_vmacs[prefix].add(key)
+            self.superset_vmacs[superset_identifier].add(key)
+
+            self.logger.debug('VMAC-Mapping \nParticipant: ' + str(participant) + ', Prefix: ' + str(prefix) +
+                              'Best Path: ' + str(best_participant) + '\nSuperset ' + str(superset_identifier) +
+                              ': ' + str(self.supersets[superset_identifier or 0] if self.supersets else []) +
+                              '\nVMAC: ' + str(vmac_addr))
 
         return vmac_addr
 
-    def best_path_match(self, participant_id):
-        # add participant identifier
-        vmac_bitstring = '{num:0{width}b}'.format(num=participant_id,
-                                                  width=self.config.vmac_encoder.vmac_size)
+    def invalidate_prefix_vmacs(self, prefix, participant=None):
+        """
+        removes the cached VMACs of a prefix
+        :param prefix:
+        :param participant: only remove the VMAC of this participant, None to remove the VMACs of all participants
+        :return:None
+        """
+        with self.vmac_lock:
+            if participant is None:
+                self.invalidate_vmacs(self.prefix_vmacs.pop(prefix, ()))
+            elif prefix in self.prefix_vmacs:
+                self.invalidate_vmacs([key for key in self.prefix_vmacs[prefix] if key[1] == participant])
+
+    def invalidate_vmacs(self, keys):
+        """
+        removes VMACs from the cache - the caller has to hold the vmac_lock
+        :param keys: iterable of (vnh, participant)
+        :return:None
+        """
+        for key in keys:
+            vmac_entry = self.vmac_cache.pop(key, None)
+            if vmac_entry is None:
+                continue
+            prefix = self.config.vmac_encoder.vnh_2_prefix.get(key[0])
+            if prefix in self.prefix_vmacs:
+                self.prefix_vmacs[prefix].discard(key)
+            if vmac_entry[1] in self.superset_vmacs:
+                self.superset_vmacs[vmac_entry[1]].discard(key)
+
+    def participant_bit(self, participant):
+        """
+        :param participant:
+        :return: tuple (superset identifier, position) of the first superset the participant is a member of, None if
+        it is not a member of any superset
+        """
+        return self.participant_2_bit.get(participant)
 
-        # convert bitstring to hexstring and then to a mac address
-        return self.bitstring_to_mac_address(vmac_bitstring)
+    def best_path_match(self, participant_id):
+        # participant identifier in the lowest bits
+        return self.int_to_mac_address(participant_id)
 
     def best_path_mask(self):
-        # add participant identifier
-        vmac_bitstring = '{num:0{width}b}'.format(num=2**self.config.vmac_encoder.best_path_size - 1,
-                                                  width=self.config.vmac_encoder.vmac_size)
-
-        # convert bitstring to hexstring and then to a mac address
-        return self.bitstring_to_mac_address(vmac_bitstring)
+        return self.int_to_mac_address((1 << self.config.vmac_encoder.best_path_size) - 1)
 
     def participant_bit_match(self, participant):
-        for i in range(0, len(self.supersets)):
-            if participant in self.supersets[i]:
-                participant_position = self.supersets[i].index(participant) + 1
-                superset_identifier = i
-
-                # add participant identifier
-                vmac_bitstring = '{num:0{width}b}'.format(num=superset_identifier,
-                                                              width=self.config.vmac_encoder.superset_id_size)
+        participant_bit = self.participant_2_bit.get(participant)
+        if participant_bit is not None:
+            superset_identifier, participant_position = participant_bit
+            superset_id_shift = self.config.vmac_encoder.vmac_size - self.config.vmac_encoder.superset_id_size
 
-                vmac_bitstring += '{num:0{width}b}'.format(num=1, width=participant_position)
-                vmac_bitstring += '{num:0{width}b}'.format(num=0,
-                                                           width=self.config.vmac_encoder.vmac_size-len(vmac_bitstring))
-
-                # convert bitstring to hexstring and then to a mac address
-                return self.bitstring_to_mac_address(vmac_bitstring)
+            # superset identifier followed by the bit of the participant
+            return self.int_to_mac_address((superset_identifier << superset_id_shift) |
+                                           (1 << (superset_id_shift - 1 - participant_position)))
 
     def participant_bit_mask(self, participant):
-        for i in range(0, len(self.supersets)):
-            if participant in self.supersets[i]:
-                participant_position = self.supersets[i].index(participant) + 1
-
-                # add participant identifier
-                vmac_bitstring = '{num:0{width}b}'.format(num=2**self.config.vmac_encoder.superset_id_size-1,
-                                                          width=self.config.vmac_encoder.superset_id_size)
+        participant_bit = self.participant_2_bit.get(participant)
+        if participant_bit is not None:
+            participant_position = participant_bit[1]
+            superset_id_size = self.config.vmac_encoder.superset_id_size
+            superset_id_shift = self.config.vmac_encoder.vmac_size - superset_id_size
 
-                vmac_bitstring += '{num:0{width}b}'.format(num=1, width=participant_position)
-                vmac_bitstring += '{num:0{width}b}'.format(num=0,
-                                                           width=self.config.vmac_encoder.vmac_size-len(vmac_bitstring))
-
-                # convert bitstring to hexstring and then to a mac address
-                return self.bitstring_to_mac_address(vmac_bitstring)
+            # all bits of the superset identifier and the bit of the participant
+            return self.int_to_mac_address((((1 << superset_id_size) - 1) << superset_id_shift) |
+                                           (1 << (superset_id_shift - 1 - participant_position)))
 
     def participant_port_match(self, participant, port):
-        # port match
-        port_match_length = self.config.vmac_encoder.superset_id_size + self.config.vmac_encoder.max_superset_size
-        vmac_bitstring = '{num:0{width}b}'.format(num=port,
-                                                  width=port_match_length)
-        vmac_bitstring += '{num:0{width}b}'.format(num=participant,
-                                                  width=self.config.vmac_encoder.best_path_size)
-
-        # convert bitstring to hexstring and then to a mac address
-        return self.bitstring_to_mac_address(vmac_bitstring)
+        # port in the bits of the superset identifier and the superset, participant identifier in the lowest bits
+        return self.int_to_mac_address((port << self.config.vmac_encoder.best_path_size) | participant)
 
     def participant_port_mask(self):
-        vmac_bitstring = '{num:0{width}b}'.format(num=2**self.config.vmac_encoder.vmac_size-1,
-                                                  width=self.config.vmac_encoder.vmac_size)
+        return self.int_to_mac_address((1 << self.config.vmac_encoder.vmac_size) - 1)
 
-        # convert bitstring to hexstring and then to a mac address
-        return self.bitstring_to_mac_address(vmac_bitstring)
-
-    def bitstring_to_mac_address(self, bit_string):
-        vmac_addr = '{num:0{width}x}'.format(num=int(bit_string,2), width=self.config.vmac_encoder.vmac_size/4)
-        vmac_addr = ':'.join([vmac_addr[i]+vmac_addr[i+1] for i in range(0,self.config.vmac_encoder.vmac_size/4,2)])
-
-        return vmac_addr
+    def int_to_mac_address(self, value):
+        vmac_addr = '%0*x' % (self.config.vmac_encoder.vmac_size / 4, value)
+        return ':'.join([vmac_addr[i:i+2] for i in range(0, len(vmac_addr), 2)])
 
 
 class SuperSetEncoderConfig(object):
-    def __init__(self, vmac_size, superset_id_size, max_superset_size, best_path_size, superset_threshold, vnhs):
+    def __init__(self, vmac_size, superset_id_size, max_superset_size, best_path_size, superset_threshold, vnhs,
+                 vnh_hold_down=VNH_HOLD_DOWN, vnh_state_file=None):
         self.vmac_size = vmac_size
         self.superset_id_size = superset_id_size
         self.max_superset_size = max_superset_size
@@ -300,6 +538,6 @@ class SuperSetEncoderConfig(object):
         self.superset_threshold = superset_threshold
 
         self.vnhs = IPNetwork(vnhs)
-        self.num_vnhs_in_use = 0
-        self.vnh_2_prefix = {}
-        self.prefix_2_vnh = {}
+        self.vnh_pool = VNHPool(self.vnhs, vnh_hold_down, vnh_state_file)
+        self.vnh_2_prefix = self.vnh_pool.vnh_2_prefix
+        self.prefix_2_vnh = self.vnh_pool.prefix_2_vnh
@@ -0,0 +1,208 @@
+#  Author:
+#  Rudiger Birkner (Networked Systems Group ETH Zurich)
+
+import os
+import json
+import time
+import socket
+import struct
+import logging
+
+from collections import deque
+
+# time in seconds before a released VNH is handed out again, so that the ARP caches of the participants can expire
+VNH_HOLD_DOWN = 300
+# the state file is rewritten once it holds this many times more records than there are current entries
+STATE_FILE_COMPACTION_FACTOR = 4
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+def ip_to_int(address):
+    return struct.unpack('!I', socket.inet_aton(address))[0]
+
+
+class VNHPool(object):
+    """
+    Assigns the VNHs of the SDX to the prefixes. The addresses are handled as integers: new VNHs are taken in order
+    from the range of the VNH network and, once the range is used up, released VNHs are reused in the order they
+    were released, but not before the hold-down time has passed.
+
+    A VNH is released when no participant advertises its prefix anymore. It stays assigned to the prefix until it is
+    reused, so late withdrawals are still sent with the right next hop and the prefix gets the same VNH back if it is
+    announced again.
+
+    If a state file is given, every change is appended to it and the assignment is restored from it on startup, so
+    the VNHs (and therefore the ARP entries of the participants) do not change across restarts. The file is
+    compacted on startup and whenever it grew to STATE_FILE_COMPACTION_FACTOR times the number of current entries.
+    """
+    def __init__(self, vnhs, hold_down=VNH_HOLD_DOWN, state_file=None):
+        self.logger = logging.getLogger("VNHPool")
+
+        self.hold_down = hold_down
+
+        # the network and the broadcast address are never assigned
+        self.first_vnh = int(vnhs.first) + 1
+        self.last_vnh = int(vnhs.last) - 1 if vnhs.size > 2 else int(vnhs.last)
+        self.next_vnh = self.first_vnh
+
+        self.prefix_2_vnh = dict()
+        self.vnh_2_prefix = dict()
+
+        # release time of each released prefix
+        self.released = dict()
+        # (release time, prefix) in the order the prefixes were released
+        self.free_list = deque()
+
+        self.state_file = state_file
+        self.journal = None
+        # number of records in the state file
+        self.num_records = 0
+        if self.state_file:
+            self.load()
+
+    def allocate(self, prefix):
+        """
+        assigns a VNH to the prefix, unless it already has one
+        :param prefix:
+        :return: tuple (vnh, prefix whose VNH was reused or None)
+        """
+        vnh = self.prefix_2_vnh.get(prefix)
+        if vnh is not None:
+            if prefix in self.released:
+                del self.released[prefix]
+                self.write('allocate', prefix, vnh)
+            return vnh, None
+
+        reclaimed_prefix = None
+        if self.next_vnh <= self.last_vnh:
+            vnh = int_to_ip(self.next_vnh)
+            self.next_vnh += 1
+        else:
+            reclaimed_prefix = self.reclaim()
+            if reclaimed_prefix is None:
+                self.logger.error('no VNH left for ' + str(prefix) + ' - ' + str(len(self.released)) +
+                                  ' VNHs are in hold-down')
+                raise IndexError('all VNHs are in use')
+
+            vnh = self.prefix_2_vnh.pop(reclaimed_prefix)
+
+        self.prefix_2_vnh[prefix] = vnh
+        self.vnh_2_prefix[vnh] = prefix
+        self.write('allocate', prefix, vnh)
+
+        return vnh, reclaimed_prefix
+
+    def release(self, prefix):
+        """
+        marks the VNH of the prefix as free, it is reused after the hold-down time
+        :param prefix:
+        :return:None
+        """
+        if prefix not in self.prefix_2_vnh or prefix in self.released:
+            return
+
+        release_time = time.time()
+        self.released[prefix] = release_time
+        self.free_list.append((release_time, prefix))
+        self.write('release', prefix, release_time)
+
+    def reclaim(self):
+        """
+        :return: the prefix that was released first and whose hold-down time is over, None if there is none
+        """
+        now = time.time()
+        while self.free_list:
+            release_time, prefix = self.free_list[0]
+            # the prefix was announced again after it was released
+            if self.released.get(prefix) != release_time:
+                self.free_list.popleft()
+                continue
+            if now - release_time < self.hold_down:
+                return None
+
+            self.free_list.popleft()
+            del self.released[prefix]
+            return prefix
+        return None
+
+    def write(self, *entry):
+        if self.journal:
+            self.journal.write(json.dumps(entry) + '\n')
+            self.num_records += 1
+
+    def flush(self):
+        if self.journal:
+            self.journal.flush()
+
+            num_entries = len(self.prefix_2_vnh) + len(self.released)
+            if self.num_records > STATE_FILE_COMPACTION_FACTOR * max(num_entries, 1):
+                self.compact()
+
+    def load(self):
+        """
+        restores the assignment from the state file, then compacts it
+        :return:None
+        """
+        directory = os.path.dirname(self.state_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as infile:
+                for line in infile:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # the last line might be incomplete if the controller was stopped while writing it
+                        self.logger.debug('skipped invalid line in ' + self.state_file)
+                        continue
+
+                    if entry[0] == 'allocate':
+                        prefix, vnh = entry[1], str(entry[2])
+                        previous_prefix = self.vnh_2_prefix.get(vnh)
+                        if previous_prefix is not None and previous_prefix != prefix:
+                            del self.prefix_2_vnh[previous_prefix]
+                            self.released.pop(previous_prefix, None)
+                        self.prefix_2_vnh[prefix] = vnh
+                        self.vnh_2_prefix[vnh] = prefix
+                        self.released.pop(prefix, None)
+                    elif entry[0] == 'release':
+                        self.released[entry[1]] = entry[2]
+
+            if self.vnh_2_prefix:
+                self.next_vnh = max(ip_to_int(vnh) for vnh in self.vnh_2_prefix) + 1
+            self.free_list = deque(sorted((release_time, prefix) for prefix, release_time in self.released.iteritems()))
+
+            self.logger.info('restored ' + str(len(self.prefix_2_vnh)) + ' VNHs (' + str(len(self.released)) +
+                             ' released) from ' + self.state_file)
+
+        self.compact()
+
+    def compact(self):
+        """
+        rewrites the state file with only the current assignment and keeps it open to append all further changes.
+        The new file replaces the old one only once it is complete.
+        :return:None
+        """
+        if self.journal:
+            self.journal.close()
+
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w') as outfile:
+            for prefix, vnh in self.prefix_2_vnh.iteritems():
+                outfile.write(json.dumps(('allocate', prefix, vnh)) + '\n')
+            for release_time, prefix in sorted((release_time, prefix)
+                                               for prefix, release_time in self.released.iteritems()):
+                outfile.write(json.dumps(('release', prefix, release_time)) + '\n')
+        os.rename(tmp_file, self.state_file)
+
+        self.num_records = len(self.prefix_2_vnh) + len(self.released)
+        self.journal = open(self.state_file, 'a')
+
+    def close(self):
+        if self.journal:
+            self.journal.close()
+            self.journal = None
@@ -3,12 +3,18 @@
 #  Rudiger Birkner (Networked Systems Group ETH Zurich)
 
 import os
+import time
+import signal
 import argparse
 
 import logging
 from threading import Thread
 from config import Config
 from lib import XCTRLEvent
+from pipeline import PipelineStage, UpdateCoalescer
+from instrumentation import timing
+from profiler import SamplingProfiler
+from state_store import StateStore
 
 from multiprocessing import Queue
 from Queue import Empty
@@ -19,6 +25,9 @@ from vmac_encoder.supersets import SuperSetEncoder
 from loop_detection.loop_detector import LoopDetector
 from policies.policies import PolicyHandler
 
+# time in seconds between two logs of the pipeline statistics
+PIPELINE_STATISTICS_INTERVAL = 60
+
 
 class XCTRL(object):
     def __init__(self,
@@ -28,10 +37,10 @@ class XCTRL(object):
                  debug,
                  test,
                  no_superset,
-                 rib_timing,
-                 policy_timing,
-                 notification_timing,
-                 no_notifications):
+                 timing_file,
+                 no_notifications,
+                 coalescing_window=0,
+                 profile_window=10):
 
         self.logger = logging.getLogger("XCTRL")
         self.debug = debug
@@ -39,9 +48,14 @@ class XCTRL(object):
         self.no_notifications = no_notifications
         self.no_superset = no_superset
 
-        self.rib_timing = rib_timing
-        self.policy_timing = policy_timing
-        self.notification_timing = notification_timing
+        # the latency histograms of all stages are written to timing_file on stop (None - disabled)
+        self.timing_file = timing_file
+        if self.timing_file:
+            timing.enable()
+
+        # samples the stacks of all threads for profile_window seconds when toggled (see main)
+        self.profiler = SamplingProfiler(window=profile_window)
+
         if self.debug:
             self.logger.setLevel(logging.DEBUG)
         self.logger.info('init')
@@ -62,6 +76,15 @@ class XCTRL(object):
         self.modules = dict()
         self.threads = dict()
 
+        # stages of the processing of RIB updates (see build_pipeline)
+        self.stages = dict()
+
+        # merges the RIB updates of the same route that arrive within the coalescing window (in seconds)
+        self.coalescer = UpdateCoalescer(coalescing_window) if coalescing_window > 0 else None
+
+        # keeps the state on disk to restore it on the next start (None - disabled)
+        self.state_store = None
+
     def start(self):
         # Start all modules
         # route server
@@ -74,9 +97,7 @@ class XCTRL(object):
                                                       self.modules["route_server"].rib,
                                                       None,
                                                       self.test,
-                                                      self.no_notifications,
-                                                      self.rib_timing,
-                                                      self.notification_timing)
+                                                      self.no_notifications)
 
         # VMAC encoder - needs access to RIB, CIB
         self.modules["vmac_encoder"] = SuperSetEncoder(self.config,
@@ -92,10 +113,10 @@ class XCTRL(object):
                                                        self.debug,
                                                        self.modules["vmac_encoder"],
                                                        self.modules["loop_detection"],
-                                                       self.test,
-                                                       self.policy_timing)
+                                                       self.test)
 
         self.modules["loop_detection"].policy_handler = self.modules["policy_handler"]
+        self.modules["loop_detection"].vmac_encoder = self.modules["vmac_encoder"]
 
         # arp proxy - needs access to VMAC encoder
         self.modules["arp_proxy"] = ARPProxy(self.config,
@@ -104,54 +125,175 @@ class XCTRL(object):
                                              self.modules["vmac_encoder"],
                                              self.test)
 
+        # warm start - restore the state before any module starts processing
+        if self.config.state:
+            self.warm_start()
+
         for name in self.thread_modules:
             if self.modules[name]:
-                self.threads[name] = Thread(target=self.modules[name].start)
+                self.threads[name] = Thread(target=self.modules[name].start, name=name)
                 self.threads[name].daemon = True
                 self.threads[name].start()
 
+        self.build_pipeline()
+
         # Process all incoming events
         self.run = True
+
+        # the statistics are logged by a separate thread, as the event loop blocks while the pipeline is congested
+        statistics_thread = Thread(target=self.log_pipeline_statistics_periodically, name="pipeline statistics")
+        statistics_thread.daemon = True
+        statistics_thread.start()
+
         while self.run:
+            # do not wait longer than the coalesced updates may be held back
+            timeout = 1
+            if self.coalescer and self.coalescer.pending:
+                timeout = max(self.coalescer.time_left(), 0.001)
+
             try:
-                event = self.event_queue.get(True, 1)
+                event = self.event_queue.get(True, timeout)
 
             except Empty:
                 #self.logger.debug('Event Queue Empty')
+                if self.coalescer and self.coalescer.is_due():
+                    self.flush_coalesced_updates()
                 continue
 
-            if isinstance(event, XCTRLEvent):
-                if event.type == "RIB UPDATE":
-
-                    # update vnh assignment
-                    self.modules["vmac_encoder"].vnh_assignment(event.data)
-
-                    # update supersets
-                    sdx_messages = self.modules["vmac_encoder"].update_supersets(event.data)
-
-                    # update policies if supersets changed
-                    if sdx_messages["type"] == "new":
-                        # policy module
-                        self.modules["policy_handler"].update_policies()
-
-                    # loop detection
-                    self.modules["loop_detection"].rib_update(event.data)
-
-                    # notify all participants about the RIB changes
-                    changes = self.modules["route_server"].update_neighbors(event.data)
-
-                    # Renew ARP
-                    for change in changes:
-                        self.modules["arp_proxy"].send_gratuitous_arp(change)
-
-                elif event.type == "FORBIDDEN PATHS UPDATE":
-                    # Renew ARP
-                    for change in changes:
-                        self.modules["arp_proxy"].send_gratuitous_arp(change)
+            self.dispatch_event(event)
+
+            if self.coalescer and self.coalescer.is_due():
+                self.flush_coalesced_updates()
+
+    def dispatch_event(self, event):
+        """
+        hands an event of one of the modules to the first stage of the pipeline that processes it
+        :param event: XCTRLEvent
+        :return:None
+        """
+        if isinstance(event, XCTRLEvent):
+            if event.type == "RIB UPDATE":
+                if self.coalescer:
+                    self.coalescer.add(event.data)
+                else:
+                    # blocks if the pipeline does not keep up with the route server
+                    self.stages["vmac_encoder"].put(event.data)
+
+            elif event.type == "FORBIDDEN PATHS CHANGE":
+                # Renew ARP
+                self.stages["arp_proxy"].put(event.data)
+
+    def warm_start(self):
+        """
+        restores the RIB, the CIB, the forbidden paths and the supersets from the last snapshot and journal (the
+        VNH assignment is restored by the VNH pool itself) and keeps recording all changes from now on
+        :return:None
+        """
+        self.state_store = StateStore(self.config.state)
+        self.state_store.register("rib", self.modules["route_server"].rib)
+        self.state_store.register("cib", self.modules["loop_detection"].cib)
+        self.state_store.register("forbidden paths", self.modules["loop_detection"])
+        self.state_store.register("supersets", self.modules["vmac_encoder"])
+
+        if not self.state_store.load():
+            self.logger.info('no state found in ' + self.config.state.directory + ' - cold start')
+
+        self.state_store.start()
+
+    def flush_coalesced_updates(self):
+        updates = self.coalescer.flush()
+        self.logger.debug("coalesced " + str(self.coalescer.received) + " updates into " +
+                          str(self.coalescer.emitted) + " updates so far")
+        if updates:
+            self.stages["vmac_encoder"].put(updates)
+
+    def build_pipeline(self):
+        """
+        sets up the stages of the processing of RIB updates. Each stage runs in its own thread, so the stages work
+        on consecutive updates at the same time. The VMAC encoding has to be done before the loop detection and the
+        export of the routes, as the export needs the VNH of the prefix:
+
+        vmac_encoder -> loop_detection
+                     -> route_server -> arp_proxy
+        :return:None
+        """
+        self.stages["vmac_encoder"] = PipelineStage("vmac_encoder", self.encode_vmac)
+        self.stages["loop_detection"] = PipelineStage("loop_detection", self.detect_loops)
+        self.stages["route_server"] = PipelineStage("route_server", self.export_routes)
+        self.stages["arp_proxy"] = PipelineStage("arp_proxy", self.renew_arp)
+
+        self.stages["vmac_encoder"].connect(self.stages["loop_detection"])
+        self.stages["vmac_encoder"].connect(self.stages["route_server"])
+        self.stages["route_server"].connect(self.stages["arp_proxy"])
+
+        for stage in self.stages.values():
+            stage.start()
+
+    def encode_vmac(self, updates):
+        # update vnh assignment
+        with timing.measure('vnh'):
+            self.modules["vmac_encoder"].vnh_assignment(updates)
+
+        # update supersets
+        with timing.measure('superset'):
+            sdx_messages = self.modules["vmac_encoder"].update_supersets(updates)
+
+        # update the policies towards the participants whose superset identifier or position changed
+        if sdx_messages["changed participants"]:
+            # policy module
+            self.modules["policy_handler"].update_policies(sdx_messages["changed participants"])
+
+        return updates
+
+    def detect_loops(self, updates):
+        # loop detection
+        self.modules["loop_detection"].rib_update(updates)
+
+    def export_routes(self, updates):
+        # notify all participants about the RIB changes
+        changes = self.modules["route_server"].update_neighbors(updates)
+        if changes:
+            return changes
+        return None
+
+    def renew_arp(self, changes):
+        # Renew ARP
+        for change in changes:
+            with timing.measure('arp'):
+                self.modules["arp_proxy"].send_gratuitous_arp(change)
+
+    def get_pipeline_statistics(self):
+        """
+        queue depth and latencies of all stages
+        :return: dict of stage name to statistics
+        """
+        return dict((name, stage.get_statistics()) for name, stage in self.stages.iteritems())
+
+    def log_pipeline_statistics(self, level=logging.INFO):
+        if not self.logger.isEnabledFor(level):
+            return
+        for name, statistics in self.get_pipeline_statistics().iteritems():
+            self.logger.log(level, "stage " + name + " - queue depth: " + str(statistics["queue depth"]) +
+                            ", processed: " + str(statistics["processed"]) +
+                            ", avg wait (ms): " + "%.3f" % (statistics["avg wait time"] * 1000) +
+                            ", avg processing (ms): " + "%.3f" % (statistics["avg processing time"] * 1000) +
+                            ", max processing (ms): " + "%.3f" % (statistics["max processing time"] * 1000))
+
+    def log_pipeline_statistics_periodically(self):
+        while self.run:
+            time.sleep(PIPELINE_STATISTICS_INTERVAL)
+            if self.run:
+                self.log_pipeline_statistics()
 
     def stop(self):
         self.run = False
 
+        self.profiler.stop()
+
+        self.log_pipeline_statistics()
+        for stage in self.stages.values():
+            stage.stop()
+
         # Stop all Modules and Join all Threads
         for name in self.thread_modules:
             if self.modules[name]:
@@ -160,6 +302,18 @@ class XCTRL(object):
         for thread in self.threads.values():
             thread.join()
 
+        if self.state_store:
+            self.state_store.stop()
+
+        self.config.vmac_encoder.vnh_pool.close()
+
+        self.dump_timing()
+
+    def dump_timing(self):
+        if self.timing_file:
+            timing.dump_to_file(self.timing_file)
+            self.logger.info('timing written to ' + self.timing_file)
+
 
 def main(argv):
     # logging - log level
@@ -170,6 +324,10 @@ def main(argv):
                                              argv.dir))
     config_file = os.path.join(base_path, "global.cfg")
 
+    timing_file = None
+    if argv.timing or argv.ribtiming or argv.policytiming or argv.notificationtiming:
+        timing_file = 'timing_' + str(int(time.time())) + '.json'
+
     # start route server
     xctrl_instance = XCTRL(int(argv.sdxid),
                            base_path,
@@ -177,13 +335,18 @@ def main(argv):
                            argv.debug,
                            argv.test,
                            argv.nosuperset,
-                           argv.ribtiming,
-                           argv.policytiming,
-                           argv.notificationtiming,
-                           argv.nonotifications)
+                           timing_file,
+                           argv.nonotifications,
+                           float(argv.coalescingwindow),
+                           float(argv.profilewindow))
     xctrl_thread = Thread(target=xctrl_instance.start)
     xctrl_thread.start()
 
+    # dump the timing on demand: kill -USR1 <pid>
+    signal.signal(signal.SIGUSR1, lambda signum, frame: xctrl_instance.dump_timing())
+    # start/stop the sampling profiler: kill -USR2 <pid>
+    signal.signal(signal.SIGUSR2, lambda signum, frame: xctrl_instance.profiler.toggle())
+
     while xctrl_thread.is_alive():
         try:
             xctrl_thread.join(1)
@@ -199,9 +362,17 @@ if __name__ == '__main__':
     parser.add_argument('-t', '--test', help='test mode', action='store_true')
     parser.add_argument('-ns', '--nosuperset', help='deactivate superset computation', action='store_true')
     parser.add_argument('-nn', '--nonotifications', help='no notifications', action='store_true')
-    parser.add_argument('-rt', '--ribtiming', help='rib update timing', action='store_true')
-    parser.add_argument('-pt', '--policytiming', help='policy activation timing', action='store_true')
-    parser.add_argument('-nt', '--notificationtiming', help='notification timing', action='store_true')
+    parser.add_argument('-ti', '--timing', help='record the latency of all stages and write it to '
+                                                'timing_<time>.json on exit or on SIGUSR1', action='store_true')
+    parser.add_argument('-rt', '--ribtiming', help='rib update timing (same as --timing)', action='store_true')
+    parser.add_argument('-pt', '--policytiming', help='policy activation timing (same as --timing)',
+                        action='store_true')
+    parser.add_argument('-nt', '--notificationtiming', help='notification timing (same as --timing)',
+                        action='store_true')
+    parser.add_argument('-cw', '--coalescingwindow', help='max time in seconds RIB updates of the same route are '
+                                                          'held back to be merged (default: 0 - disabled)', default=0)
+    parser.add_argument('-pw', '--profilewindow', help='time in seconds the sampling profiler runs after it was '
+                                                       'started with SIGUSR2 (default: 10)', default=10)
     args = parser.parse_args()
 
     main(args)